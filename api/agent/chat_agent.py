@@ -1,23 +1,75 @@
 import os, logging
+from datetime import timedelta
 from langchain_core.tools import Tool
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_community.utilities.wolfram_alpha import WolframAlphaAPIWrapper
 from langchain_community.tools.wolfram_alpha import WolframAlphaQueryRun
 from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
-from agent.utils.meta_prompting_agent import create_meta_prompting_agent
+from agent.utils.meta_prompting_agent import MAX_TURNS, create_meta_prompting_agent
+from agent.utils.compaction import CompactionPolicy
 from psycopg_pool import AsyncConnectionPool
 from agent.utils.postgres_saver import PostgresSaver
+from agent.utils.checkpoint_serde import CompactSerializer
+from agent.utils.checkpoint_retention import RetentionPolicy, RetentionService
+from agent.utils.tiered_saver import TieredSqliteSaver
+from agent.utils.checkpoint_tiering import archive_store_from_url
+from agent.utils.serde_executor import SerdeExecutor
+from agent.utils.tool_cache import ToolCache
+from agent.utils.prompt_cache import PromptCacheStats
+from agent.utils.budget import RequestBudget
+from agent.utils.escalation import EscalationPolicy
+from agent.utils.llm_setup import get_llm_from_spec
 
-DB_NAME=os.environ['POSTGRES_DB']
-DB_USER=os.environ['POSTGRES_USER']
-DB_PWD=os.environ['POSTGRES_PASSWORD']
+# CHECKPOINT_BACKEND=sqlite keeps checkpoints in a local file instead of Postgres,
+# and only then can the POSTGRES_* variables be left unset
+POSTGRES_BACKEND = os.getenv("CHECKPOINT_BACKEND") != "sqlite"
 
-DB_URI = f"postgresql://{DB_USER}:{DB_PWD}@db/{DB_NAME}"
+if POSTGRES_BACKEND:
+    DB_NAME=os.environ['POSTGRES_DB']
+    DB_USER=os.environ['POSTGRES_USER']
+    DB_PWD=os.environ['POSTGRES_PASSWORD']
+
+    DB_URI = f"postgresql://{DB_USER}:{DB_PWD}@db/{DB_NAME}"
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-async def build_agent(model):
+retention_service = None
+checkpoint_cache = None
+tool_cache = None
+prompt_cache_stats = PromptCacheStats()
+escalation = None
+
+# Environment variables giving a node its own model, as "provider:model_name"
+NODE_LLM_VARIABLES = {
+    "meta_prompter": "META_PROMPTER_LLM",
+    "expert": "EXPERT_LLM",
+    "compact": "COMPACT_LLM",
+}
+
+# How long tool results stay fresh; other tools use TOOL_CACHE_DEFAULT_TTL
+TOOL_CACHE_TTLS = {
+    "tavily_search_results_json": timedelta(hours=1),
+    "Wikipedia": timedelta(days=1),
+    "wolfram_alpha": timedelta(days=7),
+}
+TOOL_CACHE_DEFAULT_TTL = timedelta(hours=1)
+
+# Tools whose inputs are cached as typed rather than case-folded ("Mg" is not "mg")
+TOOL_CACHE_CASE_SENSITIVE = ("wolfram_alpha",)
+
+def build_checkpoint_serde():
+    # CHECKPOINT_SERDE=compact writes msgpack + zstd instead of JSON. It still
+    # reads JSON rows, but not the other way round, so keep it once set
+    kind = os.getenv("CHECKPOINT_SERDE", "json")
+    if kind == "compact":
+        return CompactSerializer()
+    if kind != "json":
+        raise ValueError(f"Unknown CHECKPOINT_SERDE: {kind}")
+    return None
+
+async def build_postgres_checkpointer():
+    global retention_service, checkpoint_cache
     
     pool = AsyncConnectionPool(
         # Example configuration
@@ -25,9 +77,95 @@ async def build_agent(model):
         max_size=20,
     )
 
-    checkpointer = PostgresSaver(async_connection=pool)
-    await checkpointer.acreate_tables(pool)
+    # Optional streaming replica for history listing and stale-tolerant reads
+    replica_pool = None
+    replica_host = os.getenv("CHECKPOINT_REPLICA_HOST")
+    if replica_host:
+        replica_pool = AsyncConnectionPool(
+            conninfo=f"postgresql://{DB_USER}:{DB_PWD}@{replica_host}/{DB_NAME}",
+            max_size=20,
+        )
+
+    # Threads moved to cold storage by `checkpoint_admin tier` are restored on read
+    archive_store = None
+    archive_url = os.getenv("CHECKPOINT_ARCHIVE_URL")
+    if archive_url:
+        archive_store = archive_store_from_url(
+            archive_url, os.getenv("CHECKPOINT_ARCHIVE_ENDPOINT_URL")
+        )
+
+    # Serialize large checkpoints in a thread or process pool instead of on the event loop
+    serde_executor = None
+    serde_executor_kind = os.getenv("CHECKPOINT_SERDE_EXECUTOR")
+    if serde_executor_kind:
+        serde_executor = SerdeExecutor(
+            serde_executor_kind,
+            threshold=int(os.getenv("CHECKPOINT_SERDE_OFFLOAD_BYTES", str(256 * 1024))),
+        )
+
+    checkpointer = PostgresSaver(
+        async_connection=pool,
+        async_replica_connection=replica_pool,
+        archive_store=archive_store,
+        serde=build_checkpoint_serde(),
+        # CHECKPOINT_DELTA_MODE=1 stores most checkpoints as deltas against their parent
+        delta_mode=os.getenv("CHECKPOINT_DELTA_MODE") == "1",
+        # CHECKPOINT_CACHE_MB keeps the latest checkpoint of recent threads in memory;
+        # every checkpoint write then also sends a NOTIFY to invalidate other workers
+        cache_max_bytes=int(os.getenv("CHECKPOINT_CACHE_MB", "0")) * 1024 * 1024,
+        write_behind=os.getenv("CHECKPOINT_WRITE_BEHIND") == "1",
+        blob_threshold=int(os.getenv("CHECKPOINT_BLOB_THRESHOLD", "0")),
+        serde_executor=serde_executor,
+    )
+    await checkpointer.acreate_tables(
+        pool, partitions=int(os.getenv("CHECKPOINT_PARTITIONS", "0"))
+    )
+    await checkpointer.alisten()
+    checkpoint_cache = checkpointer.cache
+
+    # Prune old checkpoints in the background if a retention policy is configured
+    keep_last = os.getenv("CHECKPOINT_RETENTION_KEEP_LAST")
+    max_age_days = os.getenv("CHECKPOINT_RETENTION_MAX_AGE_DAYS")
+    if keep_last or max_age_days:
+        retention_service = RetentionService(
+            pool,
+            RetentionPolicy(
+                keep_last=int(keep_last or 1),
+                max_age=timedelta(days=float(max_age_days)) if max_age_days else None,
+            ),
+        )
+        retention_service.start()
+
+    return checkpointer
 
+async def build_tool_cache():
+    global tool_cache
+
+    # TOOL_CACHE_MB=0 disables caching of tool results
+    max_mb = int(os.getenv("TOOL_CACHE_MB", "32"))
+    if max_mb <= 0:
+        return None
+
+    # TOOL_CACHE_SHARED=1 also shares results across workers through Postgres
+    pool = None
+    if os.getenv("TOOL_CACHE_SHARED") == "1":
+        if POSTGRES_BACKEND:
+            pool = AsyncConnectionPool(conninfo=DB_URI, max_size=5)
+        else:
+            logger.warning("TOOL_CACHE_SHARED needs the Postgres backend. Caching in memory only.")
+
+    tool_cache = ToolCache(
+        ttls=TOOL_CACHE_TTLS,
+        default_ttl=TOOL_CACHE_DEFAULT_TTL,
+        max_bytes=max_mb * 1024 * 1024,
+        case_sensitive=TOOL_CACHE_CASE_SENSITIVE,
+        async_connection=pool,
+    )
+    if pool is not None:
+        await tool_cache.asetup()
+    return tool_cache
+
+def build_tools():
     # Create instances of the tools
     tools = [
         TavilySearchResults(max_results=3),
@@ -58,4 +196,82 @@ async def build_agent(model):
     except ImportError:
         logger.warning("Wikipedia package not found. Proceeding without Wikipedia tool.")
 
-    return await create_meta_prompting_agent(model, tools, checkpointer=checkpointer)
+    return tools
+
+def build_node_models():
+    global escalation
+
+    # ESCALATION_LLM retries responses a node cannot use on a stronger model, as does
+    # a mean token probability under ESCALATION_MIN_CONFIDENCE, for which OpenAI
+    # node models are asked for logprobs
+    min_confidence = os.getenv("ESCALATION_MIN_CONFIDENCE")
+    min_confidence = float(min_confidence) if min_confidence else None
+
+    models = {}
+    for node, variable in NODE_LLM_VARIABLES.items():
+        spec = os.getenv(variable)
+        if spec:
+            kwargs = {"logprobs": True} if min_confidence and spec.startswith("openai") else {}
+            models[node] = get_llm_from_spec(spec, **kwargs)
+            logger.info(f"Using {spec} for the {node} node.")
+
+    escalation_spec = os.getenv("ESCALATION_LLM")
+    if escalation_spec:
+        escalation = EscalationPolicy(get_llm_from_spec(escalation_spec), min_confidence=min_confidence)
+        logger.info(f"Escalating unusable responses to {escalation_spec}.")
+    return models, escalation
+
+async def build_agent(model):
+    if not POSTGRES_BACKEND:
+        checkpointer = TieredSqliteSaver(
+            os.getenv("CHECKPOINT_SQLITE_PATH", "checkpoints.sqlite"),
+            serde=build_checkpoint_serde(),
+        )
+    else:
+        checkpointer = await build_postgres_checkpointer()
+
+    tools = build_tools()
+
+    # Serve repeated tool calls from the cache, across turns and conversations
+    cache = await build_tool_cache()
+    if cache is not None:
+        tools = cache.wrap(tools)
+
+    # Summarize older turns in prompts once a conversation outgrows this many tokens
+    compaction = None
+    token_budget = os.getenv("CONVERSATION_TOKEN_BUDGET")
+    if token_budget:
+        compaction = CompactionPolicy(
+            max_tokens=int(token_budget),
+            keep_last=int(os.getenv("CONVERSATION_KEEP_LAST", "6")),
+        )
+
+    # Default limits of a request; config["configurable"] can set deadline_seconds,
+    # max_tokens, max_tool_calls and max_turns per request
+    deadline_seconds = os.getenv("REQUEST_DEADLINE_SECONDS")
+    max_tokens = os.getenv("REQUEST_MAX_TOKENS")
+    max_tool_calls = os.getenv("REQUEST_MAX_TOOL_CALLS")
+    budget = RequestBudget(
+        deadline_seconds=float(deadline_seconds) if deadline_seconds else None,
+        max_tokens=int(max_tokens) if max_tokens else None,
+        max_tool_calls=int(max_tool_calls) if max_tool_calls else None,
+        max_turns=MAX_TURNS,
+    )
+
+    models, escalation_policy = build_node_models()
+
+    # EXPERT_TOOL_CALLING=text makes experts request tools in plain text instead of
+    # the provider's native tool calling
+    native_tool_calling = os.getenv("EXPERT_TOOL_CALLING", "native") != "text"
+
+    return await create_meta_prompting_agent(
+        model,
+        tools,
+        checkpointer=checkpointer,
+        compaction=compaction,
+        native_tool_calling=native_tool_calling,
+        prompt_cache_stats=prompt_cache_stats,
+        budget=budget,
+        models=models,
+        escalation=escalation_policy,
+    )
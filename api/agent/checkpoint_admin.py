@@ -0,0 +1,206 @@
+"""Maintenance commands for the checkpoint tables.
+
+Run from the ``api`` directory, e.g.::
+
+    python -m agent.checkpoint_admin migrate-serde --batch-size 500
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import timedelta
+
+import psycopg
+
+from agent.utils.checkpoint_archive import export_threads, import_archive
+from agent.utils.checkpoint_blobs import collect_blobs
+from agent.utils.checkpoint_migrations import checkpoint_migrations, migrate
+from agent.utils.checkpoint_retention import RetentionPolicy, aprune_checkpoints
+from agent.utils.checkpoint_serde import CompactSerializer, migrate_serialization
+from agent.utils.checkpoint_tiering import archive_store_from_url, tier_idle_threads
+from agent.utils.postgres_saver import backfill_metadata_json
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def default_dsn() -> str:
+    return (
+        f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
+        f"@{os.getenv('POSTGRES_HOST', 'db')}/{os.getenv('POSTGRES_DB')}"
+    )
+
+
+def migrate_schema(args: argparse.Namespace) -> None:
+    with psycopg.connect(args.dsn) as conn:
+        applied = migrate(conn, checkpoint_migrations(args.partitions))
+    logger.info(f"Applied {len(applied)} schema migrations")
+
+
+def migrate_serde(args: argparse.Namespace) -> None:
+    serde = CompactSerializer(
+        compression=None if args.compression == "none" else args.compression,
+        compress_threshold=args.compress_threshold,
+    )
+    with psycopg.connect(args.dsn) as conn:
+        rows, before, after = migrate_serialization(conn, serde, args.batch_size)
+    logger.info(f"Rewrote {rows} rows: {before} bytes -> {after} bytes")
+
+
+def backfill_metadata(args: argparse.Namespace) -> None:
+    with psycopg.connect(args.dsn) as conn:
+        rows = backfill_metadata_json(conn, CompactSerializer(), args.batch_size)
+    logger.info(f"Backfilled metadata_json for {rows} checkpoints")
+
+
+def prune(args: argparse.Namespace) -> None:
+    policy = RetentionPolicy(
+        keep_last=args.keep_last,
+        max_age=timedelta(hours=args.max_age_hours) if args.max_age_hours else None,
+        prune_writes=not args.keep_writes,
+        batch_size=args.batch_size,
+    )
+
+    async def run() -> None:
+        async with await psycopg.AsyncConnection.connect(
+            args.dsn, autocommit=True
+        ) as conn:
+            await aprune_checkpoints(conn, policy)
+
+    asyncio.run(run())
+
+
+def export(args: argparse.Namespace) -> None:
+    with psycopg.connect(args.dsn) as conn, open(args.output, "wb") as out:
+        export_threads(
+            conn,
+            out,
+            thread_ids=args.thread_id,
+            compression=None if args.compression == "none" else args.compression,
+        )
+
+
+def import_(args: argparse.Namespace) -> None:
+    with psycopg.connect(args.dsn) as conn, open(args.input, "rb") as source:
+        import_archive(conn, source, replace=args.replace)
+
+
+def gc_blobs(args: argparse.Namespace) -> None:
+    with psycopg.connect(args.dsn) as conn:
+        collect_blobs(conn, timedelta(hours=args.grace_hours), args.batch_size)
+
+
+def tier(args: argparse.Namespace) -> None:
+    store = archive_store_from_url(args.store, args.endpoint_url)
+    with psycopg.connect(args.dsn) as conn:
+        tier_idle_threads(
+            conn,
+            store,
+            timedelta(days=args.idle_days),
+            limit=args.limit,
+            compression=None if args.compression == "none" else args.compression,
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=default_dsn(), help="Postgres connection string")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    schema_parser = commands.add_parser(
+        "migrate", help="Apply pending checkpoint schema migrations"
+    )
+    schema_parser.add_argument(
+        "--partitions",
+        type=int,
+        default=int(os.getenv("CHECKPOINT_PARTITIONS", "0")),
+        help="Hash-partition the checkpoint tables into this many partitions",
+    )
+    schema_parser.set_defaults(func=migrate_schema)
+
+    serde_parser = commands.add_parser(
+        "migrate-serde", help="Rewrite JSON checkpoint rows in the compact binary format"
+    )
+    serde_parser.add_argument("--batch-size", type=int, default=500)
+    serde_parser.add_argument(
+        "--compression", choices=["zstd", "lz4", "none"], default="zstd"
+    )
+    serde_parser.add_argument("--compress-threshold", type=int, default=1024)
+    serde_parser.set_defaults(func=migrate_serde)
+
+    metadata_parser = commands.add_parser(
+        "backfill-metadata", help="Fill the searchable metadata_json column of old rows"
+    )
+    metadata_parser.add_argument("--batch-size", type=int, default=500)
+    metadata_parser.set_defaults(func=backfill_metadata)
+
+    prune_parser = commands.add_parser(
+        "prune", help="Delete checkpoints and writes outside the retention policy"
+    )
+    prune_parser.add_argument("--keep-last", type=int, default=1)
+    prune_parser.add_argument("--max-age-hours", type=float, default=None)
+    prune_parser.add_argument(
+        "--keep-writes",
+        action="store_true",
+        help="Keep pending writes of checkpoints that already have a child",
+    )
+    prune_parser.add_argument("--batch-size", type=int, default=500)
+    prune_parser.set_defaults(func=prune)
+
+    export_parser = commands.add_parser(
+        "export", help="Write threads to a compressed archive with binary COPY"
+    )
+    export_parser.add_argument("output", help="Archive file to write")
+    export_parser.add_argument(
+        "--thread-id",
+        action="append",
+        help="Thread to export, may be repeated; all threads if omitted",
+    )
+    export_parser.add_argument(
+        "--compression", choices=["zstd", "lz4", "none"], default="zstd"
+    )
+    export_parser.set_defaults(func=export)
+
+    import_parser = commands.add_parser(
+        "import", help="Merge the threads of an archive into the checkpoint tables"
+    )
+    import_parser.add_argument("input", help="Archive file to read")
+    import_parser.add_argument(
+        "--replace", action="store_true", help="Overwrite checkpoints that already exist"
+    )
+    import_parser.set_defaults(func=import_)
+
+    gc_parser = commands.add_parser(
+        "gc-blobs", help="Delete out-of-line values no checkpoint references anymore"
+    )
+    gc_parser.add_argument("--grace-hours", type=float, default=1)
+    gc_parser.add_argument("--batch-size", type=int, default=500)
+    gc_parser.set_defaults(func=gc_blobs)
+
+    tier_parser = commands.add_parser(
+        "tier", help="Move the history of idle threads to cold storage"
+    )
+    tier_parser.add_argument("--idle-days", type=float, default=30)
+    tier_parser.add_argument(
+        "--store",
+        default=os.getenv("CHECKPOINT_ARCHIVE_URL"),
+        required=not os.getenv("CHECKPOINT_ARCHIVE_URL"),
+        help="Directory or s3://bucket/prefix to write archives to",
+    )
+    tier_parser.add_argument(
+        "--endpoint-url",
+        default=os.getenv("CHECKPOINT_ARCHIVE_ENDPOINT_URL"),
+        help="Endpoint of an S3-compatible service such as MinIO",
+    )
+    tier_parser.add_argument("--limit", type=int, default=1000)
+    tier_parser.add_argument(
+        "--compression", choices=["zstd", "lz4", "none"], default="zstd"
+    )
+    tier_parser.set_defaults(func=tier)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
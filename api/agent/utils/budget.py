@@ -0,0 +1,102 @@
+import time
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+
+CONFIG_KEYS = ("deadline_seconds", "max_tokens", "max_tool_calls", "max_turns")
+"""Keys of ``config["configurable"]`` that set the limits of a request."""
+
+
+@dataclass
+class RequestBudget:
+    """Limits of one request to the meta-prompting graph.
+
+    The limits are read from ``config["configurable"]`` when a request starts,
+    falling back to the agent's defaults, and stored with the usage so far in
+    the graph state. Once a limit is within ``reserve`` of being used up, the
+    meta-prompter gets one last turn in which it must give its final answer.
+    """
+
+    deadline_seconds: Optional[float] = None
+    """Wall-clock time for the whole request."""
+    max_tokens: Optional[int] = None
+    """Input and output tokens of all model calls of the request."""
+    max_tool_calls: Optional[int] = None
+    max_turns: int = 15
+    """Meta-prompter turns, including the final answer turn."""
+    reserve: float = 0.2
+    """Share of the deadline and of the token budget kept for the final answer turn."""
+
+    @classmethod
+    def from_config(
+        cls, config: RunnableConfig, default: Optional["RequestBudget"] = None
+    ) -> "RequestBudget":
+        configurable = config.get("configurable", {})
+        return replace(
+            default or cls(),
+            **{
+                key: configurable[key]
+                for key in CONFIG_KEYS
+                if configurable.get(key) is not None
+            },
+        )
+
+    def start(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """The budget of a request starting ``now``, as stored in the graph state."""
+        now = time.time() if now is None else now
+        return {
+            **asdict(self),
+            "deadline": now + self.deadline_seconds if self.deadline_seconds else None,
+        }
+
+
+def final_turn_reason(
+    budget: Dict[str, Any], turn: int, tokens_used: int, tool_calls_used: int
+) -> Optional[str]:
+    """Why meta-prompter turn ``turn`` must give the final answer, if it must."""
+    if turn >= budget["max_turns"]:
+        return "turn limit"
+    if budget["deadline"] is not None and (
+        budget["deadline"] - time.time() <= budget["deadline_seconds"] * budget["reserve"]
+    ):
+        return "time"
+    if budget["max_tokens"] is not None and (
+        budget["max_tokens"] - tokens_used <= budget["max_tokens"] * budget["reserve"]
+    ):
+        return "token budget"
+    if budget["max_tool_calls"] is not None and tool_calls_used >= budget["max_tool_calls"]:
+        return "tool call budget"
+    return None
+
+
+def remaining_tool_calls(budget: Dict[str, Any], tool_calls_used: int) -> Optional[int]:
+    if budget["max_tool_calls"] is None:
+        return None
+    return max(budget["max_tool_calls"] - tool_calls_used, 0)
+
+
+def response_tokens(response: BaseMessage) -> int:
+    """Input and output tokens of the call that produced ``response``, 0 if unknown."""
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if usage_metadata:
+        return usage_metadata["total_tokens"]
+    metadata = getattr(response, "response_metadata", None) or {}
+    token_usage = metadata.get("token_usage") or {}
+    if "total_tokens" in token_usage:
+        return token_usage["total_tokens"]
+    usage = metadata.get("usage") or {}
+    return sum(
+        usage.get(key) or 0
+        for key in (
+            "input_tokens",
+            "output_tokens",
+            "cache_read_input_tokens",
+            "cache_creation_input_tokens",
+        )
+    )
+
+
+class ToolBudgetExceeded(Exception):
+    """A tool call the request's tool call budget has no room for."""
@@ -0,0 +1,331 @@
+import json
+import logging
+import struct
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg
+from psycopg import sql
+
+from agent.utils.checkpoint_serde import compress, decompress
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_MAGIC = b"CKPTARC\x01"
+
+FRAME_HEADER = struct.Struct(">cII")
+"""Frame kind, payload length and CRC32 of the payload."""
+
+MANIFEST_FRAME = b"M"
+END_FRAME = b"E"
+
+TABLES = {
+    b"B": ("checkpoint_blobs", ["hash", "data"], ["hash"]),
+    b"C": (
+        "checkpoints",
+        [
+            "thread_id",
+            "thread_ts",
+            "parent_ts",
+            "checkpoint",
+            "metadata",
+            "is_delta",
+            "created_at",
+            "metadata_json",
+            "blob_refs",
+        ],
+        ["thread_id", "thread_ts"],
+    ),
+    b"W": (
+        "writes",
+        ["thread_id", "thread_ts", "task_id", "idx", "channel", "value", "blob_refs"],
+        ["thread_id", "thread_ts", "task_id", "idx"],
+    ),
+}
+"""Frame kind of each exported table, with its columns and primary key. Blobs
+come first so the rows referencing them find them on import."""
+
+BLOBS_WHERE = """
+ WHERE hash IN (
+    SELECT unnest(blob_refs) FROM checkpoints{where}
+    UNION SELECT unnest(blob_refs) FROM writes{where}
+)
+"""
+"""Selects the blobs referenced by the exported checkpoints and writes."""
+
+
+@dataclass
+class ArchiveStats:
+    threads: int = 0
+    rows: Dict[str, int] = field(default_factory=dict)
+    """Rows exported from, or merged into, each table."""
+    raw_bytes: int = 0
+    archive_bytes: int = 0
+
+
+def _write_frame(out: BinaryIO, kind: bytes, payload: bytes) -> int:
+    out.write(FRAME_HEADER.pack(kind, len(payload), zlib.crc32(payload)))
+    out.write(payload)
+    return FRAME_HEADER.size + len(payload)
+
+
+def _read_frames(source: BinaryIO) -> Iterator[Tuple[bytes, bytes]]:
+    if source.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+        raise ValueError("Not a checkpoint archive")
+    while True:
+        header = source.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise ValueError("Checkpoint archive is truncated")
+        kind, length, crc = FRAME_HEADER.unpack(header)
+        payload = source.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            raise ValueError("Checkpoint archive is corrupt")
+        if kind == END_FRAME:
+            return
+        yield kind, payload
+
+
+def export_threads(
+    conn: psycopg.Connection,
+    out: BinaryIO,
+    thread_ids: Optional[Sequence[str]] = None,
+    compression: Optional[str] = "zstd",
+    chunk_size: int = 4 * 1024 * 1024,
+) -> ArchiveStats:
+    """Stream checkpoints and writes into a compressed archive with binary COPY.
+
+    Blobs are copied as stored, never deserialized. The archive is a sequence
+    of independently compressed and checksummed chunks of the COPY stream of
+    each table, read from one snapshot so checkpoints and their writes match.
+    Called inside a transaction, the export runs in it instead, and the caller
+    keeps the threads from changing (``tier_idle_threads`` holds their lock).
+
+    Args:
+        thread_ids: Threads to export, or all threads if None.
+        chunk_size: Uncompressed bytes per archive chunk.
+    """
+    stats = ArchiveStats()
+    out.write(ARCHIVE_MAGIC)
+    stats.archive_bytes += len(ARCHIVE_MAGIC)
+    manifest = {
+        "version": 1,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "compression": compression,
+        "tables": {table: columns for table, columns, _ in TABLES.values()},
+    }
+    stats.archive_bytes += _write_frame(
+        out, MANIFEST_FRAME, json.dumps(manifest).encode()
+    )
+
+    where = sql.SQL("")
+    params: Tuple = ()
+    if thread_ids is not None:
+        where = sql.SQL(" WHERE thread_id = ANY(%s)")
+        params = (list(thread_ids),)
+
+    def flush(kind: bytes, buffer: bytearray) -> None:
+        payload = bytes(buffer)
+        if compression is not None:
+            payload = compress(compression, payload, 3)
+        stats.raw_bytes += len(buffer)
+        stats.archive_bytes += _write_frame(out, kind, payload)
+        buffer.clear()
+
+    snapshot = conn.info.transaction_status == psycopg.pq.TransactionStatus.IDLE
+    with conn.transaction():
+        if snapshot:
+            conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        cur = conn.execute(
+            sql.SQL("SELECT count(DISTINCT thread_id) FROM checkpoints") + where, params
+        )
+        stats.threads = cur.fetchone()[0]
+        for kind, (table, columns, key) in TABLES.items():
+            table_where, table_params = where, params
+            if kind == b"B":
+                table_where = sql.SQL(BLOBS_WHERE).format(where=where)
+                table_params = params * 2
+            cur = conn.execute(
+                sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(table))
+                + table_where,
+                table_params,
+            )
+            stats.rows[table] = cur.fetchone()[0]
+            query = sql.SQL(
+                "COPY (SELECT {columns} FROM {table}{where} ORDER BY {key}) "
+                "TO STDOUT (FORMAT BINARY)"
+            ).format(
+                columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+                table=sql.Identifier(table),
+                where=table_where,
+                key=sql.SQL(", ").join(map(sql.Identifier, key)),
+            )
+            buffer = bytearray()
+            with conn.cursor() as cur:
+                with cur.copy(query, table_params) as copy:
+                    for data in copy:
+                        buffer += data
+                        if len(buffer) >= chunk_size:
+                            flush(kind, buffer)
+            if buffer:
+                flush(kind, buffer)
+    stats.archive_bytes += _write_frame(out, END_FRAME, b"")
+    logger.info(
+        f"Exported {stats.threads} threads: {stats.raw_bytes} bytes "
+        f"in an archive of {stats.archive_bytes} bytes"
+    )
+    return stats
+
+
+STAGING_TABLE_QUERY = """
+CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP
+"""
+
+MERGE_QUERY = """
+INSERT INTO {table} ({columns})
+SELECT {columns} FROM {staging}
+ON CONFLICT ({key}) DO {action}
+"""
+
+NOTIFY_IMPORTED_QUERY = """
+SELECT pg_notify(%s, json_build_array('import', thread_id)::text)
+FROM (SELECT DISTINCT thread_id FROM checkpoint_import_checkpoints) imported
+"""
+
+
+def _read_manifest(frames: Iterator[Tuple[bytes, bytes]]) -> Dict[str, Any]:
+    kind, payload = next(frames, (None, b""))
+    if kind != MANIFEST_FRAME:
+        raise ValueError("Checkpoint archive has no manifest")
+    return json.loads(payload)
+
+
+def _import_queries(
+    table: str, columns: List[str], key: List[str], replace: bool
+) -> Tuple[sql.Composed, sql.Composed, sql.Composed]:
+    """Return the queries that create, fill and merge the staging table of ``table``."""
+    staging = sql.Identifier(f"checkpoint_import_{table}")
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+    action = sql.SQL("NOTHING")
+    if replace:
+        action = sql.SQL("UPDATE SET {}").format(
+            sql.SQL(", ").join(
+                sql.SQL("{column} = EXCLUDED.{column}").format(
+                    column=sql.Identifier(column)
+                )
+                for column in columns
+                if column not in key
+            )
+        )
+    return (
+        sql.SQL(STAGING_TABLE_QUERY).format(
+            staging=staging, table=sql.Identifier(table)
+        ),
+        sql.SQL("COPY {staging} ({columns}) FROM STDIN (FORMAT BINARY)").format(
+            staging=staging, columns=column_list
+        ),
+        sql.SQL(MERGE_QUERY).format(
+            table=sql.Identifier(table),
+            columns=column_list,
+            staging=staging,
+            key=sql.SQL(", ").join(map(sql.Identifier, key)),
+            action=action,
+        ),
+    )
+
+
+COUNT_IMPORTED_THREADS_QUERY = """
+SELECT count(DISTINCT thread_id) FROM checkpoint_import_checkpoints
+"""
+
+
+def import_archive(
+    conn: psycopg.Connection,
+    source: BinaryIO,
+    replace: bool = False,
+    notify_channel: Optional[str] = "checkpoint_invalidation",
+) -> ArchiveStats:
+    """Load an archive written by ``export_threads`` in a single transaction.
+
+    Each table is bulk loaded into a temporary staging table with binary COPY
+    and merged into the live table with one ``INSERT ... ON CONFLICT``.
+
+    Args:
+        replace: Overwrite rows that already exist instead of keeping them.
+        notify_channel: Channel on which to announce the imported threads so
+            running savers drop them from their caches, or None.
+    """
+    stats = ArchiveStats()
+    frames = _read_frames(source)
+    manifest = _read_manifest(frames)
+    compression = manifest["compression"]
+
+    with conn.transaction():
+        for kind, table_frames in groupby(frames, key=lambda frame: frame[0]):
+            table, _, key = TABLES[kind]
+            create, copy_query, merge = _import_queries(
+                table, manifest["tables"][table], key, replace
+            )
+            conn.execute(create)
+            with conn.cursor() as cur:
+                with cur.copy(copy_query) as copy:
+                    for _, chunk in table_frames:
+                        stats.archive_bytes += len(chunk)
+                        data = decompress(compression, chunk)
+                        stats.raw_bytes += len(data)
+                        copy.write(data)
+            stats.rows[table] = conn.execute(merge).rowcount
+            if table == "checkpoints":
+                cur = conn.execute(COUNT_IMPORTED_THREADS_QUERY)
+                stats.threads = cur.fetchone()[0]
+                if notify_channel:
+                    conn.execute(NOTIFY_IMPORTED_QUERY, (notify_channel,))
+    logger.info(f"Imported {stats.threads} threads: {stats.rows}")
+    return stats
+
+
+async def aimport_archive(
+    conn: psycopg.AsyncConnection,
+    source: BinaryIO,
+    replace: bool = False,
+    notify_channel: Optional[str] = "checkpoint_invalidation",
+) -> ArchiveStats:
+    """Load an archive written by ``export_threads`` in a single transaction.
+
+    Each table is bulk loaded into a temporary staging table with binary COPY
+    and merged into the live table with one ``INSERT ... ON CONFLICT``.
+
+    Args:
+        replace: Overwrite rows that already exist instead of keeping them.
+        notify_channel: Channel on which to announce the imported threads so
+            running savers drop them from their caches, or None.
+    """
+    stats = ArchiveStats()
+    frames = _read_frames(source)
+    manifest = _read_manifest(frames)
+    compression = manifest["compression"]
+
+    async with conn.transaction():
+        for kind, table_frames in groupby(frames, key=lambda frame: frame[0]):
+            table, _, key = TABLES[kind]
+            create, copy_query, merge = _import_queries(
+                table, manifest["tables"][table], key, replace
+            )
+            await conn.execute(create)
+            async with conn.cursor() as cur:
+                async with cur.copy(copy_query) as copy:
+                    for _, chunk in table_frames:
+                        stats.archive_bytes += len(chunk)
+                        data = decompress(compression, chunk)
+                        stats.raw_bytes += len(data)
+                        await copy.write(data)
+            stats.rows[table] = (await conn.execute(merge)).rowcount
+            if table == "checkpoints":
+                cur = await conn.execute(COUNT_IMPORTED_THREADS_QUERY)
+                stats.threads = (await cur.fetchone())[0]
+                if notify_channel:
+                    await conn.execute(NOTIFY_IMPORTED_QUERY, (notify_channel,))
+    logger.info(f"Imported {stats.threads} threads: {stats.rows}")
+    return stats
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import psycopg
+from langchain_core.messages import BaseMessage
+from langgraph.serde.base import SerializerProtocol
+
+from agent.utils.checkpoint_cache import ByteLRU
+
+logger = logging.getLogger(__name__)
+
+BLOB_REF_KEY = "__checkpoint_blob__"
+"""Key of the single-entry dict that stands in for an offloaded value."""
+
+
+def _approximate_size(value: Any) -> int:
+    """Size of a value that may be offloaded, before serialization.
+
+    Only strings, bytes and messages (whose content is usually a tool result)
+    are offloaded; everything else is inlined.
+    """
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, BaseMessage):
+        content = value.content
+        return len(content) if isinstance(content, str) else len(str(content))
+    return 0
+
+
+def offload_values(
+    value: Any, serde: SerializerProtocol, threshold: int, blobs: Dict[str, bytes]
+) -> Any:
+    """Replace the large values nested in lists and dicts of ``value`` by references.
+
+    Each string, bytes or message value of at least ``threshold`` characters is
+    serialized into ``blobs`` under the SHA-256 of its serialized form, so
+    identical values share a blob.
+
+    Returns:
+        A copy of ``value`` with the offloaded values replaced.
+    """
+    if type(value) is list:
+        return [offload_values(item, serde, threshold, blobs) for item in value]
+    if type(value) is dict:
+        return {
+            key: offload_values(item, serde, threshold, blobs)
+            for key, item in value.items()
+        }
+    if _approximate_size(value) < threshold:
+        return value
+    data = serde.dumps(value)
+    key = hashlib.sha256(data).hexdigest()
+    blobs[key] = data
+    return {BLOB_REF_KEY: key}
+
+
+def resolve_values(
+    value: Any, serde: SerializerProtocol, blobs: Dict[str, bytes]
+) -> Any:
+    """Replace the blob references in ``value`` by the values they stand for."""
+    if type(value) is list:
+        return [resolve_values(item, serde, blobs) for item in value]
+    if type(value) is dict:
+        if len(value) == 1 and BLOB_REF_KEY in value:
+            key = value[BLOB_REF_KEY]
+            if key not in blobs:
+                raise ValueError(f"Checkpoint blob {key} is missing.")
+            return serde.loads(blobs[key])
+        return {key: resolve_values(item, serde, blobs) for key, item in value.items()}
+    return value
+
+
+def dump_value(
+    serde: SerializerProtocol, threshold: int, value: Any, blobs: Dict[str, bytes]
+) -> bytes:
+    """Serialize ``value``, moving the large values it holds into ``blobs``."""
+    if threshold > 0:
+        value = offload_values(value, serde, threshold, blobs)
+    return serde.dumps(value)
+
+
+def load_value(serde: SerializerProtocol, data: bytes, blobs: Dict[str, bytes]) -> Any:
+    """Deserialize ``data``, putting back the values it references in ``blobs``."""
+    value = serde.loads(data)
+    return resolve_values(value, serde, blobs) if blobs else value
+
+
+def blob_refs(*refs: Optional[Iterable[str]]) -> List[str]:
+    """Merge the ``blob_refs`` columns of several rows, dropping duplicates."""
+    return sorted({key for row_refs in refs if row_refs for key in row_refs})
+
+
+class BlobStore:
+    """Fetches blobs by hash, keeping recently used ones in memory.
+
+    Blobs are immutable, so cached entries never need invalidating.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.cache: ByteLRU[str, bytes] = ByteLRU(max_bytes)
+
+    def remember(self, blobs: Dict[str, bytes]) -> None:
+        for key, data in blobs.items():
+            self.cache.put(key, data, len(data))
+
+    def _cached(self, keys: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        for key in keys:
+            data = self.cache.get(key)
+            if data is not None:
+                found[key] = data
+        return found
+
+    def fetch(self, conn: psycopg.Connection, keys: List[str]) -> Dict[str, bytes]:
+        """Return the blobs for ``keys``, reading the ones not cached from ``conn``."""
+        found = self._cached(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            rows = conn.execute(SELECT_BLOBS_QUERY, (missing,)).fetchall()
+            fetched = {key: bytes(data) for key, data in rows}
+            self.remember(fetched)
+            found.update(fetched)
+        return found
+
+    async def afetch(
+        self, conn: psycopg.AsyncConnection, keys: List[str]
+    ) -> Dict[str, bytes]:
+        """Return the blobs for ``keys``, reading the ones not cached from ``conn``."""
+        found = self._cached(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            cur = await conn.execute(SELECT_BLOBS_QUERY, (missing,))
+            fetched = {key: bytes(data) for key, data in await cur.fetchall()}
+            self.remember(fetched)
+            found.update(fetched)
+        return found
+
+
+SELECT_BLOBS_QUERY = "SELECT hash, data FROM checkpoint_blobs WHERE hash = ANY(%s)"
+
+UPSERT_BLOB_QUERY = """
+INSERT INTO checkpoint_blobs (hash, data) VALUES (%s, %s)
+ON CONFLICT (hash) DO UPDATE SET last_used_at = now()
+"""
+"""Stores a blob, or locks the existing one so garbage collection cannot drop it
+before the row referencing it commits and raises its ``refcount``."""
+
+COLLECT_BLOBS_QUERY = """
+WITH doomed AS (
+    SELECT hash FROM checkpoint_blobs
+    WHERE refcount <= 0 AND last_used_at < now() - %s
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+), deleted AS (
+    DELETE FROM checkpoint_blobs b USING doomed d
+    WHERE b.hash = d.hash AND b.refcount <= 0
+    RETURNING pg_column_size(b.data) AS size
+)
+SELECT count(*), coalesce(sum(size), 0) FROM deleted
+"""
+
+
+def collect_blobs(
+    conn: psycopg.Connection,
+    grace: timedelta = timedelta(hours=1),
+    batch_size: int = 500,
+) -> int:
+    """Delete blobs no checkpoint or write has referenced for ``grace``.
+
+    Reference counts are kept by triggers on ``checkpoints`` and ``writes``, so
+    rows removed by retention or tiering release their blobs. Deletes run in
+    batches of ``batch_size``, each in its own transaction.
+
+    Returns:
+        The number of blobs deleted.
+    """
+    deleted = reclaimed = 0
+    while True:
+        with conn.transaction():
+            count, size = conn.execute(
+                COLLECT_BLOBS_QUERY, (grace, batch_size)
+            ).fetchone()
+        deleted += count
+        reclaimed += size
+        if count < batch_size:
+            break
+    logger.info(f"Collected {deleted} checkpoint blobs, reclaiming {reclaimed} bytes")
+    return deleted
+
+
+async def acollect_blobs(
+    conn: psycopg.AsyncConnection,
+    grace: timedelta = timedelta(hours=1),
+    batch_size: int = 500,
+) -> int:
+    """Delete blobs no checkpoint or write has referenced for ``grace``.
+
+    Reference counts are kept by triggers on ``checkpoints`` and ``writes``, so
+    rows removed by retention or tiering release their blobs. Deletes run in
+    batches of ``batch_size``, each in its own transaction.
+
+    Returns:
+        The number of blobs deleted.
+    """
+    deleted = reclaimed = 0
+    while True:
+        async with conn.transaction():
+            cur = await conn.execute(COLLECT_BLOBS_QUERY, (grace, batch_size))
+            count, size = await cur.fetchone()
+        deleted += count
+        reclaimed += size
+        if count < batch_size:
+            break
+        # let other transactions in between batches
+        await asyncio.sleep(0)
+    logger.info(f"Collected {deleted} checkpoint blobs, reclaiming {reclaimed} bytes")
+    return deleted
@@ -0,0 +1,203 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+from langgraph.checkpoint.base import CheckpointTuple, PendingWrite
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class ByteLRU(Generic[K, V]):
+    """A thread-safe LRU mapping bounded by the approximate size of its values.
+
+    Sizes are supplied by the caller (usually the length of the serialized form)
+    since measuring live Python objects is far more expensive than the lookups
+    the cache is meant to save.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[K, Tuple[V, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, key: K, predicate: Optional[Callable[[V], bool]] = None
+    ) -> Optional[V]:
+        """Return the value for ``key``, counting it as a miss unless it exists
+        and satisfies ``predicate``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (predicate is not None and not predicate(entry[0])):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key: K) -> Optional[Tuple[V, int]]:
+        """Return the value and size for ``key`` without touching stats or order."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: K, value: V, size: int) -> None:
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted
+                self.evictions += 1
+
+    def pop(self, key: K) -> Optional[V]:
+        with self._lock:
+            return self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _pop(self, key: K) -> Optional[V]:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.total_bytes -= entry[1]
+        return entry[0]
+
+
+class CheckpointCache:
+    """Write-through cache of the latest ``CheckpointTuple`` of each thread.
+
+    Tuples are handed out with a fresh ``pending_writes`` list because the
+    pregel loop extends that list in place.
+    """
+
+    max_early_writes: int = 1024
+    """Number of threads whose writes may be held until their checkpoint is cached.
+
+    The pregel loop saves a checkpoint in the background while the next tasks
+    already run, so writes for a checkpoint can be stored before it is.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._lru: ByteLRU[str, CheckpointTuple] = ByteLRU(max_bytes)
+        self._early_writes: OrderedDict[str, Tuple[str, List[PendingWrite], int]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    @property
+    def hits(self) -> int:
+        return self._lru.hits
+
+    @property
+    def misses(self) -> int:
+        return self._lru.misses
+
+    def get(
+        self, thread_id: str, thread_ts: Optional[str] = None
+    ) -> Optional[CheckpointTuple]:
+        """Return the cached tuple if it is the latest, or the requested, checkpoint."""
+        cached = self._lru.get(
+            thread_id,
+            None
+            if thread_ts is None
+            else lambda value: value.config["configurable"]["thread_ts"] == thread_ts,
+        )
+        if cached is None:
+            return None
+        return cached._replace(pending_writes=list(cached.pending_writes or []))
+
+    def size_of(self, thread_id: str, thread_ts: str) -> int:
+        """Return the cached size of ``thread_ts``, or 0 if it is not cached."""
+        entry = self._lru.peek(thread_id)
+        if entry is None or entry[0].config["configurable"]["thread_ts"] != thread_ts:
+            return 0
+        return entry[1]
+
+    def put(self, thread_id: str, value: CheckpointTuple, size: int) -> None:
+        """Cache ``value`` unless a newer checkpoint of the thread is cached.
+
+        Checkpoint ids increase monotonically, so a read that raced with a write
+        can never replace the entry that write produced.
+        """
+        thread_ts = value.config["configurable"]["thread_ts"]
+        entry = self._lru.peek(thread_id)
+        if entry is not None and entry[0].config["configurable"]["thread_ts"] > thread_ts:
+            return
+        with self._lock:
+            early = self._early_writes.pop(thread_id, None)
+        if early is not None and early[0] == thread_ts:
+            value = value._replace(
+                pending_writes=[*(value.pending_writes or []), *early[1]]
+            )
+            size += early[2]
+        self._lru.put(thread_id, value, size)
+
+    def add_writes(
+        self,
+        thread_id: str,
+        thread_ts: str,
+        writes: List[PendingWrite],
+        size: int,
+    ) -> None:
+        """Append pending writes to the cached tuple if it is for ``thread_ts``."""
+        entry = self._lru.peek(thread_id)
+        if entry is None or entry[0].config["configurable"]["thread_ts"] != thread_ts:
+            # the checkpoint these writes belong to has not been cached yet
+            with self._lock:
+                ts, held, held_size = self._early_writes.pop(thread_id, ("", [], 0))
+                if ts != thread_ts:
+                    held, held_size = [], 0
+                self._early_writes[thread_id] = (
+                    thread_ts,
+                    [*held, *writes],
+                    held_size + size,
+                )
+                while len(self._early_writes) > self.max_early_writes:
+                    self._early_writes.popitem(last=False)
+            return
+        cached, cached_size = entry
+        self._lru.put(
+            thread_id,
+            cached._replace(pending_writes=[*(cached.pending_writes or []), *writes]),
+            cached_size + size,
+        )
+
+    def invalidate(self, thread_id: str) -> None:
+        with self._lock:
+            self._early_writes.pop(thread_id, None)
+        if self._lru.pop(thread_id) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._early_writes.clear()
+        self._lru.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._lru.stats(), "invalidations": self.invalidations}
@@ -0,0 +1,289 @@
+import logging
+from dataclasses import dataclass
+from typing import List
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """A schema change, applied once and recorded in ``checkpoint_schema_version``."""
+
+    version: int
+    description: str
+    sql: str
+
+
+BASELINE_SQL = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    thread_ts TEXT NOT NULL,
+    parent_ts TEXT,
+    checkpoint BYTEA NOT NULL,
+    metadata BYTEA NOT NULL,
+    PRIMARY KEY (thread_id, thread_ts)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    thread_ts TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    value BYTEA,
+    PRIMARY KEY (thread_id, thread_ts, task_id, idx)
+);
+"""
+
+CHECKPOINT_COLUMNS_SQL = """
+ALTER TABLE checkpoints ADD COLUMN IF NOT EXISTS is_delta BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE checkpoints ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ;
+-- existing rows get the time their checkpoint id was minted rather than the
+-- time of the migration: uuid6 ids carry a 60-bit count of 100ns intervals
+-- since 1582-10-15, older ones are ISO timestamps
+UPDATE checkpoints SET created_at = coalesce(
+    CASE
+        WHEN thread_ts ~ '^[0-9a-f]{8}-[0-9a-f]{4}-6[0-9a-f]{3}-' THEN to_timestamp(
+            (
+                ('x' || lpad(
+                    substr(thread_ts, 1, 8) || substr(thread_ts, 10, 4) || substr(thread_ts, 16, 3),
+                    16,
+                    '0'
+                ))::bit(64)::bigint - 122192928000000000
+            ) / 1e7
+        )
+        WHEN thread_ts ~ '^\\d{4}-\\d{2}-\\d{2}T' THEN thread_ts::timestamptz
+    END,
+    now()
+)
+WHERE created_at IS NULL;
+ALTER TABLE checkpoints
+    ALTER COLUMN created_at SET DEFAULT now(),
+    ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE checkpoints ADD COLUMN IF NOT EXISTS metadata_json JSONB;
+CREATE INDEX IF NOT EXISTS checkpoints_parent_ts_idx ON checkpoints (thread_id, parent_ts);
+CREATE INDEX IF NOT EXISTS checkpoints_metadata_json_idx
+    ON checkpoints USING GIN (metadata_json jsonb_path_ops);
+"""
+
+COVERING_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS checkpoints_thread_latest_idx
+    ON checkpoints (thread_id, thread_ts DESC)
+    INCLUDE (parent_ts, is_delta, created_at);
+"""
+"""Lets the latest-checkpoint lookup, delta chain walks and retention ranking
+read a thread's history from the index without visiting the heap."""
+
+ARCHIVED_THREADS_SQL = """
+CREATE TABLE IF NOT EXISTS archived_threads (
+    thread_id TEXT PRIMARY KEY,
+    archive_key TEXT NOT NULL,
+    checkpoints INTEGER NOT NULL,
+    archive_bytes BIGINT NOT NULL,
+    last_checkpoint_at TIMESTAMPTZ,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+"""Stub rows of threads whose history was moved to cold storage."""
+
+BLOBS_SQL = """
+CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+    hash TEXT PRIMARY KEY,
+    data BYTEA NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_used_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS checkpoint_blobs_unreferenced_idx
+    ON checkpoint_blobs (last_used_at) WHERE refcount <= 0;
+ALTER TABLE checkpoints ADD COLUMN IF NOT EXISTS blob_refs TEXT[];
+ALTER TABLE writes ADD COLUMN IF NOT EXISTS blob_refs TEXT[];
+
+CREATE OR REPLACE FUNCTION checkpoint_blob_refcount() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.blob_refs IS NOT NULL THEN
+        UPDATE checkpoint_blobs SET refcount = refcount - 1
+        WHERE hash = ANY(OLD.blob_refs);
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.blob_refs IS NOT NULL THEN
+        UPDATE checkpoint_blobs SET refcount = refcount + 1, last_used_at = now()
+        WHERE hash = ANY(NEW.blob_refs);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER checkpoints_blob_refcount
+    AFTER INSERT OR DELETE OR UPDATE OF blob_refs ON checkpoints
+    FOR EACH ROW EXECUTE FUNCTION checkpoint_blob_refcount();
+CREATE TRIGGER writes_blob_refcount
+    AFTER INSERT OR DELETE OR UPDATE OF blob_refs ON writes
+    FOR EACH ROW EXECUTE FUNCTION checkpoint_blob_refcount();
+"""
+"""Content-addressed storage for large values, shared by all rows that hold them.
+
+Triggers keep ``refcount`` equal to the number of rows whose ``blob_refs``
+name the blob; ``collect_blobs`` deletes the ones that drop to zero."""
+
+PARTITION_TABLE_SQL = """
+DO $$
+DECLARE
+    primary_key TEXT;
+    index_definitions TEXT[];
+    index_definition TEXT;
+    trigger_definitions TEXT[];
+    trigger_definition TEXT;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = '{table}'::regclass
+    ) THEN
+        RETURN;
+    END IF;
+    SELECT pg_get_constraintdef(oid) INTO primary_key
+    FROM pg_constraint
+    WHERE conrelid = '{table}'::regclass AND contype = 'p';
+    SELECT coalesce(array_agg(pg_get_indexdef(indexrelid)), '{{}}')
+    INTO index_definitions
+    FROM pg_index
+    WHERE indrelid = '{table}'::regclass AND NOT indisprimary;
+    SELECT coalesce(array_agg(pg_get_triggerdef(oid)), '{{}}')
+    INTO trigger_definitions
+    FROM pg_trigger
+    WHERE tgrelid = '{table}'::regclass AND NOT tgisinternal;
+
+    ALTER TABLE {table} RENAME TO {table}_unpartitioned;
+    CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS)
+        PARTITION BY HASH (thread_id);
+    FOR remainder IN 0..{partitions} - 1 LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF {table} '
+            'FOR VALUES WITH (MODULUS {partitions}, REMAINDER %s)',
+            '{table}_p' || remainder,
+            remainder
+        );
+    END LOOP;
+    INSERT INTO {table} SELECT * FROM {table}_unpartitioned;
+    DROP TABLE {table}_unpartitioned;
+
+    -- indexes are built once the rows are in, and keep their original names;
+    -- triggers are recreated last so the copied rows are not counted again
+    EXECUTE 'ALTER TABLE {table} ADD ' || primary_key;
+    FOREACH index_definition IN ARRAY index_definitions LOOP
+        EXECUTE index_definition;
+    END LOOP;
+    FOREACH trigger_definition IN ARRAY trigger_definitions LOOP
+        EXECUTE trigger_definition;
+    END LOOP;
+END $$;
+"""
+
+
+def checkpoint_migrations(partitions: int = 0) -> List[Migration]:
+    """Return the migrations of the checkpoint schema.
+
+    Args:
+        partitions: Hash-partition ``checkpoints`` and ``writes`` by ``thread_id``
+            into this many partitions. Existing rows are copied over in a single
+            transaction that locks both tables, so on a large database run it
+            from ``checkpoint_admin migrate`` during a maintenance window. The
+            partition count cannot be changed once the layout is applied.
+    """
+    migrations = [
+        Migration(1, "create checkpoints and writes tables", BASELINE_SQL),
+        Migration(
+            2,
+            "add delta, retention and metadata search columns",
+            CHECKPOINT_COLUMNS_SQL,
+        ),
+        Migration(3, "add covering index for latest checkpoint", COVERING_INDEX_SQL),
+        Migration(5, "add archived threads table", ARCHIVED_THREADS_SQL),
+        Migration(6, "add content-addressed blob table", BLOBS_SQL),
+    ]
+    if partitions > 0:
+        migrations.append(
+            Migration(
+                4,
+                f"hash partition checkpoints and writes into {partitions} partitions",
+                "".join(
+                    PARTITION_TABLE_SQL.format(table=table, partitions=partitions)
+                    for table in ("checkpoints", "writes")
+                ),
+            )
+        )
+    return migrations
+
+
+CREATE_VERSION_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS checkpoint_schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+# serializes migrations of API replicas that start at the same time
+LOCK_QUERY = "SELECT pg_advisory_xact_lock(hashtext('checkpoint_schema_version'))"
+
+SELECT_APPLIED_QUERY = "SELECT version FROM checkpoint_schema_version"
+
+RECORD_VERSION_QUERY = """
+INSERT INTO checkpoint_schema_version (version, description) VALUES (%s, %s)
+"""
+
+
+def migrate(conn: psycopg.Connection, migrations: List[Migration]) -> List[Migration]:
+    """Apply the ``migrations`` that are not recorded yet, each in its own transaction.
+
+    Migrations are applied in version order. A version is only skipped once
+    it is recorded, so optional migrations such as partitioning can be
+    enabled later on.
+    """
+    applied: List[Migration] = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        with conn.transaction():
+            conn.execute(LOCK_QUERY)
+            conn.execute(CREATE_VERSION_TABLE_QUERY)
+            versions = {row[0] for row in conn.execute(SELECT_APPLIED_QUERY)}
+            if migration.version in versions:
+                continue
+            conn.execute(migration.sql)
+            conn.execute(
+                RECORD_VERSION_QUERY, (migration.version, migration.description)
+            )
+        logger.info(
+            f"Applied checkpoint schema migration {migration.version}: "
+            f"{migration.description}"
+        )
+        applied.append(migration)
+    return applied
+
+
+async def amigrate(
+    conn: psycopg.AsyncConnection, migrations: List[Migration]
+) -> List[Migration]:
+    """Apply the ``migrations`` that are not recorded yet, each in its own transaction.
+
+    Migrations are applied in version order. A version is only skipped once
+    it is recorded, so optional migrations such as partitioning can be
+    enabled later on.
+    """
+    applied: List[Migration] = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        async with conn.transaction():
+            await conn.execute(LOCK_QUERY)
+            await conn.execute(CREATE_VERSION_TABLE_QUERY)
+            cur = await conn.execute(SELECT_APPLIED_QUERY)
+            versions = {row[0] for row in await cur.fetchall()}
+            if migration.version in versions:
+                continue
+            await conn.execute(migration.sql)
+            await conn.execute(
+                RECORD_VERSION_QUERY, (migration.version, migration.description)
+            )
+        logger.info(
+            f"Applied checkpoint schema migration {migration.version}: "
+            f"{migration.description}"
+        )
+        applied.append(migration)
+    return applied
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+from agent.utils.checkpoint_blobs import acollect_blobs
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """Which checkpoints to keep.
+
+    A checkpoint is kept if any rule keeps it: it is one of the ``keep_last``
+    newest checkpoints of its thread, or it is younger than ``max_age``. The
+    latest checkpoint of a thread is always kept, as are the ancestors that
+    kept delta checkpoints are rebuilt from.
+    """
+
+    keep_last: int = 1
+    max_age: Optional[timedelta] = None
+    prune_writes: bool = True
+    """Drop pending writes of checkpoints that already have a child checkpoint."""
+    batch_size: int = 500
+    """Maximum rows deleted per transaction."""
+    threads_per_batch: int = 100
+    lock_timeout: str = "2s"
+    blob_grace: timedelta = timedelta(hours=1)
+    """How long a blob must have been unreferenced before it is deleted."""
+
+
+@dataclass
+class RetentionReport:
+    checkpoints_deleted: int = 0
+    writes_deleted: int = 0
+    blobs_deleted: int = 0
+    reclaimed_bytes: int = 0
+    """Size of the deleted values; disk space is returned once vacuum runs."""
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+SELECT_THREADS_QUERY = """
+SELECT DISTINCT thread_id FROM checkpoints
+WHERE thread_id > %s
+ORDER BY thread_id
+LIMIT %s
+"""
+
+PRUNE_CHECKPOINTS_QUERY = """
+WITH RECURSIVE ranked AS (
+    SELECT thread_id, thread_ts, parent_ts, is_delta, created_at,
+           row_number() OVER (PARTITION BY thread_id ORDER BY thread_ts DESC) AS rn
+    FROM checkpoints
+    WHERE thread_id = ANY(%(thread_ids)s)
+), keep AS (
+    SELECT thread_id, thread_ts, parent_ts, is_delta
+    FROM ranked
+    WHERE rn <= %(keep_last)s OR created_at >= %(cutoff)s
+    UNION
+    SELECT c.thread_id, c.thread_ts, c.parent_ts, c.is_delta
+    FROM keep k
+    JOIN checkpoints c ON c.thread_id = k.thread_id AND c.thread_ts = k.parent_ts
+    WHERE k.is_delta
+), doomed AS (
+    SELECT r.thread_id, r.thread_ts
+    FROM ranked r
+    WHERE NOT EXISTS (
+        SELECT 1 FROM keep k
+        WHERE k.thread_id = r.thread_id AND k.thread_ts = r.thread_ts
+    )
+    LIMIT %(batch_size)s
+), deleted_writes AS (
+    DELETE FROM writes w USING doomed d
+    WHERE w.thread_id = d.thread_id AND w.thread_ts = d.thread_ts
+    RETURNING coalesce(pg_column_size(w.value), 0) AS size
+), deleted AS (
+    DELETE FROM checkpoints c USING doomed d
+    WHERE c.thread_id = d.thread_id AND c.thread_ts = d.thread_ts
+    RETURNING pg_column_size(c.checkpoint) + pg_column_size(c.metadata) AS size
+)
+SELECT (SELECT count(*) FROM deleted),
+       (SELECT count(*) FROM deleted_writes),
+       (SELECT coalesce(sum(size), 0) FROM deleted)
+           + (SELECT coalesce(sum(size), 0) FROM deleted_writes)
+"""
+
+PRUNE_WRITES_QUERY = """
+WITH doomed AS (
+    SELECT w.thread_id, w.thread_ts, w.task_id, w.idx
+    FROM writes w
+    WHERE w.thread_id = ANY(%(thread_ids)s)
+        AND EXISTS (
+            SELECT 1 FROM checkpoints c
+            WHERE c.thread_id = w.thread_id AND c.parent_ts = w.thread_ts
+        )
+    LIMIT %(batch_size)s
+), deleted AS (
+    DELETE FROM writes w USING doomed d
+    WHERE w.thread_id = d.thread_id AND w.thread_ts = d.thread_ts
+        AND w.task_id = d.task_id AND w.idx = d.idx
+    RETURNING coalesce(pg_column_size(w.value), 0) AS size
+)
+SELECT 0, count(*), coalesce(sum(size), 0) FROM deleted
+"""
+
+
+async def _run_batches(
+    conn: psycopg.AsyncConnection,
+    query: str,
+    params: dict,
+    policy: RetentionPolicy,
+    report: RetentionReport,
+) -> None:
+    """Run a pruning statement in short transactions until a batch comes back short."""
+    while True:
+        async with conn.transaction():
+            await conn.execute(
+                "SELECT set_config('lock_timeout', %s, true)", (policy.lock_timeout,)
+            )
+            cur = await conn.execute(query, params)
+            checkpoints, writes, size = await cur.fetchone()
+        report.checkpoints_deleted += checkpoints
+        report.writes_deleted += writes
+        report.reclaimed_bytes += size
+        if max(checkpoints, writes) < policy.batch_size:
+            return
+        # let other transactions in between batches
+        await asyncio.sleep(0)
+
+
+async def aprune_checkpoints(
+    conn: psycopg.AsyncConnection, policy: RetentionPolicy
+) -> RetentionReport:
+    """Delete the checkpoints and writes that ``policy`` does not keep.
+
+    Threads are visited in keyset order and rows deleted in batches of at most
+    ``policy.batch_size``, each in its own transaction, so no lock is held for
+    long and the job can be interrupted at any point. Blobs left unreferenced
+    are collected afterwards.
+    """
+    report = RetentionReport()
+    cutoff = report.started_at - policy.max_age if policy.max_age else None
+    last_thread_id = ""
+    while True:
+        async with conn.transaction():
+            cur = await conn.execute(
+                SELECT_THREADS_QUERY, (last_thread_id, policy.threads_per_batch)
+            )
+            thread_ids: List[str] = [row[0] for row in await cur.fetchall()]
+        if not thread_ids:
+            break
+        await _run_batches(
+            conn,
+            PRUNE_CHECKPOINTS_QUERY,
+            {
+                "thread_ids": thread_ids,
+                "keep_last": max(policy.keep_last, 1),
+                "cutoff": cutoff,
+                "batch_size": policy.batch_size,
+            },
+            policy,
+            report,
+        )
+        if policy.prune_writes:
+            await _run_batches(
+                conn,
+                PRUNE_WRITES_QUERY,
+                {"thread_ids": thread_ids, "batch_size": policy.batch_size},
+                policy,
+                report,
+            )
+        last_thread_id = thread_ids[-1]
+    report.blobs_deleted = await acollect_blobs(
+        conn, policy.blob_grace, policy.batch_size
+    )
+    logger.info(
+        f"Checkpoint retention deleted {report.checkpoints_deleted} checkpoints and "
+        f"{report.writes_deleted} writes, reclaiming {report.reclaimed_bytes} bytes"
+    )
+    return report
+
+
+class RetentionService:
+    """Runs ``aprune_checkpoints`` on a pool every ``interval`` in the background."""
+
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        policy: RetentionPolicy,
+        interval: timedelta = timedelta(hours=1),
+    ):
+        self.pool = pool
+        self.policy = policy
+        self.interval = interval
+        self.last_report: Optional[RetentionReport] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self.pool.connection() as conn:
+                    self.last_report = await aprune_checkpoints(conn, self.policy)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Checkpoint retention failed: {str(e)}")
+            await asyncio.sleep(self.interval.total_seconds())
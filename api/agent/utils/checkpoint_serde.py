@@ -0,0 +1,219 @@
+import logging
+from typing import Any, Optional, Tuple
+
+import msgpack
+import psycopg
+from langgraph.serde.jsonplus import JsonPlusSerializer
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - optional dependency
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+FRAME_MAGIC = b"\x00"
+"""First byte of every framed payload. JSON documents can never start with it,
+so rows written before framing existed are still recognised and read as JSON."""
+
+FORMAT_VERSION = 1
+
+CODECS = {None: 0, "zstd": 1, "lz4": 2}
+CODEC_NAMES = {code: name for name, code in CODECS.items()}
+
+JSON_CODEC = 255
+"""Codec id of framed payloads whose body is ``JsonPlusSerializer`` JSON, for
+values msgpack cannot encode. Framing them too tells ``migrate_serialization``
+they need no further conversion."""
+
+
+def compress(codec: str, data: bytes, level: int) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if codec == "lz4":
+        return lz4_frame.compress(data, compression_level=level)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def decompress(codec: Optional[str], data: bytes) -> bytes:
+    if codec is None:
+        return data
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstandard is required to read zstd compressed checkpoints")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "lz4":
+        if lz4_frame is None:
+            raise ValueError("lz4 is required to read lz4 compressed checkpoints")
+        return lz4_frame.decompress(data)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """Binary (msgpack) checkpoint serializer with optional compression.
+
+    Every payload is framed as ``FRAME_MAGIC + version + codec + body`` so the
+    format is stored with each row. Unframed payloads are decoded as the JSON
+    written by ``JsonPlusSerializer``, which keeps existing rows readable.
+    Objects are encoded with the same constructor descriptors as
+    ``JsonPlusSerializer``, so anything it can round-trip this can too.
+    """
+
+    def __init__(
+        self,
+        compression: Optional[str] = "zstd",
+        compress_threshold: int = 1024,
+        compression_level: int = 3,
+    ):
+        if compression not in CODECS:
+            raise ValueError(f"Unknown compression codec: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstandard is not installed, cannot use zstd compression")
+        if compression == "lz4" and lz4_frame is None:
+            raise ValueError("lz4 is not installed, cannot use lz4 compression")
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.compression_level = compression_level
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            body = msgpack.packb(obj, default=self._default, use_bin_type=True)
+        except (TypeError, ValueError, OverflowError):
+            # e.g. integers wider than 64 bits, fall back to the JSON encoding
+            return FRAME_MAGIC + bytes((FORMAT_VERSION, JSON_CODEC)) + super().dumps(obj)
+
+        codec = None
+        if self.compression and len(body) >= self.compress_threshold:
+            compressed = compress(self.compression, body, self.compression_level)
+            if len(compressed) < len(body):
+                body, codec = compressed, self.compression
+        return FRAME_MAGIC + bytes((FORMAT_VERSION, CODECS[codec])) + body
+
+    def loads(self, data: bytes) -> Any:
+        if not is_framed(data):
+            return super().loads(data)
+        version, codec = data[1], data[2]
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported checkpoint format version: {version}")
+        if codec == JSON_CODEC:
+            return super().loads(bytes(data[3:]))
+        if codec not in CODEC_NAMES:
+            raise ValueError(f"Unknown compression codec id: {codec}")
+        body = decompress(CODEC_NAMES[codec], bytes(data[3:]))
+        return msgpack.unpackb(
+            body, object_hook=self._reviver, raw=False, strict_map_key=False
+        )
+
+
+def is_framed(data: bytes) -> bool:
+    """Return whether ``data`` was written by ``CompactSerializer``."""
+    return data[:1] == FRAME_MAGIC
+
+
+SELECT_LEGACY_CHECKPOINTS_QUERY = """
+SELECT thread_id, thread_ts, checkpoint, metadata
+FROM checkpoints
+WHERE (thread_id, thread_ts) > (%s, %s)
+    AND (get_byte(checkpoint, 0) <> 0 OR get_byte(metadata, 0) <> 0)
+ORDER BY thread_id, thread_ts
+LIMIT %s
+"""
+
+UPDATE_CHECKPOINT_QUERY = """
+UPDATE checkpoints SET checkpoint = %s, metadata = %s
+WHERE thread_id = %s AND thread_ts = %s
+"""
+
+SELECT_LEGACY_WRITES_QUERY = """
+SELECT thread_id, thread_ts, task_id, idx, value
+FROM writes
+WHERE (thread_id, thread_ts, task_id, idx) > (%s, %s, %s, %s)
+    AND value IS NOT NULL AND get_byte(value, 0) <> 0
+ORDER BY thread_id, thread_ts, task_id, idx
+LIMIT %s
+"""
+
+UPDATE_WRITE_QUERY = """
+UPDATE writes SET value = %s
+WHERE thread_id = %s AND thread_ts = %s AND task_id = %s AND idx = %s
+"""
+
+
+def _reencode(serde: CompactSerializer, data: bytes) -> Optional[bytes]:
+    """``data`` in the compact format, or None if it is in it already."""
+    if is_framed(data):
+        return None
+    return serde.dumps(serde.loads(data))
+
+
+def migrate_serialization(
+    connection: psycopg.Connection,
+    serde: CompactSerializer,
+    batch_size: int = 500,
+) -> Tuple[int, int, int]:
+    """Rewrite JSON checkpoint and write rows in the compact format.
+
+    Rows are read in keyset order and updated in batches of ``batch_size``, each
+    batch in its own transaction, so the migration can run next to live traffic
+    and be interrupted and resumed at any point. Columns already in the compact
+    format are left alone; values msgpack cannot encode are framed around their
+    JSON, so they are not selected again and a second run has nothing to do.
+
+    Returns:
+        The number of rows rewritten and the total payload bytes before and after.
+    """
+    rows = bytes_before = bytes_after = 0
+
+    cursor_key: Tuple[Any, ...] = ("", "")
+    while True:
+        with connection.transaction():
+            batch = connection.execute(
+                SELECT_LEGACY_CHECKPOINTS_QUERY, (*cursor_key, batch_size)
+            ).fetchall()
+            updates = []
+            for thread_id, thread_ts, checkpoint, metadata in batch:
+                new_checkpoint = _reencode(serde, checkpoint)
+                new_metadata = _reencode(serde, metadata)
+                if new_checkpoint is None and new_metadata is None:
+                    continue
+                new_checkpoint = new_checkpoint or checkpoint
+                new_metadata = new_metadata or metadata
+                bytes_before += len(checkpoint) + len(metadata)
+                bytes_after += len(new_checkpoint) + len(new_metadata)
+                updates.append((new_checkpoint, new_metadata, thread_id, thread_ts))
+            with connection.cursor() as cur:
+                cur.executemany(UPDATE_CHECKPOINT_QUERY, updates)
+        rows += len(updates)
+        if len(batch) < batch_size:
+            break
+        cursor_key = batch[-1][:2]
+        logger.info(f"Rewrote {rows} checkpoint rows")
+
+    cursor_key = ("", "", "", -1)
+    while True:
+        with connection.transaction():
+            batch = connection.execute(
+                SELECT_LEGACY_WRITES_QUERY, (*cursor_key, batch_size)
+            ).fetchall()
+            updates = []
+            for thread_id, thread_ts, task_id, idx, value in batch:
+                new_value = _reencode(serde, value)
+                if new_value is None:
+                    continue
+                bytes_before += len(value)
+                bytes_after += len(new_value)
+                updates.append((new_value, thread_id, thread_ts, task_id, idx))
+            with connection.cursor() as cur:
+                cur.executemany(UPDATE_WRITE_QUERY, updates)
+        rows += len(updates)
+        if len(batch) < batch_size:
+            break
+        cursor_key = batch[-1][:4]
+        logger.info(f"Rewrote {rows} checkpoint and write rows")
+
+    return rows, bytes_before, bytes_after
@@ -0,0 +1,241 @@
+import io
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Protocol
+from urllib.parse import quote, urlparse
+
+import psycopg
+
+from agent.utils.checkpoint_archive import export_threads
+
+try:
+    import boto3
+except ImportError:  # pragma: no cover - optional dependency
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveStore(Protocol):
+    """Where the archives of cold threads are kept, by key."""
+
+    def put(self, key: str, data: bytes) -> None:
+        ...
+
+    def get(self, key: str) -> bytes:
+        ...
+
+    def delete(self, key: str) -> None:
+        ...
+
+
+class LocalArchiveStore:
+    """Keeps archives as files under ``directory``.
+
+    Also stands in for an object store in development and tests.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, *key.split("/"))
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.partial"
+        with open(partial, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3ArchiveStore:
+    """Keeps archives as objects in an S3-compatible bucket.
+
+    Pass ``endpoint_url`` to use MinIO or another S3-compatible service.
+    Credentials are read by boto3 from the environment.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        client=None,
+    ):
+        if client is None:
+            if boto3 is None:
+                raise ValueError("boto3 is required to archive threads to S3")
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = client
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def get(self, key: str) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        return response["Body"].read()
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+def archive_store_from_url(url: str, endpoint_url: Optional[str] = None) -> ArchiveStore:
+    """Return the store for ``s3://bucket/prefix`` or a local directory."""
+    parsed = urlparse(url)
+    if parsed.scheme == "s3":
+        return S3ArchiveStore(parsed.netloc, parsed.path, endpoint_url)
+    if parsed.scheme == "file":
+        return LocalArchiveStore(parsed.path)
+    return LocalArchiveStore(url)
+
+
+@dataclass
+class TieringReport:
+    threads: int = 0
+    checkpoints: int = 0
+    archive_bytes: int = 0
+    raw_bytes: int = 0
+    skipped: int = 0
+    """Threads written to since they were found idle, left in Postgres."""
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+LOCK_THREAD_QUERY = "SELECT pg_advisory_xact_lock(hashtext(%s))"
+
+LOCK_THREAD_SHARED_QUERY = "SELECT pg_advisory_xact_lock_shared(hashtext(%s))"
+"""Taken by every checkpoint write, so a thread cannot change while it is archived."""
+
+SELECT_IDLE_THREADS_QUERY = """
+SELECT thread_id, max(created_at) AS last_checkpoint_at
+FROM checkpoints
+WHERE thread_id NOT IN (SELECT thread_id FROM archived_threads)
+GROUP BY thread_id
+HAVING max(created_at) < %s
+ORDER BY last_checkpoint_at
+LIMIT %s
+"""
+
+SELECT_LAST_CHECKPOINT_QUERY = """
+SELECT max(created_at) FROM checkpoints WHERE thread_id = %s
+"""
+
+DELETE_THREAD_CHECKPOINTS_QUERY = "DELETE FROM checkpoints WHERE thread_id = %s"
+
+DELETE_THREAD_WRITES_QUERY = "DELETE FROM writes WHERE thread_id = %s"
+
+INSERT_STUB_QUERY = """
+INSERT INTO archived_threads (
+    thread_id, archive_key, checkpoints, archive_bytes, last_checkpoint_at
+) VALUES (%s, %s, %s, %s, %s)
+"""
+
+NOTIFY_QUERY = "SELECT pg_notify(%s, %s)"
+
+
+class _ThreadChanged(Exception):
+    """Rolls back archiving a thread that was written to since it was selected."""
+
+
+def archive_key(thread_id: str) -> str:
+    """Return a new key for an archive of ``thread_id``."""
+    return f"{quote(thread_id, safe='')}/{uuid.uuid4().hex}.ckpt"
+
+
+def tier_idle_threads(
+    conn: psycopg.Connection,
+    store: ArchiveStore,
+    idle_for: timedelta,
+    limit: int = 1000,
+    compression: Optional[str] = "zstd",
+    notify_channel: Optional[str] = "checkpoint_invalidation",
+) -> TieringReport:
+    """Move the history of threads idle for ``idle_for`` to ``store``.
+
+    Each thread is exported to its own archive and uploaded, then deleted from
+    ``checkpoints`` and ``writes`` and replaced by its ``archived_threads``
+    stub, all in one transaction holding the thread's advisory lock. Savers
+    take that lock (shared) for every write, so the archive holds exactly the
+    rows that are deleted; a thread written to since it was found idle is
+    left alone. Savers with an ``archive_store`` restore the thread on its
+    next read.
+
+    Args:
+        limit: Maximum number of threads to archive, oldest first.
+        notify_channel: Channel on which to announce archived threads so
+            running savers drop them from their caches, or None.
+    """
+    report = TieringReport()
+    cutoff = report.started_at - idle_for
+    with conn.transaction():
+        idle = conn.execute(SELECT_IDLE_THREADS_QUERY, (cutoff, limit)).fetchall()
+
+    for thread_id, _ in idle:
+        key = archive_key(thread_id)
+        try:
+            with conn.transaction():
+                # waits for writes in flight, and holds off new ones until commit
+                conn.execute(LOCK_THREAD_QUERY, (thread_id,))
+                (last_checkpoint_at,) = conn.execute(
+                    SELECT_LAST_CHECKPOINT_QUERY, (thread_id,)
+                ).fetchone()
+                if last_checkpoint_at is None or last_checkpoint_at >= cutoff:
+                    raise _ThreadChanged()
+                buffer = io.BytesIO()
+                stats = export_threads(conn, buffer, [thread_id], compression)
+                store.put(key, buffer.getvalue())
+                for query in (DELETE_THREAD_CHECKPOINTS_QUERY, DELETE_THREAD_WRITES_QUERY):
+                    conn.execute(query, (thread_id,))
+                conn.execute(
+                    INSERT_STUB_QUERY,
+                    (
+                        thread_id,
+                        key,
+                        stats.rows["checkpoints"],
+                        stats.archive_bytes,
+                        last_checkpoint_at,
+                    ),
+                )
+                if notify_channel:
+                    conn.execute(
+                        NOTIFY_QUERY, (notify_channel, json.dumps(["tier", thread_id]))
+                    )
+        except _ThreadChanged:
+            report.skipped += 1
+            continue
+        except Exception:
+            store.delete(key)
+            raise
+        report.threads += 1
+        report.checkpoints += stats.rows["checkpoints"]
+        report.archive_bytes += stats.archive_bytes
+        report.raw_bytes += stats.raw_bytes
+
+    logger.info(
+        f"Archived {report.threads} idle threads ({report.checkpoints} checkpoints, "
+        f"{report.raw_bytes} bytes in {report.archive_bytes} archive bytes), "
+        f"skipped {report.skipped}"
+    )
+    return report
@@ -0,0 +1,103 @@
+import logging
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from agent.utils.transcript import render_message
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user, a \
+meta-prompter that delegates work to experts, and the experts' tool results.
+
+Current summary:
+{summary}
+
+New messages to fold into the summary:
+{transcript}
+
+Write the updated summary in at most {max_words} words. Keep the user's original \
+request and any constraints they gave, the facts and figures found so far with their \
+sources, the questions still open, and the approaches that failed. Respond with the \
+summary only."""
+
+
+@dataclass
+class CompactionPolicy:
+    """When and how to replace older messages in prompts with a running summary.
+
+    Compaction runs before each meta-prompter turn. Once the summary and the
+    messages not yet summarized exceed ``max_tokens``, everything but the last
+    ``keep_last`` messages is folded into the summary. The full history stays
+    in the ``messages`` channel; only prompts are built from the summary and
+    the recent messages.
+    """
+
+    max_tokens: int = 8000
+    """Token budget for the conversation part of a prompt."""
+    keep_last: int = 6
+    """Number of most recent messages always kept verbatim, fewer if they alone
+    exceed the budget. The latest message is always kept."""
+    summary_max_words: int = 400
+
+
+def conversation_window(
+    messages: Sequence[BaseMessage], summary: Optional[str], summarized_count: int
+) -> List[BaseMessage]:
+    """Return the messages to build a prompt from: the running summary, if any,
+    followed by the messages it does not cover."""
+    recent = list(messages[summarized_count:])
+    if not summary:
+        return recent
+    return [
+        HumanMessage(content=f"Summary of the earlier conversation:\n{summary}"),
+        *recent,
+    ]
+
+
+def messages_to_compact(
+    policy: CompactionPolicy,
+    messages: Sequence[BaseMessage],
+    summary: Optional[str],
+    summarized_count: int,
+    count_tokens: Callable[[str], int],
+) -> Optional[Tuple[List[BaseMessage], int]]:
+    """Decide whether the conversation window is over budget.
+
+    Returns:
+        The messages to fold into the summary and the new number of summarized
+        messages, or None if the window fits in ``policy.max_tokens``.
+    """
+    sizes = [count_tokens(render_message(m)) for m in messages[summarized_count:]]
+    summary_tokens = count_tokens(summary) if summary else 0
+    if not sizes or summary_tokens + sum(sizes) <= policy.max_tokens:
+        return None
+
+    # keep the last messages verbatim, as many of the last keep_last as leave room
+    # in the budget for a summary of full length (about 4 tokens per 3 words)
+    room = policy.max_tokens - policy.summary_max_words * 4 // 3
+    kept, kept_tokens = 1, sizes[-1]
+    limit = min(policy.keep_last, len(sizes))
+    while kept < limit and kept_tokens + sizes[-kept - 1] <= room:
+        kept_tokens += sizes[-kept - 1]
+        kept += 1
+    if kept == len(sizes):
+        return None
+    cut = len(messages) - kept
+    return list(messages[summarized_count:cut]), cut
+
+
+def summary_prompt(
+    policy: CompactionPolicy, summary: Optional[str], messages: Sequence[BaseMessage]
+) -> List[BaseMessage]:
+    transcript = "\n\n".join(render_message(m) for m in messages)
+    return [
+        HumanMessage(
+            content=SUMMARY_PROMPT.format(
+                summary=summary or "(none yet)",
+                transcript=transcript,
+                max_words=policy.summary_max_words,
+            )
+        )
+    ]
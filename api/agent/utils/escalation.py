@@ -0,0 +1,68 @@
+import logging
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from langchain_core.language_models import LanguageModelLike
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+
+def response_confidence(response: BaseMessage) -> Optional[float]:
+    """Mean token probability of a response, from the logprobs the provider
+    returned with it (OpenAI models created with ``logprobs=True``).
+
+    Returns None when the response has no logprobs.
+    """
+    metadata = getattr(response, "response_metadata", None) or {}
+    logprobs = (metadata.get("logprobs") or {}).get("content") or []
+    values = [token["logprob"] for token in logprobs if token.get("logprob") is not None]
+    if not values:
+        return None
+    return math.exp(sum(values) / len(values))
+
+
+@dataclass
+class EscalationPolicy:
+    """When to retry a node's model call on a stronger model.
+
+    A call is retried once on ``model`` when the node finds its response
+    unparseable, or when ``min_confidence`` is set and the response's mean
+    token probability is below it. The retry's response replaces the first.
+    """
+
+    model: LanguageModelLike
+    """The stronger model."""
+    nodes: Sequence[str] = ("meta_prompter", "expert")
+    """Nodes whose calls may be escalated."""
+    min_confidence: Optional[float] = None
+    """Needs a model that returns logprobs; responses without them are not
+    judged by confidence."""
+    escalations: Counter = field(default_factory=Counter, init=False, repr=False)
+
+    def reason(
+        self,
+        node: str,
+        response: BaseMessage,
+        problem: Callable[[BaseMessage], Optional[str]],
+    ) -> Optional[str]:
+        """Why the response of ``node`` should be escalated, if it should.
+
+        ``problem`` is the node's own check of the response, returning what
+        makes it unusable.
+        """
+        if node not in self.nodes:
+            return None
+        reason = problem(response)
+        if reason is None and self.min_confidence is not None:
+            confidence = response_confidence(response)
+            if confidence is not None and confidence < self.min_confidence:
+                reason = f"confidence {confidence:.2f} below {self.min_confidence:.2f}"
+        if reason is not None:
+            self.escalations[node] += 1
+        return reason
+
+    def stats(self) -> Dict[str, Any]:
+        return {"escalations": dict(self.escalations)}
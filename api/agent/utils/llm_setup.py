@@ -45,3 +45,14 @@ def get_llm(provider: str, model_name: Optional[str] = None, **kwargs) -> BaseLL
         kwargs["model_name"] = model_name
     
     return LLMFactory.create_llm(provider, **kwargs)
+
+def get_llm_from_spec(spec: str, **kwargs) -> BaseLLM:
+    """
+    Get an LLM instance from a "provider:model_name" spec, e.g. "openai:gpt-4o-mini".
+    
+    :param spec: The provider, optionally followed by a colon and the model name
+    :param kwargs: Additional keyword arguments for LLM initialization
+    :return: An instance of the specified LLM
+    """
+    provider, _, model_name = spec.partition(":")
+    return get_llm(provider.strip(), model_name.strip() or None, **kwargs)
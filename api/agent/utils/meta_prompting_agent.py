@@ -1,161 +1,640 @@
 # Set up logging
 import operator
 import logging
-from typing import Annotated, Literal, TypedDict, Sequence
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, FunctionMessage
+import re
+import string
+from typing import Annotated, Literal, Optional, TypedDict, Sequence
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, FunctionMessage, SystemMessage, ToolMessage
 from langchain_core.tools import BaseTool
 from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import patch_config
 from langchain_core.language_models import LanguageModelLike
 from langgraph.graph import StateGraph, END
+from langgraph.constants import Send
 from langgraph.prebuilt import ToolExecutor
 from langgraph.checkpoint import MemorySaver
 from agent.utils.prompt_loader import load_markdown_prompt
 from langgraph.prebuilt.tool_executor import ToolInvocation
+from langgraph.utils import RunnableCallable
+from agent.utils.transcript import TranscriptRenderer, message_text, tool_call_text
+from agent.utils.budget import (
+    RequestBudget,
+    ToolBudgetExceeded,
+    final_turn_reason,
+    remaining_tool_calls,
+    response_tokens,
+)
+from agent.utils.escalation import EscalationPolicy
+from agent.utils.prompt_cache import (
+    PromptCacheStats,
+    prompt_for,
+    supports_cache_control,
+    text_blocks,
+    with_cache_breakpoint,
+)
+from agent.utils.compaction import (
+    CompactionPolicy,
+    conversation_window,
+    messages_to_compact,
+    summary_prompt,
+)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def merge_expert_results(left: Optional[list[dict]], right: list[dict]) -> list[dict]:
+    # Results of the experts of one dispatch accumulate; a new dispatch replaces them
+    dispatch = right[0]["dispatch"] if right else None
+    return [r for r in left or [] if r["dispatch"] == dispatch] + right
+
 # Define the state
 class MetaPromptingState(TypedDict):
     messages: Annotated[list[BaseMessage], operator.add]
     error_log: list[str]
     turn_count: int
+    # Running summary of messages[:summarized_count], used in prompts in their place
+    summary: str
+    summarized_count: int
+    # What the parallel experts of the latest dispatch returned, merged by the join node
+    expert_results: Annotated[list[dict], merge_expert_results]
+    # Limits of the current request (RequestBudget.start) and what it has used of them
+    budget: dict
+    tokens_used: int
+    tool_calls_used: int
+
+# The input of each expert branch: the state plus the task it was sent
+class ExpertTaskState(MetaPromptingState):
+    expert_task: Optional[str]
+    task_index: int
+    dispatch: int
+    # The share of the request's remaining tool calls this expert may make
+    tool_call_allowance: Optional[int]
 
 # Load meta-prompter instructions
 META_PROMPTER_INSTRUCTIONS = load_markdown_prompt("../prompts/meta-prompter.md")
 
 MAX_TURNS = 15  # Increased maximum number of turns for more complex queries
 
+FINAL_TURN_PROMPT = "The {reason} of this request is nearly used up, so no more experts can be consulted. Respond now with 'FINAL ANSWER:' followed by the most complete answer you can give from the conversation so far."
+
+EXPERT_REQUEST_MARKER = re.compile(r"`*\s*EXPERT REQUEST:")
+
+TOOL_REQUEST = re.compile(
+    r"Tool:\s*(?P<tool>[^\n]*?)\s*Input:\s*(?P<input>.*?)\s*(?=\n\s*Tool:|\Z)", re.DOTALL
+)
+
+def parse_tool_requests(content: str) -> list[ToolInvocation]:
+    """Parse every Tool/Input pair of an expert response, in order."""
+    return [
+        ToolInvocation(tool=match["tool"].strip(), tool_input=match["input"])
+        for match in TOOL_REQUEST.finditer(content)
+    ]
+
+def tool_call_invocations(response: AIMessage) -> list[ToolInvocation]:
+    """The native tool calls of a model response as tool invocations, in order."""
+    return [
+        ToolInvocation(tool=call["name"], tool_input=call["args"])
+        for call in response.tool_calls
+    ]
+
+def text_protocol_messages(messages: Sequence[BaseMessage]) -> list[BaseMessage]:
+    """Rewrite native tool calls and their ToolMessages in the text tool protocol.
+
+    Providers reject tool calls in the history of a model that has no tools bound,
+    so the meta-prompter sees them as the text protocol would have produced them.
+    """
+    rewritten = []
+    for message in messages:
+        if isinstance(message, AIMessage) and message.tool_calls:
+            content = "\n".join(filter(None, [message_text(message), tool_call_text(message)]))
+            message = AIMessage(content=content)
+        elif isinstance(message, ToolMessage):
+            message = FunctionMessage(content=message_text(message), name=message.name or "tool")
+        rewritten.append(message)
+    return rewritten
+
+def split_expert_requests(content: str) -> list[str]:
+    """Split a meta-prompter turn holding several EXPERT REQUEST blocks into its tasks.
+
+    Returns an empty list for a turn with a single request, which goes to one expert
+    as a whole.
+    """
+    tasks = [
+        task.strip("`" + string.whitespace)
+        for task in EXPERT_REQUEST_MARKER.split(content)
+    ]
+    tasks = [task for task in tasks if task]
+    return tasks if len(tasks) > 1 else []
+
 async def create_meta_prompting_agent(
     model: LanguageModelLike,
     tools: Sequence[BaseTool],
     checkpointer: MemorySaver = None,
+    compaction: Optional[CompactionPolicy] = None,
+    max_parallel_experts: int = 4,
+    max_parallel_tools: int = 4,
+    native_tool_calling: bool = False,
+    prompt_cache_stats: Optional[PromptCacheStats] = None,
+    budget: Optional[RequestBudget] = None,
+    models: Optional[dict[str, LanguageModelLike]] = None,
+    escalation: Optional[EscalationPolicy] = None,
 ):
     # Create ToolExecutor
     tool_executor = ToolExecutor(tools)
 
-    # Create the meta-prompter node
-    def meta_prompter(state: MetaPromptingState, config: RunnableConfig):
-        messages = state['messages']
-        turn_count = state.get('turn_count', 0) + 1
-        
-        if turn_count > MAX_TURNS:
-            logger.info(f"Reached maximum turns ({MAX_TURNS}). Forcing end of conversation.")
-            return {
-                "messages": [AIMessage(content="I apologize, but I've been unable to provide a satisfactory answer within a reasonable number of steps. Here's my best attempt at a final answer based on what we've discussed: [Summary of the conversation]")],
-                "turn_count": turn_count,
-                "error_log": state.get("error_log", []) + ["Reached maximum turns"],
+    # Each node can have its own model, e.g. a small fast one for the many meta-prompter
+    # turns and a stronger one for experts; `model` serves the nodes without one
+    models = models or {}
+    meta_prompter_model = models.get("meta_prompter", model)
+    expert_model = models.get("expert", model)
+    compact_model = models.get("compact", model)
+    escalation_models = {node: escalation.model for node in escalation.nodes} if escalation else {}
+
+    # With native tool calling, the expert model gets the tools bound and returns
+    # structured tool calls; the text protocol stays as a fallback for models that
+    # do not support it and for responses that use it anyway
+    if native_tool_calling and tools:
+        try:
+            expert_model, escalation_models = expert_model.bind_tools(tools), {
+                node: node_model.bind_tools(tools) if node == "expert" else node_model
+                for node, node_model in escalation_models.items()
             }
-        
-        response = model.invoke(
-            [
-                HumanMessage(content=f"{META_PROMPTER_INSTRUCTIONS}\n\nRemember to use available tools for up-to-date information when necessary. When you have a final answer, start your response with 'FINAL ANSWER:' and be sure it's comprehensive."),
-                *messages
-            ],
-            config
+        except (AttributeError, NotImplementedError):
+            logger.warning("Model does not support native tool calling, using the text tool protocol")
+            native_tool_calling = False
+    else:
+        native_tool_calling = False
+
+    # Requests are limited by the deadline, tokens, tool calls and turns of a
+    # RequestBudget, which config["configurable"] can override per request
+    default_budget = budget or RequestBudget(max_turns=MAX_TURNS)
+
+    def current_budget(state: MetaPromptingState) -> dict:
+        return state.get("budget") or default_budget.start()
+
+    def state_usage(state: MetaPromptingState) -> dict:
+        return {
+            "budget": current_budget(state),
+            "tokens_used": state.get("tokens_used") or 0,
+            "tool_calls_used": state.get("tool_calls_used") or 0,
+        }
+
+    # Every invocation of the graph enters through start_request, which starts the
+    # budget of that request whatever the state carries over from earlier ones;
+    # the other nodes carry the budget and usage in the state on
+    def start_request(state: MetaPromptingState, config: RunnableConfig):
+        return {
+            "budget": RequestBudget.from_config(config, default_budget).start(),
+            "tokens_used": 0,
+            "tool_calls_used": 0,
+        }
+
+    def final_turn(usage: dict, turn: int) -> Optional[str]:
+        return final_turn_reason(usage["budget"], turn, usage["tokens_used"], usage["tool_calls_used"])
+
+    # The meta-prompter and expert nodes come in sync and async variants that share
+    # everything but the model and tool calls: graph.invoke/stream (run.py) use the
+    # sync ones, while langserve's ainvoke/astream use the async ones, so concurrent
+    # conversations wait on I/O in the event loop instead of each holding a thread
+    def max_turns_result(state: MetaPromptingState, turn_count: int, usage: dict):
+        logger.info(f"Reached maximum turns ({usage['budget']['max_turns']}). Forcing end of conversation.")
+        return {
+            "messages": [AIMessage(content="I apologize, but I've been unable to provide a satisfactory answer within a reasonable number of steps. Here's my best attempt at a final answer based on what we've discussed: [Summary of the conversation]")],
+            "turn_count": turn_count,
+            "error_log": (state.get("error_log") or []) + ["Reached maximum turns"],
+            **usage,
+        }
+
+    # Prompts are a fixed system prefix followed by the conversation, which only grows
+    # between turns, so providers can serve everything but the newest messages from
+    # their prompt cache. Anthropic needs cache_control breakpoints for that: one after
+    # the system prefix and one after the conversation, which the next turn reads back
+    meta_prompter_cache_control = supports_cache_control(meta_prompter_model)
+    expert_cache_control = supports_cache_control(expert_model)
+    prompt_cache_stats = prompt_cache_stats or PromptCacheStats()
+
+    def system_message(text: str, cache_control: bool) -> SystemMessage:
+        return SystemMessage(content=text_blocks([text], breakpoint=True) if cache_control else text)
+
+    # Calls go to the node's model; with an escalation policy, a response the node
+    # cannot use is retried once on the stronger model, and the tokens of both count
+    def escalation_reason(node: str, response, problem) -> Optional[str]:
+        if node not in escalation_models or problem is None:
+            return None
+        return escalation.reason(node, response, problem)
+
+    def call_model(node: str, node_model, messages: list[BaseMessage], config: RunnableConfig, problem=None):
+        response = node_model.invoke(prompt_for(node_model, messages), config)
+        prompt_cache_stats.record(node, response)
+        tokens = response_tokens(response)
+        reason = escalation_reason(node, response, problem)
+        if reason is not None:
+            logger.info(f"Escalating {node} to the stronger model: {reason}")
+            strong_model = escalation_models[node]
+            response = strong_model.invoke(prompt_for(strong_model, messages), config)
+            prompt_cache_stats.record(f"{node} (escalated)", response)
+            tokens += response_tokens(response)
+        return response, tokens
+
+    async def acall_model(node: str, node_model, messages: list[BaseMessage], config: RunnableConfig, problem=None):
+        response = await node_model.ainvoke(prompt_for(node_model, messages), config)
+        prompt_cache_stats.record(node, response)
+        tokens = response_tokens(response)
+        reason = escalation_reason(node, response, problem)
+        if reason is not None:
+            logger.info(f"Escalating {node} to the stronger model: {reason}")
+            strong_model = escalation_models[node]
+            response = await strong_model.ainvoke(prompt_for(strong_model, messages), config)
+            prompt_cache_stats.record(f"{node} (escalated)", response)
+            tokens += response_tokens(response)
+        return response, tokens
+
+    def window(state: MetaPromptingState):
+        return conversation_window(
+            state['messages'], state.get("summary"), state.get("summarized_count") or 0
         )
-        
-        result = {
-            "messages": [AIMessage(content=f"EXPERT REQUEST: ```{response.content}```")],
+
+    meta_prompter_system = system_message(f"{META_PROMPTER_INSTRUCTIONS}\n\nRemember to use available tools for up-to-date information when necessary. When you have a final answer, start your response with 'FINAL ANSWER:' and be sure it's comprehensive.", meta_prompter_cache_control)
+
+    def meta_prompter_messages(state: MetaPromptingState, final_reason: Optional[str]):
+        messages = text_protocol_messages(window(state))
+        if meta_prompter_cache_control and messages:
+            messages[-1] = with_cache_breakpoint(messages[-1])
+        if final_reason:
+            logger.info(f"The request's {final_reason} is nearly used up, forcing a final answer")
+            messages.append(HumanMessage(content=FINAL_TURN_PROMPT.format(reason=final_reason)))
+        return [meta_prompter_system, *messages]
+
+    # A response the meta-prompter cannot use asks no expert and gives no answer
+    def meta_prompter_problem(response) -> Optional[str]:
+        content = message_text(response)
+        if not content.strip():
+            return "empty response"
+        if "FINAL ANSWER:" not in content and "expert_name" not in content and not EXPERT_REQUEST_MARKER.search(content):
+            return "neither an expert request nor a final answer"
+        return None
+
+    def meta_prompter_result(state: MetaPromptingState, turn_count: int, response, tokens: int, usage: dict, final_reason: Optional[str]):
+        content = message_text(response)
+        if final_reason and "FINAL ANSWER:" not in content:
+            content = f"FINAL ANSWER: {content}"
+        return {
+            "messages": [AIMessage(content=f"EXPERT REQUEST: ```{content}```")],
             "turn_count": turn_count,
-            "error_log": state.get("error_log", []),
+            "error_log": state.get("error_log") or [],
+            **usage,
+            "tokens_used": usage["tokens_used"] + tokens,
         }
-        
-        return result
 
-    # Create the expert node with ReAct-like behavior
-    def expert_node(state: MetaPromptingState, config: RunnableConfig):
-        messages = state['messages']
-        tool_names = ", ".join([tool.name for tool in tools])
-        
-        expert_prompt = f"""You are an expert assistant with access to the following tools: {tool_names}. 
-        Use them when necessary to provide accurate and up-to-date information. 
-        To use a tool, respond with the tool name and input in the following format:
+    # Create the meta-prompter node; with compaction, the compact node starts requests
+    def meta_prompter(state: MetaPromptingState, config: RunnableConfig):
+        usage = state_usage(state)
+        turn_count = (state.get('turn_count') or 0) + 1
+        if turn_count > usage["budget"]["max_turns"]:
+            return max_turns_result(state, turn_count, usage)
+
+        # the forced final answer turn is not escalated, as it has no time or tokens to spare
+        final_reason = final_turn(usage, turn_count)
+        response, tokens = call_model(
+            "meta_prompter", meta_prompter_model, meta_prompter_messages(state, final_reason), config,
+            None if final_reason else meta_prompter_problem,
+        )
+        return meta_prompter_result(state, turn_count, response, tokens, usage, final_reason)
+
+    async def ameta_prompter(state: MetaPromptingState, config: RunnableConfig):
+        usage = state_usage(state)
+        turn_count = (state.get('turn_count') or 0) + 1
+        if turn_count > usage["budget"]["max_turns"]:
+            return max_turns_result(state, turn_count, usage)
+
+        # the forced final answer turn is not escalated, as it has no time or tokens to spare
+        final_reason = final_turn(usage, turn_count)
+        response, tokens = await acall_model(
+            "meta_prompter", meta_prompter_model, meta_prompter_messages(state, final_reason), config,
+            None if final_reason else meta_prompter_problem,
+        )
+        return meta_prompter_result(state, turn_count, response, tokens, usage, final_reason)
+
+    tool_names = ", ".join([tool.name for tool in tools])
+
+    # The conversation is rendered as a compact transcript that is cached per thread,
+    # so each turn only renders and counts the messages added since the last one
+    transcripts = TranscriptRenderer()
+
+    if native_tool_calling:
+        tool_instructions = """To use a tool, call it. To use several tools at once, call all of them in the same response; they run in parallel."""
+    else:
+        tool_instructions = """To use a tool, respond with the tool name and input in the following format:
         Tool: <tool_name>
         Input: <tool_input>
+        To use several tools at once, repeat the Tool and Input lines for each of them; they run in parallel."""
+
+    expert_instructions = f"""You are an expert assistant with access to the following tools: {tool_names}. 
+        Use them when necessary to provide accurate and up-to-date information. 
+        {tool_instructions}
         
         If you have a final answer, start your response with 'FINAL ANSWER:' and ensure it's comprehensive.
         
-        Current conversation:
-        {messages}
+        The current conversation follows."""
+    expert_system = system_message(expert_instructions, expert_cache_control)
+
+    def expert_question(task_section: str = "") -> str:
+        return f"""{task_section}
         
         What would you like to do next? Consider using a tool if you need current information or specific data."""
-        
-        response = model.invoke([HumanMessage(content=expert_prompt)], config)
-        
-        if "Tool:" in response.content and "Input:" in response.content:
-            tool_name = response.content.split("Tool:")[1].split("\n")[0].strip()
-            tool_input = response.content.split("Input:")[1].strip()
-            
-            logger.info(f"Using tool: {tool_name}")
-            
-            try:
-                tool_invocation = ToolInvocation(tool=tool_name, tool_input=tool_input)
-                tool_result = tool_executor.invoke(tool_invocation)
-                
-                result = {
-                    "messages": [
-                        AIMessage(content=response.content),
-                        FunctionMessage(content=str(tool_result), name=tool_name)
-                    ],
-                    "error_log": state.get("error_log", [])
-                }
-            except Exception as e:
-                error_message = f"Error executing {tool_name}: {str(e)}"
-                logger.error(error_message)
-                result = {
-                    "messages": [AIMessage(content=f"I encountered an error while trying to use the {tool_name} tool. I'll try a different approach.")],
-                    "error_log": state.get("error_log", []) + [error_message]
-                }
+
+    expert_prompt_tokens = transcripts.count_tokens(expert_instructions) + transcripts.count_tokens(expert_question())
+
+    def expert_messages(state: ExpertTaskState, config: RunnableConfig):
+        thread_id = config.get("configurable", {}).get("thread_id")
+        # parallel experts share the rendered conversation and get their own task after it
+        transcript = transcripts.render(window(state), thread_id)
+        task_section = ""
+        if state.get("expert_task"):
+            task_section = f"\n\n        The meta-expert sent several requests at once. Handle only this one:\n        {state['expert_task']}"
+        logger.info(
+            f"Expert prompt for thread {thread_id}: "
+            f"{expert_prompt_tokens + transcript.tokens + transcripts.count_tokens(task_section)} tokens, "
+            f"{transcript.new_tokens} from new messages"
+        )
+        # the task of a parallel expert comes after the conversation, so parallel
+        # experts share the cached prefix too
+        question = expert_question(task_section)
+        if expert_cache_control:
+            # one block per message keeps earlier blocks identical from turn to turn
+            content = [*text_blocks(transcript.parts(), breakpoint=True), *text_blocks([question])]
         else:
-            result = {
-                "messages": [AIMessage(content=response.content)],
-                "error_log": state.get("error_log", [])
-            }
-        
-        result["turn_count"] = state.get("turn_count", 0)
-        return result
+            content = transcript.text + question
+        return [expert_system, HumanMessage(content=content)]
+
+    # Experts report to expert_results rather than messages, as several may run in
+    # the same step; the join node then appends their messages in dispatch order
+    def expert_result(state: ExpertTaskState, tokens: int, messages: list[BaseMessage], errors: Sequence[str] = (), tool_calls: int = 0):
+        return {
+            "expert_results": [{
+                "dispatch": state["dispatch"],
+                "index": state["task_index"],
+                "messages": messages,
+                "errors": list(errors),
+                "tokens": tokens,
+                "tool_calls": tool_calls,
+            }]
+        }
+
+    # Native tool calls are answered with ToolMessages, text protocol calls with
+    # FunctionMessages; either way each call of a turn gets its own message
+    def tool_requests(response) -> tuple[list[ToolInvocation], bool]:
+        if getattr(response, "invalid_tool_calls", None):
+            logger.warning(f"Ignoring {len(response.invalid_tool_calls)} tool calls with unparseable arguments")
+        if getattr(response, "tool_calls", None):
+            return tool_call_invocations(response), True
+        return parse_tool_requests(message_text(response)), False
+
+    # A response the expert cannot use is empty, names an unknown tool or has a tool
+    # request that does not parse
+    def expert_problem(response) -> Optional[str]:
+        if getattr(response, "invalid_tool_calls", None):
+            return "tool call arguments that do not parse"
+        if getattr(response, "tool_calls", None):
+            invocations = tool_call_invocations(response)
+        else:
+            content = message_text(response)
+            if not content.strip():
+                return "empty response"
+            invocations = parse_tool_requests(content)
+            if not invocations and "Tool:" in content:
+                return "a tool request that does not parse"
+        unknown = [invocation.tool for invocation in invocations if invocation.tool not in tool_executor.tool_map]
+        if unknown:
+            return f"unknown tool {unknown[0]}"
+        return None
+
+    def tool_message(invocation: ToolInvocation, content: str, tool_call: Optional[dict]):
+        if tool_call is None:
+            return FunctionMessage(content=content, name=invocation.tool)
+        return ToolMessage(content=content, name=invocation.tool, tool_call_id=tool_call["id"])
+
+    # A failed call reports its error in place of a result, unless every call failed
+    def tool_results(state: ExpertTaskState, response, tokens: int, invocations: list[ToolInvocation], outputs: list, native: bool):
+        errors = []
+        for invocation, output in zip(invocations, outputs):
+            if isinstance(output, Exception):
+                errors.append(f"Error executing {invocation.tool}: {str(output)}")
+                logger.error(errors[-1])
+
+        calls_made = sum(not isinstance(output, ToolBudgetExceeded) for output in outputs)
+        if len(errors) == len(invocations):
+            names = ", ".join(invocation.tool for invocation in invocations)
+            return expert_result(
+                state,
+                tokens,
+                [AIMessage(content=f"I encountered an error while trying to use the {names} tool{'s' if len(invocations) > 1 else ''}. I'll try a different approach.")],
+                errors,
+                calls_made,
+            )
+        tool_calls = response.tool_calls if native else [None] * len(invocations)
+        return expert_result(state, tokens, [
+            AIMessage(content=message_text(response), tool_calls=response.tool_calls if native else []),
+            *(
+                tool_message(
+                    invocation,
+                    f"Error: {str(output)}" if isinstance(output, Exception) else str(output),
+                    tool_call,
+                )
+                for invocation, output, tool_call in zip(invocations, outputs, tool_calls)
+            ),
+        ], errors, calls_made)
+
+    def tools_config(config: RunnableConfig) -> RunnableConfig:
+        return patch_config(config, max_concurrency=max_parallel_tools)
+
+    # Calls over the expert's allowance are not made and report the budget as their error
+    def allowed_tool_calls(state: ExpertTaskState, invocations: list[ToolInvocation]):
+        allowance = state.get("tool_call_allowance")
+        if allowance is None or len(invocations) <= allowance:
+            return invocations, []
+        logger.info(f"Tool call budget allows {allowance} of {len(invocations)} tool calls")
+        return invocations[:allowance], [
+            ToolBudgetExceeded("the request's tool call budget is used up")
+            for _ in invocations[allowance:]
+        ]
+
+    def answer_result(state: ExpertTaskState, response, tokens: int):
+        return expert_result(state, tokens, [AIMessage(content=message_text(response))])
+
+    # Create the expert node with ReAct-like behavior
+    def expert_node(state: ExpertTaskState, config: RunnableConfig):
+        response, tokens = call_model("expert", expert_model, expert_messages(state, config), config, expert_problem)
+
+        invocations, native = tool_requests(response)
+        if not invocations:
+            return answer_result(state, response, tokens)
+
+        logger.info(f"Using tools: {', '.join(invocation.tool for invocation in invocations)}")
+        allowed, skipped = allowed_tool_calls(state, invocations)
+        outputs = tool_executor.batch(allowed, tools_config(config), return_exceptions=True)
+        return tool_results(state, response, tokens, invocations, outputs + skipped, native)
+
+    async def aexpert_node(state: ExpertTaskState, config: RunnableConfig):
+        response, tokens = await acall_model("expert", expert_model, expert_messages(state, config), config, expert_problem)
+
+        invocations, native = tool_requests(response)
+        if not invocations:
+            return answer_result(state, response, tokens)
+
+        logger.info(f"Using tools: {', '.join(invocation.tool for invocation in invocations)}")
+        allowed, skipped = allowed_tool_calls(state, invocations)
+        outputs = await tool_executor.abatch(allowed, tools_config(config), return_exceptions=True)
+        return tool_results(state, response, tokens, invocations, outputs + skipped, native)
+
+    # Create the compaction node, which folds older messages into the running summary
+    # once the conversation outgrows the token budget
+    def compaction_request(state: MetaPromptingState, usage: dict):
+        # a forced final answer turn does not spend time and tokens on a summary
+        if final_turn(usage, (state.get("turn_count") or 0) + 1):
+            return None
+        return messages_to_compact(
+            compaction,
+            state['messages'],
+            state.get("summary"),
+            state.get("summarized_count") or 0,
+            transcripts.count_tokens,
+        )
+
+    def compaction_result(state: MetaPromptingState, summarized_count: int, response, tokens: int, usage: dict):
+        logger.info(
+            f"Summarized {summarized_count - (state.get('summarized_count') or 0)} messages, "
+            f"keeping {len(state['messages']) - summarized_count} verbatim"
+        )
+        return {
+            "summary": response.content,
+            "summarized_count": summarized_count,
+            **usage,
+            "tokens_used": usage["tokens_used"] + tokens,
+        }
+
+    def compact(state: MetaPromptingState, config: RunnableConfig):
+        usage = state_usage(state)
+        request = compaction_request(state, usage)
+        if request is None:
+            return usage
+        messages, summarized_count = request
+        response, tokens = call_model("compact", compact_model, summary_prompt(compaction, state.get("summary"), messages), config)
+        return compaction_result(state, summarized_count, response, tokens, usage)
+
+    async def acompact(state: MetaPromptingState, config: RunnableConfig):
+        usage = state_usage(state)
+        request = compaction_request(state, usage)
+        if request is None:
+            return usage
+        messages, summarized_count = request
+        response, tokens = await acall_model("compact", compact_model, summary_prompt(compaction, state.get("summary"), messages), config)
+        return compaction_result(state, summarized_count, response, tokens, usage)
 
     # Define the function to determine whether to continue or end
+    # Once the next turn has to give the final answer, experts are no longer consulted
+    # and the meta-prompter gets that turn instead
     def should_continue(state: MetaPromptingState) -> Literal["continue", "expert", "end"]:
         last_message = state['messages'][-1].content if state['messages'] else ""
+        turn_count = state.get("turn_count") or 0
+        usage = state_usage(state)
         
         if "FINAL ANSWER:" in last_message:
             logger.info("FINAL ANSWER detected, ending conversation")
             return "end"
-        elif state.get("turn_count", 0) >= MAX_TURNS:
+        elif turn_count >= usage["budget"]["max_turns"]:
             logger.info("Maximum turns reached, ending conversation")
             return "end"
         elif last_message.startswith("EXPERT REQUEST:"):
-            return "expert"
+            return "continue" if final_turn(usage, turn_count + 1) else "expert"
         else:
             return "continue"
 
+    # Send each task of an expert request to its own expert branch, so independent
+    # tasks run in parallel; the messages count identifies the dispatch
+    def dispatch_experts(state: MetaPromptingState) -> list[Send]:
+        tasks = split_expert_requests(state['messages'][-1].content) or [None]
+        if len(tasks) > max_parallel_experts:
+            logger.warning(f"Dropping {len(tasks) - max_parallel_experts} expert tasks over the limit of {max_parallel_experts}")
+            tasks = tasks[:max_parallel_experts]
+        if len(tasks) > 1:
+            logger.info(f"Dispatching {len(tasks)} experts in parallel")
+        dispatch = len(state['messages'])
+        # the experts share the remaining tool calls evenly
+        remaining = remaining_tool_calls(current_budget(state), state.get("tool_calls_used") or 0)
+        return [
+            Send("expert", {
+                **state,
+                "expert_task": task,
+                "task_index": index,
+                "dispatch": dispatch,
+                "tool_call_allowance": None if remaining is None else remaining // len(tasks) + (index < remaining % len(tasks)),
+            })
+            for index, task in enumerate(tasks)
+        ]
+
+    def route(state: MetaPromptingState):
+        decision = should_continue(state)
+        return dispatch_experts(state) if decision == "expert" else decision
+
+    def dispatch_results(state: MetaPromptingState):
+        # merge_expert_results only keeps the results of the latest dispatch
+        return sorted(state.get("expert_results") or [], key=lambda r: r["index"])
+
+    # Create the join node, which merges the results of the experts of a dispatch
+    def join_experts(state: MetaPromptingState):
+        results = dispatch_results(state)
+        return {
+            "messages": [message for r in results for message in r["messages"]],
+            "error_log": (state.get("error_log") or []) + [error for r in results for error in r["errors"]],
+            "tokens_used": (state.get("tokens_used") or 0) + sum(r["tokens"] for r in results),
+            "tool_calls_used": (state.get("tool_calls_used") or 0) + sum(r["tool_calls"] for r in results),
+        }
+
+    def route_join(state: MetaPromptingState):
+        decision = route(state)
+        # the final answer of one of several parallel experts only covers its own task,
+        # so the meta-prompter gets to combine them
+        if decision == "end" and (state.get("turn_count") or 0) < current_budget(state)["max_turns"] and len(dispatch_results(state)) > 1:
+            return "continue"
+        return decision
+
     # Create the graph
     workflow = StateGraph(MetaPromptingState)
 
     # Add nodes
-    workflow.add_node("meta_prompter", meta_prompter)
-    workflow.add_node("expert", expert_node)
+    workflow.add_node("meta_prompter", RunnableCallable(meta_prompter, ameta_prompter, name="meta_prompter"))
+    workflow.add_node("expert", RunnableCallable(expert_node, aexpert_node, name="expert"))
+    workflow.add_node("join", join_experts)
+
+    # Every meta-prompter turn goes through compaction first, if enabled
+    next_turn = "meta_prompter"
+    if compaction is not None:
+        workflow.add_node("compact", RunnableCallable(compact, acompact, name="compact"))
+        workflow.add_edge("compact", "meta_prompter")
+        next_turn = "compact"
 
     # Set entry point
-    workflow.set_entry_point("meta_prompter")
+    workflow.add_node("start_request", start_request)
+    workflow.add_edge("start_request", next_turn)
+    workflow.set_entry_point("start_request")
 
     # Add edges
     workflow.add_conditional_edges(
         "meta_prompter",
-        should_continue,
+        route,
         {
-            "continue": "meta_prompter",
+            "continue": next_turn,
             "expert": "expert",
             "end": END
         }
     )
+    workflow.add_edge("expert", "join")
     workflow.add_conditional_edges(
-        "expert",
-        should_continue,
+        "join",
+        route_join,
         {
-            "continue": "meta_prompter",
+            "continue": next_turn,
             "expert": "expert",
             "end": END
         }
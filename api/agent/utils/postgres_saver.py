@@ -1,9 +1,20 @@
+import asyncio
+import io
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
 from contextlib import asynccontextmanager, contextmanager
+from functools import partial
 from typing import (
     Any,
     AsyncGenerator,
     AsyncIterator,
+    Callable,
+    Dict,
     Generator,
+    NamedTuple,
     Optional,
     Union,
     Tuple,
@@ -12,12 +23,35 @@ from typing import (
 )
 
 import psycopg
+from psycopg.types.json import Jsonb
 from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint import BaseCheckpointSaver
+from langgraph.serde.base import SerializerProtocol
 from langgraph.serde.jsonplus import JsonPlusSerializer
 from langgraph.checkpoint.base import Checkpoint, CheckpointMetadata, CheckpointTuple
 from psycopg_pool import AsyncConnectionPool, ConnectionPool
 
+from agent.utils.checkpoint_archive import aimport_archive, import_archive
+from agent.utils.checkpoint_blobs import (
+    UPSERT_BLOB_QUERY,
+    BlobStore,
+    blob_refs,
+    dump_value,
+    load_value,
+)
+from agent.utils.checkpoint_cache import CheckpointCache
+from agent.utils.checkpoint_migrations import amigrate, checkpoint_migrations, migrate
+from agent.utils.checkpoint_tiering import LOCK_THREAD_SHARED_QUERY, ArchiveStore
+from agent.utils.serde_executor import SerdeExecutor, estimate_size
+from agent.utils.write_buffer import (
+    Statement,
+    WriteBehindBuffer,
+    aexecute_pipelined,
+    execute_pipelined,
+)
+
+logger = logging.getLogger(__name__)
+
 
 class JsonAndBinarySerializer(JsonPlusSerializer):
     def _default(self, obj):
@@ -46,6 +80,225 @@ class JsonAndBinarySerializer(JsonPlusSerializer):
             raise NotImplementedError(f"Unknown serialization type: {s[0]}")
 
 
+class _DeltaHead(NamedTuple):
+    """The last checkpoint written for a thread, kept to diff the next one against."""
+
+    thread_ts: str
+    channel_values: dict[str, Any]
+    channel_versions: dict[str, Any]
+    depth: int
+
+
+def _diff_checkpoint(head: _DeltaHead, checkpoint: Checkpoint) -> dict[str, Any]:
+    """Build the delta payload that turns the ``head`` checkpoint into ``checkpoint``.
+
+    Channels whose version did not move are only named in ``carry``, list channels
+    that were appended to (e.g. ``operator.add`` message lists) only store the new
+    items in ``extend``, and everything else is stored in full.
+    """
+    values = checkpoint["channel_values"]
+    versions = checkpoint["channel_versions"]
+    changed: dict[str, Any] = {}
+    carry: list[str] = []
+    extend: dict[str, list[Any]] = {}
+    for channel, value in values.items():
+        if channel in head.channel_values:
+            previous = head.channel_values[channel]
+            version = versions.get(channel)
+            if value is previous or (
+                version is not None and version == head.channel_versions.get(channel)
+            ):
+                carry.append(channel)
+                continue
+            if (
+                isinstance(value, list)
+                and isinstance(previous, list)
+                and len(value) >= len(previous)
+                and all(a is b or a == b for a, b in zip(value, previous))
+            ):
+                extend[channel] = value[len(previous) :]
+                continue
+        changed[channel] = value
+    return {
+        "checkpoint": {**checkpoint, "channel_values": changed},
+        "carry": carry,
+        "extend": extend,
+    }
+
+
+def _apply_delta(base: Checkpoint, delta: dict[str, Any]) -> Checkpoint:
+    """Rebuild a full checkpoint from its parent and a delta payload."""
+    base_values = base["channel_values"]
+    values = {channel: base_values[channel] for channel in delta["carry"]}
+    for channel, items in delta["extend"].items():
+        values[channel] = [*base_values[channel], *items]
+    values.update(delta["checkpoint"]["channel_values"])
+    return {**delta["checkpoint"], "channel_values": values}
+
+
+def _load_checkpoint(
+    serde: SerializerProtocol,
+    checkpoint: bytes,
+    is_delta: bool,
+    chain: Optional[List[bytes]],
+    complete: Optional[bool],
+    blobs: Dict[str, bytes],
+) -> Checkpoint:
+    """Deserialize a checkpoint row, replaying its delta chain if needed.
+
+    Args:
+        checkpoint: The serialized checkpoint column of the row.
+        is_delta: Whether the row stores a delta rather than a full checkpoint.
+        chain: The serialized ancestors of a delta row, oldest (keyframe) first.
+        complete: Whether the chain reached a keyframe.
+        blobs: The blobs referenced by the row and its ancestors.
+    """
+    if not is_delta:
+        return load_value(serde, checkpoint, blobs)
+    if not chain or not complete:
+        raise ValueError("Delta checkpoint is missing the keyframe it is based on.")
+    state = load_value(serde, chain[0], blobs)
+    for blob in [*chain[1:], checkpoint]:
+        state = _apply_delta(state, load_value(serde, blob, blobs))
+    return state
+
+
+# The encode and decode steps are module-level functions so a process pool
+# ``SerdeExecutor`` can pickle them.
+
+
+def _encode_checkpoint(
+    serde: SerializerProtocol,
+    threshold: int,
+    payload: dict[str, Any],
+    metadata: CheckpointMetadata,
+) -> Tuple[bytes, bytes, Dict[str, bytes]]:
+    """Serialize a checkpoint payload and its metadata, and the blobs they use."""
+    blobs: Dict[str, bytes] = {}
+    return (
+        dump_value(serde, threshold, payload, blobs),
+        dump_value(serde, threshold, metadata, blobs),
+        blobs,
+    )
+
+
+def _encode_writes(
+    serde: SerializerProtocol, threshold: int, writes: Sequence[Tuple[str, Any]]
+) -> List[Tuple[bytes, Dict[str, bytes]]]:
+    """Serialize the value of each write, with the blobs it uses."""
+    encoded = []
+    for _, value in writes:
+        blobs: Dict[str, bytes] = {}
+        encoded.append((dump_value(serde, threshold, value, blobs), blobs))
+    return encoded
+
+
+def _decode_row(
+    serde: SerializerProtocol,
+    value: Tuple[Any, ...],
+    writes: List[Tuple[str, str, bytes, Optional[List[str]]]],
+    blobs: Dict[str, bytes],
+) -> Tuple[Checkpoint, CheckpointMetadata, List[Any]]:
+    """Deserialize a checkpoint row and the values of its pending writes."""
+    checkpoint, metadata, _, _, is_delta, chain, complete = value[:7]
+    return (
+        _load_checkpoint(serde, checkpoint, is_delta, chain, complete, blobs),
+        load_value(serde, metadata, blobs),
+        [load_value(serde, write[2], blobs) for write in writes],
+    )
+
+
+def _row_size(
+    value: Tuple[Any, ...],
+    writes: List[Tuple[str, str, bytes, Optional[List[str]]]],
+    blobs: Dict[str, bytes],
+) -> int:
+    """Serialized size of a checkpoint row, its ancestors, writes and blobs."""
+    return (
+        len(value[0])
+        + len(value[1])
+        + sum(len(blob) for blob in value[5] or [])
+        + sum(len(write[2]) for write in writes if write[2])
+        + sum(map(len, blobs.values()))
+    )
+
+
+FILTER_OPERATORS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<=", "$ne": "<>"}
+"""Comparison operators accepted in ``list``/``alist`` filters, e.g.
+``{"step": {"$gt": 10}}``. Plain values are matched by JSONB containment."""
+
+
+def _searchable_metadata(metadata: CheckpointMetadata) -> Jsonb:
+    """Return the metadata mirrored into the ``metadata_json`` column.
+
+    ``writes`` is left out: it repeats the state written by the step, which is
+    already stored in the checkpoint and would bloat the index.
+    """
+    return Jsonb(
+        {key: value for key, value in metadata.items() if key != "writes"},
+        dumps=partial(json.dumps, default=str),
+    )
+
+
+class _LazyDict(dict):
+    """A dict whose contents are produced by ``load`` the first time it is read.
+
+    Listed checkpoints are returned as these so that browsing history only pays
+    for deserializing the checkpoints that are actually looked at.
+    """
+
+    __slots__ = ("_load",)
+
+    def __init__(self, load: Callable[[], dict]):
+        super().__init__()
+        self._load = load
+
+    def _materialize(self) -> None:
+        if self._load is not None:
+            load, self._load = self._load, None
+            dict.update(self, load())
+
+    def __reduce__(self):
+        self._materialize()
+        return dict, (dict(self),)
+
+
+def _materializing(name: str) -> Callable:
+    method = getattr(dict, name)
+
+    def wrapper(self: _LazyDict, *args: Any, **kwargs: Any) -> Any:
+        self._materialize()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in (
+    "__getitem__",
+    "__setitem__",
+    "__delitem__",
+    "__iter__",
+    "__len__",
+    "__contains__",
+    "__eq__",
+    "__ne__",
+    "__repr__",
+    "__or__",
+    "__ior__",
+    "get",
+    "keys",
+    "values",
+    "items",
+    "copy",
+    "pop",
+    "popitem",
+    "setdefault",
+    "update",
+):
+    setattr(_LazyDict, _name, _materializing(_name))
+
+
 @contextmanager
 def _get_sync_connection(
     connection: Union[psycopg.Connection, ConnectionPool, None],
@@ -97,6 +350,66 @@ class PostgresSaver(BaseCheckpointSaver):
     If providing a connection object, please ensure that the connection is open
     and remember to close the connection when done.
     """
+    delta_mode: bool = False
+    """Store each checkpoint as a delta against its parent instead of a full snapshot.
+
+    Only the channels that changed since ``parent_ts`` are written, and appends to
+    list channels store just the new items. Reads rebuild the full checkpoint by
+    walking the ``parent_ts`` chain back to the nearest full ("keyframe") row.
+    """
+    keyframe_interval: int = 10
+    """Maximum number of consecutive delta rows before a full checkpoint is written."""
+    max_delta_heads: int = 1024
+    """Number of threads whose latest checkpoint is remembered for delta encoding."""
+    fetch_size: int = 100
+    """Rows fetched per round trip by the server-side cursor of ``list``/``alist``."""
+    blob_threshold: int = 0
+    """Size in characters from which messages and strings are stored out of line.
+
+    Such values (typically tool results) are written once to
+    ``checkpoint_blobs`` under the hash of their content and referenced from
+    checkpoints and writes, instead of being repeated in every checkpoint,
+    write and thread that holds them. 0 disables offloading; rows written
+    with offloading enabled stay readable either way.
+    """
+    blobs: BlobStore
+    """Reads referenced blobs, caching recently used ones in memory."""
+    serde_executor: Optional[SerdeExecutor] = None
+    """Moves the (de)serialization of large checkpoints in ``aput``, ``aput_writes``
+    and ``aget_tuple`` off the event loop. Without one they serialize inline."""
+    cache: Optional[CheckpointCache] = None
+    """Write-through cache of the latest checkpoint of each thread, if enabled.
+
+    Writes publish a notification on ``INVALIDATION_CHANNEL``. When several API
+    replicas share the database, start ``alisten`` on each of them so entries
+    written elsewhere are dropped.
+    """
+
+    write_buffer: Optional[WriteBehindBuffer] = None
+    """Coalesces async writes of concurrent threads into shared transactions."""
+
+    sync_replica_connection: Optional[Union[psycopg.Connection, ConnectionPool]] = None
+    async_replica_connection: Optional[
+        Union[psycopg.AsyncConnection, AsyncConnectionPool]
+    ] = None
+    """A streaming replica that serves ``list``/``alist`` and stale-tolerant reads.
+
+    The latest checkpoint of a thread is read from the primary unless the config
+    sets ``allow_stale``, and threads this saver wrote in the last
+    ``replica_max_lag`` seconds are read from the primary so a caller always
+    sees its own writes. Reads fall back to the primary if the replica is down.
+    """
+    replica_max_lag: float = 5.0
+    """Seconds after a write during which reads of the thread avoid the replica."""
+    archive_store: Optional[ArchiveStore] = None
+    """Where ``tier_idle_threads`` moved the history of idle threads.
+
+    Reading a thread that has an ``archived_threads`` stub imports its archive
+    back into Postgres first. Listing across all threads does not include
+    archived threads.
+    """
+
+    INVALIDATION_CHANNEL = "checkpoint_invalidation"
 
     def __init__(
         self,
@@ -104,10 +417,51 @@ class PostgresSaver(BaseCheckpointSaver):
         async_connection: Optional[
             Union[psycopg.AsyncConnection, AsyncConnectionPool]
         ] = None,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        delta_mode: bool = False,
+        keyframe_interval: int = 10,
+        cache_max_bytes: int = 0,
+        write_behind: bool = False,
+        write_flush_interval: float = 0.002,
+        fetch_size: int = 100,
+        blob_threshold: int = 0,
+        blob_cache_max_bytes: int = 16 * 1024 * 1024,
+        serde_executor: Optional[SerdeExecutor] = None,
+        sync_replica_connection: Optional[
+            Union[psycopg.Connection, ConnectionPool]
+        ] = None,
+        async_replica_connection: Optional[
+            Union[psycopg.AsyncConnection, AsyncConnectionPool]
+        ] = None,
+        replica_max_lag: float = 5.0,
+        archive_store: Optional[ArchiveStore] = None,
     ):
-        super().__init__(serde=JsonPlusSerializer())
+        if replica_max_lag < 0:
+            raise ValueError("replica_max_lag must not be negative")
+        super().__init__(serde=serde or JsonPlusSerializer())
         self.sync_connection = sync_connection
         self.async_connection = async_connection
+        self.delta_mode = delta_mode
+        self.keyframe_interval = keyframe_interval
+        self.fetch_size = fetch_size
+        self.blob_threshold = blob_threshold
+        self.blobs = BlobStore(blob_cache_max_bytes)
+        self.serde_executor = serde_executor
+        self.sync_replica_connection = sync_replica_connection
+        self.async_replica_connection = async_replica_connection
+        self.replica_max_lag = replica_max_lag
+        self.archive_store = archive_store
+        self._recent_writes: OrderedDict[str, float] = OrderedDict()
+        self._delta_heads: OrderedDict[str, _DeltaHead] = OrderedDict()
+        self.cache = CheckpointCache(cache_max_bytes) if cache_max_bytes > 0 else None
+        self._instance_id = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self.write_buffer = (
+            WriteBehindBuffer(self._get_async_connection, write_flush_interval)
+            if write_behind
+            else None
+        )
 
     @contextmanager
     def _get_sync_connection(self) -> Generator[psycopg.Connection, None, None]:
@@ -123,64 +477,265 @@ class PostgresSaver(BaseCheckpointSaver):
         async with _get_async_connection(self.async_connection) as connection:
             yield connection
 
-    CREATE_TABLES_QUERY = """
-    CREATE TABLE IF NOT EXISTS checkpoints (
-        thread_id TEXT NOT NULL,
-        thread_ts TEXT NOT NULL,
-        parent_ts TEXT,
-        checkpoint BYTEA NOT NULL,
-        metadata BYTEA NOT NULL,
-        PRIMARY KEY (thread_id, thread_ts)
-    );
-    CREATE TABLE IF NOT EXISTS writes (
-        thread_id TEXT NOT NULL,
-        thread_ts TEXT NOT NULL,
-        task_id TEXT NOT NULL,
-        idx INTEGER NOT NULL,
-        channel TEXT NOT NULL,
-        value BYTEA,
-        PRIMARY KEY (thread_id, thread_ts, task_id, idx)
-    );
-    """
+    def _execute(self, statements: Sequence[Statement]) -> None:
+        """Commit ``statements`` in a single pipelined transaction."""
+        with self._get_sync_connection() as conn:
+            execute_pipelined(conn, statements)
+
+    async def _aexecute(self, statements: Sequence[Statement]) -> None:
+        """Commit ``statements`` in a single pipelined transaction.
+
+        With ``write_behind`` enabled the transaction is shared with whatever
+        other threads are writing at the same time.
+        """
+        if self.write_buffer is not None:
+            await self.write_buffer.submit(statements)
+            return
+        async with self._get_async_connection() as conn:
+            await aexecute_pipelined(conn, statements)
+
+    def _note_write(self, thread_id: str) -> None:
+        """Keep reads of ``thread_id`` on the primary until the replica catches up."""
+        replicas = (self.sync_replica_connection, self.async_replica_connection)
+        if all(replica is None for replica in replicas):
+            return
+        now = time.monotonic()
+        self._recent_writes[thread_id] = now
+        self._recent_writes.move_to_end(thread_id)
+        while self._recent_writes:
+            if next(iter(self._recent_writes.values())) >= now - self.replica_max_lag:
+                break
+            self._recent_writes.popitem(last=False)
+
+    def _use_replica(self, replica: Any, thread_id: Optional[str]) -> bool:
+        """Whether a read of ``thread_id`` (or of all threads) may go to ``replica``."""
+        if replica is None:
+            return False
+        written_at = self._recent_writes.get(thread_id) if thread_id else None
+        if written_at is None:
+            return True
+        return written_at < time.monotonic() - self.replica_max_lag
+
+    NOTIFY_QUERY = "SELECT pg_notify(%s, %s)"
+
+    def _notify_args(self, thread_id: str) -> Tuple[str, str]:
+        """Return the NOTIFY_QUERY parameters announcing a write to ``thread_id``."""
+        return self.INVALIDATION_CHANNEL, json.dumps([self._instance_id, thread_id])
+
+    async def alisten(self, conninfo: Optional[str] = None) -> None:
+        """Start dropping cached checkpoints that other processes overwrite.
+
+        Args:
+            conninfo: Connection string for the dedicated LISTEN connection.
+                Defaults to the conninfo of the async connection pool.
+        """
+        if self.cache is None or self._listener is not None:
+            return
+        if conninfo is None:
+            if not isinstance(self.async_connection, AsyncConnectionPool):
+                raise ValueError("A conninfo is required to listen without a pool.")
+            conninfo = self.async_connection.conninfo
+        self._listener = asyncio.create_task(self._listen(conninfo))
+
+    async def aclose_listener(self) -> None:
+        """Stop the task started by ``alisten``."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self, conninfo: str) -> None:
+        retry_delay = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    conninfo, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {self.INVALIDATION_CHANNEL}")
+                    # anything could have changed while we were not listening
+                    self.cache.clear()
+                    retry_delay = 1.0
+                    async for notify in conn.notifies():
+                        instance_id, thread_id = json.loads(notify.payload)
+                        if instance_id != self._instance_id:
+                            self.cache.invalidate(thread_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Checkpoint invalidation listener failed: {str(e)}")
+                self.cache.clear()
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30.0)
+
+    def _cache_put(
+        self,
+        thread_id: str,
+        parent_ts: Optional[str],
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        size: int,
+        is_delta: bool,
+    ) -> None:
+        """Cache a checkpoint that was just written."""
+        if self.cache is None:
+            return
+        if is_delta:
+            size += self.cache.size_of(thread_id, parent_ts)
+        self.cache.put(
+            thread_id,
+            CheckpointTuple(
+                config={
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "thread_ts": checkpoint["id"],
+                    }
+                },
+                checkpoint=checkpoint,
+                metadata=metadata,
+                parent_config={
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "thread_ts": parent_ts,
+                    }
+                }
+                if parent_ts
+                else None,
+                pending_writes=[],
+            ),
+            size,
+        )
 
     @staticmethod
-    def create_tables(connection: Union[psycopg.Connection, ConnectionPool], /) -> None:
-        """Create the schema for the checkpoint saver."""
+    def create_tables(
+        connection: Union[psycopg.Connection, ConnectionPool],
+        /,
+        *,
+        partitions: int = 0,
+    ) -> None:
+        """Create or migrate the schema for the checkpoint saver.
+
+        Args:
+            partitions: Hash-partition the tables by thread into this many
+                partitions. See ``checkpoint_migrations``.
+        """
         with _get_sync_connection(connection) as conn:
-            with conn.cursor() as cur:
-                cur.execute(PostgresSaver.CREATE_TABLES_QUERY)
+            migrate(conn, checkpoint_migrations(partitions))
 
     @staticmethod
     async def acreate_tables(
-        connection: Union[psycopg.AsyncConnection, AsyncConnectionPool], /
+        connection: Union[psycopg.AsyncConnection, AsyncConnectionPool],
+        /,
+        *,
+        partitions: int = 0,
     ) -> None:
-        """Create the schema for the checkpoint saver."""
+        """Create or migrate the schema for the checkpoint saver.
+
+        Args:
+            partitions: Hash-partition the tables by thread into this many
+                partitions. See ``checkpoint_migrations``.
+        """
         async with _get_async_connection(connection) as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(PostgresSaver.CREATE_TABLES_QUERY)
+            await amigrate(conn, checkpoint_migrations(partitions))
 
     @staticmethod
     def drop_tables(connection: psycopg.Connection, /) -> None:
         """Drop the table for the checkpoint saver."""
         with connection.cursor() as cur:
-            cur.execute("DROP TABLE IF EXISTS checkpoints, writes;")
+            cur.execute(
+                "DROP TABLE IF EXISTS checkpoints, writes, checkpoint_blobs, "
+                "archived_threads, checkpoint_schema_version;"
+            )
 
     @staticmethod
     async def adrop_tables(connection: psycopg.AsyncConnection, /) -> None:
         """Drop the table for the checkpoint saver."""
         async with connection.cursor() as cur:
-            await cur.execute("DROP TABLE IF EXISTS checkpoints, writes;")
+            await cur.execute(
+                "DROP TABLE IF EXISTS checkpoints, writes, checkpoint_blobs, "
+                "archived_threads, checkpoint_schema_version;"
+            )
 
     UPSERT_CHECKPOINT_QUERY = """
     INSERT INTO checkpoints 
-        (thread_id, thread_ts, parent_ts, checkpoint, metadata)
+        (thread_id, thread_ts, parent_ts, checkpoint, metadata, is_delta, metadata_json,
+         blob_refs)
     VALUES 
-        (%s, %s, %s, %s, %s)
+        (%s, %s, %s, %s, %s, %s, %s, %s)
     ON CONFLICT (thread_id, thread_ts)
     DO UPDATE SET checkpoint = EXCLUDED.checkpoint,
-                  metadata = EXCLUDED.metadata;
+                  metadata = EXCLUDED.metadata,
+                  is_delta = EXCLUDED.is_delta,
+                  metadata_json = EXCLUDED.metadata_json,
+                  blob_refs = EXCLUDED.blob_refs;
     """
 
+    async def _aserde(self, size: Callable[[], int], fn: Callable, *args: Any) -> Any:
+        """Run a (de)serialization step, off the event loop if it is large.
+
+        Args:
+            size: Returns the approximate number of bytes ``fn`` handles. Only
+                called when a ``serde_executor`` is configured.
+        """
+        if self.serde_executor is None:
+            return fn(*args)
+        return await self.serde_executor.run(size(), fn, *args)
+
+    def _blob_statements(self, blobs: Dict[str, bytes]) -> List[Statement]:
+        """Return the statements storing ``blobs``, to run before the rows using them.
+
+        Blobs are upserted in hash order so concurrent writers lock shared blobs
+        in the same order.
+        """
+        self.blobs.remember(blobs)
+        return [(UPSERT_BLOB_QUERY, item) for item in sorted(blobs.items())]
+
+    def _checkpoint_payload(
+        self, thread_id: str, parent_ts: Optional[str], checkpoint: Checkpoint
+    ) -> Tuple[dict[str, Any], bool, Optional[_DeltaHead]]:
+        """Return what to store for a checkpoint: a delta against its parent when
+        possible, else the checkpoint itself.
+
+        Returns the payload to serialize, whether it is a delta, and the head to
+        remember for the thread once the row has been written.
+        """
+        if not self.delta_mode:
+            return checkpoint, False, None
+
+        # forget the head until the write succeeds, so a failed write can never
+        # leave a delta pointing at a row that does not exist
+        head = self._delta_heads.pop(thread_id, None)
+        if (
+            head is not None
+            and parent_ts
+            and head.thread_ts == parent_ts
+            and checkpoint["id"] != parent_ts
+            and head.depth < self.keyframe_interval
+        ):
+            payload = _diff_checkpoint(head, checkpoint)
+            is_delta, depth = True, head.depth + 1
+        else:
+            payload, is_delta, depth = checkpoint, False, 0
+
+        new_head = _DeltaHead(
+            thread_ts=checkpoint["id"],
+            channel_values=checkpoint["channel_values"],
+            channel_versions=checkpoint["channel_versions"],
+            depth=depth,
+        )
+        return payload, is_delta, new_head
+
+    def _remember_head(self, thread_id: str, head: Optional[_DeltaHead]) -> None:
+        """Record the latest written checkpoint of a thread for delta encoding."""
+        if head is None:
+            return
+        self._delta_heads[thread_id] = head
+        self._delta_heads.move_to_end(thread_id)
+        while len(self._delta_heads) > self.max_delta_heads:
+            self._delta_heads.popitem(last=False)
+
     def put(
         self,
         config: RunnableConfig,
@@ -200,18 +755,42 @@ class PostgresSaver(BaseCheckpointSaver):
         """
         thread_id = config["configurable"]["thread_id"]
         parent_ts = config["configurable"].get("thread_ts")
-        with self._get_sync_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    self.UPSERT_CHECKPOINT_QUERY,
-                    (
-                        thread_id,
-                        checkpoint["id"],
-                        parent_ts if parent_ts else None,
-                        self.serde.dumps(checkpoint),
-                        self.serde.dumps(metadata),
-                    ),
-                )
+        payload, is_delta, head = self._checkpoint_payload(
+            thread_id, parent_ts, checkpoint
+        )
+        blob, metadata_blob, blobs = _encode_checkpoint(
+            self.serde, self.blob_threshold, payload, metadata
+        )
+        statements = [
+            (LOCK_THREAD_SHARED_QUERY, (thread_id,)),
+            *self._blob_statements(blobs),
+            (
+                self.UPSERT_CHECKPOINT_QUERY,
+                (
+                    thread_id,
+                    checkpoint["id"],
+                    parent_ts if parent_ts else None,
+                    blob,
+                    metadata_blob,
+                    is_delta,
+                    _searchable_metadata(metadata),
+                    sorted(blobs) or None,
+                ),
+            )
+        ]
+        if self.cache is not None:
+            statements.append((self.NOTIFY_QUERY, self._notify_args(thread_id)))
+        self._execute(statements)
+        self._note_write(thread_id)
+        self._remember_head(thread_id, head)
+        self._cache_put(
+            thread_id,
+            parent_ts,
+            checkpoint,
+            metadata,
+            len(blob) + len(metadata_blob) + sum(map(len, blobs.values())),
+            is_delta,
+        )
 
         return {
             "configurable": {
@@ -239,18 +818,47 @@ class PostgresSaver(BaseCheckpointSaver):
         """
         thread_id = config["configurable"]["thread_id"]
         parent_ts = config["configurable"].get("thread_ts")
-        async with self._get_async_connection() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(
-                    self.UPSERT_CHECKPOINT_QUERY,
-                    (
-                        thread_id,
-                        checkpoint["id"],
-                        parent_ts if parent_ts else None,
-                        self.serde.dumps(checkpoint),
-                        self.serde.dumps(metadata),
-                    ),
-                )
+        payload, is_delta, head = self._checkpoint_payload(
+            thread_id, parent_ts, checkpoint
+        )
+        blob, metadata_blob, blobs = await self._aserde(
+            lambda: estimate_size(payload) + estimate_size(metadata),
+            _encode_checkpoint,
+            self.serde,
+            self.blob_threshold,
+            payload,
+            metadata,
+        )
+        statements = [
+            (LOCK_THREAD_SHARED_QUERY, (thread_id,)),
+            *self._blob_statements(blobs),
+            (
+                self.UPSERT_CHECKPOINT_QUERY,
+                (
+                    thread_id,
+                    checkpoint["id"],
+                    parent_ts if parent_ts else None,
+                    blob,
+                    metadata_blob,
+                    is_delta,
+                    _searchable_metadata(metadata),
+                    sorted(blobs) or None,
+                ),
+            )
+        ]
+        if self.cache is not None:
+            statements.append((self.NOTIFY_QUERY, self._notify_args(thread_id)))
+        await self._aexecute(statements)
+        self._note_write(thread_id)
+        self._remember_head(thread_id, head)
+        self._cache_put(
+            thread_id,
+            parent_ts,
+            checkpoint,
+            metadata,
+            len(blob) + len(metadata_blob) + sum(map(len, blobs.values())),
+            is_delta,
+        )
 
         return {
             "configurable": {
@@ -261,36 +869,74 @@ class PostgresSaver(BaseCheckpointSaver):
 
     UPSERT_WRITES_QUERY = """
     INSERT INTO writes
-        (thread_id, thread_ts, task_id, idx, channel, value)
+        (thread_id, thread_ts, task_id, idx, channel, value, blob_refs)
     VALUES
-        (%s, %s, %s, %s, %s, %s)
+        (%s, %s, %s, %s, %s, %s, %s)
     ON CONFLICT (thread_id, thread_ts, task_id, idx)
-    DO UPDATE SET value = EXCLUDED.value;
+    DO UPDATE SET value = EXCLUDED.value, blob_refs = EXCLUDED.blob_refs;
     """
 
+    def _writes_statements(
+        self,
+        thread_id: str,
+        thread_ts: str,
+        task_id: str,
+        writes: Sequence[Tuple[str, Any]],
+        encoded: List[Tuple[bytes, Dict[str, bytes]]],
+    ) -> Tuple[List[Statement], int]:
+        """Return the statements storing ``writes`` and their serialized size.
+
+        Args:
+            encoded: The serialized values of ``writes`` from ``_encode_writes``.
+        """
+        blobs: Dict[str, bytes] = {}
+        params = []
+        for idx, ((channel, _), (value, value_blobs)) in enumerate(
+            zip(writes, encoded)
+        ):
+            params.append(
+                (
+                    thread_id,
+                    thread_ts,
+                    task_id,
+                    idx,
+                    channel,
+                    value,
+                    sorted(value_blobs) or None,
+                )
+            )
+            blobs.update(value_blobs)
+        size = sum(len(param[5]) for param in params) + sum(map(len, blobs.values()))
+        statements = [
+            (LOCK_THREAD_SHARED_QUERY, (thread_id,)),
+            *self._blob_statements(blobs),
+            *((self.UPSERT_WRITES_QUERY, param) for param in params),
+        ]
+        return statements, size
+
     def put_writes(
         self,
         config: RunnableConfig,
         writes: Sequence[Tuple[str, Any]],
         task_id: str,
     ) -> None:
-        with self._get_sync_connection() as conn:
-            with conn.cursor() as cur:
-                cur.executemany(
-                    self.UPSERT_WRITES_QUERY,
-                    [
-                        (
-                            str(config["configurable"]["thread_id"]),
-                            str(config["configurable"]["thread_ts"]),
-                            task_id,
-                            idx,
-                            channel,
-                            self.serde.dumps(value),
-                        )
-                        for idx, (channel, value) in enumerate(writes)
-                    ],
-                )
-            conn.commit()
+        thread_id = str(config["configurable"]["thread_id"])
+        thread_ts = str(config["configurable"]["thread_ts"])
+        encoded = _encode_writes(self.serde, self.blob_threshold, writes)
+        statements, size = self._writes_statements(
+            thread_id, thread_ts, task_id, writes, encoded
+        )
+        if self.cache is not None:
+            statements.append((self.NOTIFY_QUERY, self._notify_args(thread_id)))
+        self._execute(statements)
+        self._note_write(thread_id)
+        if self.cache is not None:
+            self.cache.add_writes(
+                thread_id,
+                thread_ts,
+                [(task_id, channel, value) for channel, value in writes],
+                size,
+            )
 
     async def aput_writes(
         self,
@@ -298,30 +944,127 @@ class PostgresSaver(BaseCheckpointSaver):
         writes: Sequence[Tuple[str, Any]],
         task_id: str,
     ) -> None:
-        async with self._get_async_connection() as conn:
-            async with conn.cursor() as cur:
-                await cur.executemany(
-                    self.UPSERT_WRITES_QUERY,
-                    [
-                        (
-                            str(config["configurable"]["thread_id"]),
-                            str(config["configurable"]["thread_ts"]),
-                            task_id,
-                            idx,
-                            channel,
-                            self.serde.dumps(value),
-                        )
-                        for idx, (channel, value) in enumerate(writes)
-                    ],
-                )
-            await conn.commit()
+        thread_id = str(config["configurable"]["thread_id"])
+        thread_ts = str(config["configurable"]["thread_ts"])
+        encoded = await self._aserde(
+            lambda: estimate_size([value for _, value in writes]),
+            _encode_writes,
+            self.serde,
+            self.blob_threshold,
+            writes,
+        )
+        statements, size = self._writes_statements(
+            thread_id, thread_ts, task_id, writes, encoded
+        )
+        if self.cache is not None:
+            statements.append((self.NOTIFY_QUERY, self._notify_args(thread_id)))
+        await self._aexecute(statements)
+        self._note_write(thread_id)
+        if self.cache is not None:
+            self.cache.add_writes(
+                thread_id,
+                thread_ts,
+                [(task_id, channel, value) for channel, value in writes],
+                size,
+            )
 
-    LIST_CHECKPOINTS_QUERY_STR = """
-    SELECT checkpoint, metadata, thread_ts, parent_ts
-    FROM checkpoints
+    CHECKPOINT_CHAIN_JOIN = """
+    LEFT JOIN LATERAL (
+        WITH RECURSIVE chain AS (
+            SELECT p.parent_ts, p.checkpoint, p.is_delta, p.blob_refs, 1 AS depth
+            FROM checkpoints p
+            WHERE c.is_delta
+                AND p.thread_id = c.thread_id AND p.thread_ts = c.parent_ts
+            UNION ALL
+            SELECT p.parent_ts, p.checkpoint, p.is_delta, p.blob_refs, chain.depth + 1
+            FROM chain
+            JOIN checkpoints p
+                ON p.thread_id = c.thread_id AND p.thread_ts = chain.parent_ts
+            WHERE chain.is_delta
+        )
+        SELECT array_agg(checkpoint ORDER BY depth DESC) AS blobs,
+               bool_or(NOT is_delta) AS complete,
+               (SELECT array_agg(DISTINCT ref) FROM chain, unnest(chain.blob_refs) ref)
+                   AS refs
+        FROM chain
+    ) base ON TRUE
+    """
+    """Joins the ancestors of a delta row (keyframe first) and the blobs they
+    reference onto checkpoints ``c``."""
+
+    LIST_CHECKPOINTS_QUERY_STR = (
+        """
+    SELECT c.checkpoint, c.metadata, c.thread_id, c.thread_ts, c.parent_ts,
+           c.is_delta, base.blobs, base.complete, c.blob_refs, base.refs
+    FROM checkpoints c
+    """
+        + CHECKPOINT_CHAIN_JOIN
+        + """
     {where}
-    ORDER BY thread_ts DESC
+    ORDER BY c.thread_id DESC, c.thread_ts DESC
+    {limit}
     """
+    )
+
+    def _list_query(
+        self,
+        config: Optional[RunnableConfig],
+        filter: Optional[dict[str, Any]],
+        before: Optional[RunnableConfig],
+        limit: Optional[int],
+    ) -> Tuple[str, List[Any]]:
+        where, args = self._search_where(config, filter, before)
+        if limit:
+            args.append(limit)
+        query = self.LIST_CHECKPOINTS_QUERY_STR.format(
+            where=where, limit="LIMIT %s" if limit else ""
+        )
+        return query, args
+
+    def _lazy_tuple(
+        self, row: Tuple[Any, ...], blobs: Dict[str, bytes]
+    ) -> CheckpointTuple:
+        """Build a listed checkpoint tuple that only decodes its payloads on access."""
+        (
+            checkpoint,
+            metadata,
+            thread_id,
+            thread_ts,
+            parent_ts,
+            is_delta,
+            chain,
+            complete,
+            _,
+            _,
+        ) = row
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "thread_ts": thread_ts,
+                }
+            },
+            checkpoint=_LazyDict(
+                partial(
+                    _load_checkpoint,
+                    self.serde,
+                    checkpoint,
+                    is_delta,
+                    chain,
+                    complete,
+                    blobs,
+                )
+            ),
+            metadata=_LazyDict(partial(load_value, self.serde, metadata, blobs)),
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "thread_ts": parent_ts,
+                }
+            }
+            if parent_ts
+            else None,
+        )
 
     def list(
         self,
@@ -331,35 +1074,66 @@ class PostgresSaver(BaseCheckpointSaver):
         before: Optional[RunnableConfig] = None,
         limit: Optional[int] = None,
     ) -> Generator[CheckpointTuple, None, None]:
-        """Get all the checkpoints for the given configuration."""
-        where, args = self._search_where(config, filter, before)
-        query = self.LIST_CHECKPOINTS_QUERY_STR.format(where=where)
-        if limit:
-            query += f" LIMIT {limit}"
-        with self._get_sync_connection() as conn:
-            with conn.cursor() as cur:
-                thread_id = config["configurable"]["thread_id"]
-                cur.execute(query, tuple(args))
-                for value in cur:
-                    checkpoint, metadata, thread_ts, parent_ts = value
-                    yield CheckpointTuple(
-                        config={
-                            "configurable": {
-                                "thread_id": thread_id,
-                                "thread_ts": thread_ts,
-                            }
-                        },
-                        checkpoint=self.serde.loads(checkpoint),
-                        metadata=self.serde.loads(metadata),
-                        parent_config={
-                            "configurable": {
-                                "thread_id": thread_id,
-                                "thread_ts": thread_ts,
-                            }
-                        }
-                        if parent_ts
-                        else None,
-                    )
+        """Get all the checkpoints for the given configuration.
+
+        Rows are streamed through a server-side cursor ``fetch_size`` at a time,
+        newest first, and each checkpoint and its metadata are only deserialized
+        when first accessed. Pass the config of the last tuple of a page as
+        ``before`` to get the next page. Blobs a row references are read as it
+        is streamed, unless they are already cached. A thread that lists no
+        rows is restored first if it was moved to the ``archive_store``.
+        """
+        query, args = self._list_query(config, filter, before, limit)
+        thread_id = config["configurable"]["thread_id"] if config else None
+        listed = False
+        for checkpoint_tuple in self._list_tuples(thread_id, query, args):
+            listed = True
+            yield checkpoint_tuple
+        if listed or not thread_id or self.archive_store is None:
+            return
+        # an archived thread has no rows until it is restored; re-read even if
+        # another reader restored it meanwhile
+        self._rehydrate(thread_id)
+        for row, blobs in self._list_rows(self.sync_connection, query, args):
+            yield self._lazy_tuple(row, blobs)
+
+    def _list_tuples(
+        self, thread_id: Optional[str], query: str, args: List[Any]
+    ) -> Generator[CheckpointTuple, None, None]:
+        """List from the replica if ``thread_id`` may be read there, else the primary."""
+        if self._use_replica(self.sync_replica_connection, thread_id):
+            listed = False
+            try:
+                for row, blobs in self._list_rows(
+                    self.sync_replica_connection, query, args
+                ):
+                    listed = True
+                    yield self._lazy_tuple(row, blobs)
+                return
+            except psycopg.OperationalError as e:
+                if listed:
+                    raise
+                logger.warning(
+                    f"Checkpoint replica unavailable, listing from primary: {str(e)}"
+                )
+        for row, blobs in self._list_rows(self.sync_connection, query, args):
+            yield self._lazy_tuple(row, blobs)
+
+    def _list_rows(
+        self,
+        connection: Union[psycopg.Connection, ConnectionPool],
+        query: str,
+        args: List[Any],
+    ) -> Generator[Tuple[Tuple[Any, ...], Dict[str, bytes]], None, None]:
+        """Stream the rows of ``query`` with the blobs each of them references."""
+        with _get_sync_connection(connection) as conn:
+            with conn.transaction():
+                with conn.cursor(name=f"list_{uuid.uuid4().hex}") as cur:
+                    cur.itersize = self.fetch_size
+                    cur.execute(query, tuple(args))
+                    for value in cur:
+                        refs = blob_refs(value[8], value[9])
+                        yield value, self.blobs.fetch(conn, refs)
 
     async def alist(
         self,
@@ -369,47 +1143,95 @@ class PostgresSaver(BaseCheckpointSaver):
         before: Optional[RunnableConfig] = None,
         limit: Optional[int] = None,
     ) -> AsyncIterator[CheckpointTuple]:
-        """Get all the checkpoints for the given configuration."""
-        where, args = self._search_where(config, filter, before)
-        query = self.LIST_CHECKPOINTS_QUERY_STR.format(where=where)
-        if limit:
-            query += f" LIMIT {limit}"
-        async with self._get_async_connection() as conn:
-            async with conn.cursor() as cur:
-                thread_id = config["configurable"]["thread_id"]
-                await cur.execute(query, tuple(args))
-                async for value in cur:
-                    checkpoint, metadata, thread_ts, parent_ts = value
-                    yield CheckpointTuple(
-                        config={
-                            "configurable": {
-                                "thread_id": thread_id,
-                                "thread_ts": thread_ts,
-                            }
-                        },
-                        checkpoint=self.serde.loads(checkpoint),
-                        metadata=self.serde.loads(metadata),
-                        parent_config={
-                            "configurable": {
-                                "thread_id": thread_id,
-                                "thread_ts": thread_ts,
-                            }
-                        }
-                        if parent_ts
-                        else None,
-                    )
-
-    GET_CHECKPOINT_BY_TS_QUERY = """
-    SELECT checkpoint, metadata, thread_ts, parent_ts
-    FROM checkpoints
-    WHERE thread_id = %(thread_id)s AND thread_ts = %(thread_ts)s
+        """Get all the checkpoints for the given configuration.
+
+        Rows are streamed through a server-side cursor ``fetch_size`` at a time,
+        newest first, and each checkpoint and its metadata are only deserialized
+        when first accessed. Pass the config of the last tuple of a page as
+        ``before`` to get the next page. Blobs a row references are read as it
+        is streamed, unless they are already cached. A thread that lists no
+        rows is restored first if it was moved to the ``archive_store``.
+        """
+        query, args = self._list_query(config, filter, before, limit)
+        thread_id = config["configurable"]["thread_id"] if config else None
+        listed = False
+        async for checkpoint_tuple in self._alist_tuples(thread_id, query, args):
+            listed = True
+            yield checkpoint_tuple
+        if listed or not thread_id or self.archive_store is None:
+            return
+        # an archived thread has no rows until it is restored; re-read even if
+        # another reader restored it meanwhile
+        await self._arehydrate(thread_id)
+        async for row, blobs in self._alist_rows(self.async_connection, query, args):
+            yield self._lazy_tuple(row, blobs)
+
+    async def _alist_tuples(
+        self, thread_id: Optional[str], query: str, args: List[Any]
+    ) -> AsyncIterator[CheckpointTuple]:
+        """List from the replica if ``thread_id`` may be read there, else the primary."""
+        if self._use_replica(self.async_replica_connection, thread_id):
+            listed = False
+            try:
+                async for row, blobs in self._alist_rows(
+                    self.async_replica_connection, query, args
+                ):
+                    listed = True
+                    yield self._lazy_tuple(row, blobs)
+                return
+            except psycopg.OperationalError as e:
+                if listed:
+                    raise
+                logger.warning(
+                    f"Checkpoint replica unavailable, listing from primary: {str(e)}"
+                )
+        async for row, blobs in self._alist_rows(self.async_connection, query, args):
+            yield self._lazy_tuple(row, blobs)
+
+    async def _alist_rows(
+        self,
+        connection: Union[psycopg.AsyncConnection, AsyncConnectionPool],
+        query: str,
+        args: List[Any],
+    ) -> AsyncIterator[Tuple[Tuple[Any, ...], Dict[str, bytes]]]:
+        """Stream the rows of ``query`` with the blobs each of them references."""
+        async with _get_async_connection(connection) as conn:
+            async with conn.transaction():
+                async with conn.cursor(name=f"list_{uuid.uuid4().hex}") as cur:
+                    cur.itersize = self.fetch_size
+                    await cur.execute(query, tuple(args))
+                    async for value in cur:
+                        refs = blob_refs(value[8], value[9])
+                        yield value, await self.blobs.afetch(conn, refs)
+
+    GET_CHECKPOINT_BY_TS_QUERY = (
+        """
+    SELECT c.checkpoint, c.metadata, c.thread_ts, c.parent_ts,
+           c.is_delta, base.blobs, base.complete, c.blob_refs, base.refs
+    FROM checkpoints c
+    """
+        + CHECKPOINT_CHAIN_JOIN
+        + """
+    WHERE c.thread_id = %(thread_id)s AND c.thread_ts = %(thread_ts)s
+    """
+    )
+
+    GET_CHECKPOINT_QUERY = (
+        """
+    SELECT c.checkpoint, c.metadata, c.thread_ts, c.parent_ts,
+           c.is_delta, base.blobs, base.complete, c.blob_refs, base.refs
+    FROM (
+        SELECT * FROM checkpoints
+        WHERE thread_id = %(thread_id)s
+        ORDER BY thread_ts DESC LIMIT 1
+    ) c
     """
+        + CHECKPOINT_CHAIN_JOIN
+    )
 
-    GET_CHECKPOINT_QUERY = """
-    SELECT checkpoint, metadata, thread_ts, parent_ts
-    FROM checkpoints
-    WHERE thread_id = %(thread_id)s
-    ORDER BY thread_ts DESC LIMIT 1
+    GET_WRITES_QUERY = """
+    SELECT task_id, channel, value, blob_refs FROM writes
+    WHERE thread_id = %(thread_id)s AND thread_ts = %(thread_ts)s
     """
 
     def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
@@ -419,6 +1241,7 @@ class PostgresSaver(BaseCheckpointSaver):
                 A dict with a `configurable` key which is a dict with
                 a `thread_id` key and an optional `thread_ts` key.
                 For example, { 'configurable': { 'thread_id': 'test_thread' } }
+                Set `allow_stale` to read the latest checkpoint from the replica.
         Returns:
             The checkpoint tuple for the given configuration if it exists,
             otherwise None.
@@ -426,62 +1249,32 @@ class PostgresSaver(BaseCheckpointSaver):
         """
         thread_id = config["configurable"]["thread_id"]
         thread_ts = config["configurable"].get("thread_ts")
+        if self.cache is not None and (cached := self.cache.get(thread_id, thread_ts)):
+            return cached
+        stale_ok = bool(thread_ts or config["configurable"].get("allow_stale"))
+        if stale_ok and self._use_replica(self.sync_replica_connection, thread_id):
+            try:
+                with _get_sync_connection(self.sync_replica_connection) as conn:
+                    # a checkpoint missing on the replica may not have arrived yet
+                    if fetched := self._fetch_tuple(conn, config):
+                        return fetched[0]
+            except psycopg.OperationalError as e:
+                logger.warning(
+                    f"Checkpoint replica unavailable, reading from primary: {str(e)}"
+                )
         with self._get_sync_connection() as conn:
-            with conn.cursor() as cur:
-                # find the latest checkpoint for the thread_id
-                if thread_ts:
-                    cur.execute(
-                        self.GET_CHECKPOINT_BY_TS_QUERY,
-                        {
-                            "thread_id": thread_id,
-                            "thread_ts": thread_ts,
-                        },
-                    )
-                else:
-                    cur.execute(
-                        self.GET_CHECKPOINT_QUERY,
-                        {
-                            "thread_id": thread_id,
-                        },
-                    )
-
-                # if a checkpoint is found, return it
-                if value := cur.fetchone():
-                    checkpoint, metadata, thread_ts, parent_ts = value
-                    if not config["configurable"].get("thread_ts"):
-                        config = {
-                            "configurable": {
-                                "thread_id": thread_id,
-                                "thread_ts": thread_ts,
-                            }
-                        }
-
-                    # find any pending writes
-                    cur.execute(
-                        "SELECT task_id, channel, value FROM writes WHERE thread_id = %(thread_id)s AND thread_ts = %(thread_ts)s",
-                        {
-                            "thread_id": thread_id,
-                            "thread_ts": thread_ts,
-                        },
-                    )
-                    # deserialize the checkpoint and metadata
-                    return CheckpointTuple(
-                        config=config,
-                        checkpoint=self.serde.loads(checkpoint),
-                        metadata=self.serde.loads(metadata),
-                        parent_config={
-                            "configurable": {
-                                "thread_id": thread_id,
-                                "thread_ts": parent_ts,
-                            }
-                        }
-                        if parent_ts
-                        else None,
-                        pending_writes=[
-                            (task_id, channel, self.serde.loads(value))
-                            for task_id, channel, value in cur
-                        ],
-                    )
+            fetched = self._fetch_tuple(conn, config)
+        if fetched is None and self.archive_store is not None:
+            # re-read even if another reader restored the thread meanwhile
+            self._rehydrate(thread_id)
+            with self._get_sync_connection() as conn:
+                fetched = self._fetch_tuple(conn, config)
+        if fetched is None:
+            return None
+        checkpoint_tuple, size = fetched
+        if self.cache is not None and not thread_ts:
+            self.cache.put(thread_id, checkpoint_tuple, size)
+        return checkpoint_tuple
 
     async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
         """Get the checkpoint tuple for the given configuration.
@@ -490,6 +1283,7 @@ class PostgresSaver(BaseCheckpointSaver):
                 A dict with a `configurable` key which is a dict with
                 a `thread_id` key and an optional `thread_ts` key.
                 For example, { 'configurable': { 'thread_id': 'test_thread' } }
+                Set `allow_stale` to read the latest checkpoint from the replica.
         Returns:
             The checkpoint tuple for the given configuration if it exists,
             otherwise None.
@@ -497,61 +1291,186 @@ class PostgresSaver(BaseCheckpointSaver):
         """
         thread_id = config["configurable"]["thread_id"]
         thread_ts = config["configurable"].get("thread_ts")
+        if self.cache is not None and (cached := self.cache.get(thread_id, thread_ts)):
+            return cached
+        stale_ok = bool(thread_ts or config["configurable"].get("allow_stale"))
+        if stale_ok and self._use_replica(self.async_replica_connection, thread_id):
+            try:
+                async with _get_async_connection(self.async_replica_connection) as conn:
+                    # a checkpoint missing on the replica may not have arrived yet
+                    if fetched := await self._afetch_tuple(conn, config):
+                        return fetched[0]
+            except psycopg.OperationalError as e:
+                logger.warning(
+                    f"Checkpoint replica unavailable, reading from primary: {str(e)}"
+                )
         async with self._get_async_connection() as conn:
-            async with conn.cursor() as cur:
-                # find the latest checkpoint for the thread_id
-                if thread_ts:
-                    await cur.execute(
-                        self.GET_CHECKPOINT_BY_TS_QUERY,
-                        {
-                            "thread_id": thread_id,
-                            "thread_ts": thread_ts,
-                        },
-                    )
-                else:
-                    await cur.execute(
-                        self.GET_CHECKPOINT_QUERY,
-                        {
-                            "thread_id": thread_id,
-                        },
-                    )
-                # if a checkpoint is found, return it
-                if value := await cur.fetchone():
-                    checkpoint, metadata, thread_ts, parent_ts = value
-                    if not config["configurable"].get("thread_ts"):
-                        config = {
-                            "configurable": {
-                                "thread_id": thread_id,
-                                "thread_ts": thread_ts,
-                            }
-                        }
-
-                    # find any pending writes
-                    await cur.execute(
-                        "SELECT task_id, channel, value FROM writes WHERE thread_id = %(thread_id)s AND thread_ts = %(thread_ts)s",
-                        {
-                            "thread_id": thread_id,
-                            "thread_ts": thread_ts,
-                        },
-                    )
-                    # deserialize the checkpoint and metadata
-                    return CheckpointTuple(
-                        config=config,
-                        checkpoint=self.serde.loads(checkpoint),
-                        metadata=self.serde.loads(metadata),
-                        parent_config={
-                            "configurable": {
-                                "thread_id": thread_id,
-                                "thread_ts": parent_ts,
-                            }
-                        }
-                        if parent_ts
-                        else None,
-                        pending_writes=[
-                            (task_id, channel, self.serde.loads(value))
-                            async for task_id, channel, value in cur
-                        ],
-                    )
+            fetched = await self._afetch_tuple(conn, config)
+        if fetched is None and self.archive_store is not None:
+            # re-read even if another reader restored the thread meanwhile
+            await self._arehydrate(thread_id)
+            async with self._get_async_connection() as conn:
+                fetched = await self._afetch_tuple(conn, config)
+        if fetched is None:
+            return None
+        checkpoint_tuple, size = fetched
+        if self.cache is not None and not thread_ts:
+            self.cache.put(thread_id, checkpoint_tuple, size)
+        return checkpoint_tuple
+
+    SELECT_ARCHIVED_QUERY = "SELECT 1 FROM archived_threads WHERE thread_id = %s"
+
+    LOCK_ARCHIVED_QUERY = """
+    SELECT archive_key FROM archived_threads WHERE thread_id = %s FOR UPDATE
+    """
+
+    DELETE_ARCHIVED_QUERY = "DELETE FROM archived_threads WHERE thread_id = %s"
+
+    def _rehydrate(self, thread_id: str) -> None:
+        """Import the archive of ``thread_id`` if it was moved to cold storage."""
+        if self.archive_store is None:
+            return
+        with self._get_sync_connection() as conn:
+            with conn.transaction():
+                if conn.execute(self.SELECT_ARCHIVED_QUERY, (thread_id,)).fetchone() is None:
+                    return
+                # concurrent readers wait here, then find the thread restored
+                row = conn.execute(self.LOCK_ARCHIVED_QUERY, (thread_id,)).fetchone()
+                if row is None:
+                    return
+                data = self.archive_store.get(row[0])
+                import_archive(conn, io.BytesIO(data), notify_channel=None)
+                conn.execute(self.DELETE_ARCHIVED_QUERY, (thread_id,))
+            # on a raw connection an earlier read may have opened the outer
+            # transaction, making the block above a savepoint
+            conn.commit()
+        self._note_write(thread_id)
+        logger.info(f"Restored archived thread {thread_id}")
+        try:
+            self.archive_store.delete(row[0])
+        except Exception as e:
+            logger.warning(f"Failed to delete archive {row[0]}: {str(e)}")
+
+    async def _arehydrate(self, thread_id: str) -> None:
+        """Import the archive of ``thread_id`` if it was moved to cold storage."""
+        if self.archive_store is None:
+            return
+        async with self._get_async_connection() as conn:
+            async with conn.transaction():
+                cur = await conn.execute(self.SELECT_ARCHIVED_QUERY, (thread_id,))
+                if await cur.fetchone() is None:
+                    return
+                # concurrent readers wait here, then find the thread restored
+                cur = await conn.execute(self.LOCK_ARCHIVED_QUERY, (thread_id,))
+                if (row := await cur.fetchone()) is None:
+                    return
+                data = await asyncio.to_thread(self.archive_store.get, row[0])
+                await aimport_archive(conn, io.BytesIO(data), notify_channel=None)
+                await conn.execute(self.DELETE_ARCHIVED_QUERY, (thread_id,))
+            # on a raw connection an earlier read may have opened the outer
+            # transaction, making the block above a savepoint
+            await conn.commit()
+        self._note_write(thread_id)
+        logger.info(f"Restored archived thread {thread_id}")
+        try:
+            await asyncio.to_thread(self.archive_store.delete, row[0])
+        except Exception as e:
+            logger.warning(f"Failed to delete archive {row[0]}: {str(e)}")
+
+    def _fetch_tuple(
+        self, conn: psycopg.Connection, config: RunnableConfig
+    ) -> Optional[Tuple[CheckpointTuple, int]]:
+        """Read the checkpoint tuple for ``config`` and its serialized size."""
+        thread_id = config["configurable"]["thread_id"]
+        thread_ts = config["configurable"].get("thread_ts")
+        with conn.cursor() as cur:
+            if thread_ts:
+                cur.execute(
+                    self.GET_CHECKPOINT_BY_TS_QUERY,
+                    {"thread_id": thread_id, "thread_ts": thread_ts},
+                )
+            else:
+                cur.execute(self.GET_CHECKPOINT_QUERY, {"thread_id": thread_id})
+            if (value := cur.fetchone()) is None:
+                return None
+            cur.execute(
+                self.GET_WRITES_QUERY, {"thread_id": thread_id, "thread_ts": value[2]}
+            )
+            writes = cur.fetchall()
+            refs = blob_refs(value[7], value[8], *(write[3] for write in writes))
+            blobs = self.blobs.fetch(conn, refs)
+            decoded = _decode_row(self.serde, value, writes, blobs)
+            return self._build_tuple(config, value, writes, blobs, decoded)
+
+    async def _afetch_tuple(
+        self, conn: psycopg.AsyncConnection, config: RunnableConfig
+    ) -> Optional[Tuple[CheckpointTuple, int]]:
+        """Read the checkpoint tuple for ``config`` and its serialized size."""
+        thread_id = config["configurable"]["thread_id"]
+        thread_ts = config["configurable"].get("thread_ts")
+        async with conn.cursor() as cur:
+            if thread_ts:
+                await cur.execute(
+                    self.GET_CHECKPOINT_BY_TS_QUERY,
+                    {"thread_id": thread_id, "thread_ts": thread_ts},
+                )
+            else:
+                await cur.execute(self.GET_CHECKPOINT_QUERY, {"thread_id": thread_id})
+            if (value := await cur.fetchone()) is None:
+                return None
+            await cur.execute(
+                self.GET_WRITES_QUERY, {"thread_id": thread_id, "thread_ts": value[2]}
+            )
+            writes = await cur.fetchall()
+            refs = blob_refs(value[7], value[8], *(write[3] for write in writes))
+            blobs = await self.blobs.afetch(conn, refs)
+        decoded = await self._aserde(
+            lambda: _row_size(value, writes, blobs),
+            _decode_row,
+            self.serde,
+            value,
+            writes,
+            blobs,
+        )
+        return self._build_tuple(config, value, writes, blobs, decoded)
+
+    def _build_tuple(
+        self,
+        config: RunnableConfig,
+        value: Tuple[Any, ...],
+        writes: List[Tuple[str, str, bytes, Optional[List[str]]]],
+        blobs: Dict[str, bytes],
+        decoded: Tuple[Checkpoint, CheckpointMetadata, List[Any]],
+    ) -> Tuple[CheckpointTuple, int]:
+        """Assemble the tuple of a row deserialized by ``_decode_row``, and its size."""
+        thread_ts, parent_ts = value[2], value[3]
+        checkpoint, metadata, write_values = decoded
+        thread_id = config["configurable"]["thread_id"]
+        if not config["configurable"].get("thread_ts"):
+            config = {
+                "configurable": {
+                    "thread_id": thread_id,
+                    "thread_ts": thread_ts,
+                }
+            }
+        checkpoint_tuple = CheckpointTuple(
+            config=config,
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "thread_ts": parent_ts,
+                }
+            }
+            if parent_ts
+            else None,
+            pending_writes=[
+                (task_id, channel, write_value)
+                for (task_id, channel, _, _), write_value in zip(writes, write_values)
+            ],
+        )
+        return checkpoint_tuple, _row_size(value, writes, blobs)
 
     def _search_where(
         self,
@@ -572,16 +1491,91 @@ class PostgresSaver(BaseCheckpointSaver):
 
         # Add predicate for config
         if config is not None:
-            wheres.append("thread_id = %s ")
+            wheres.append("c.thread_id = %s ")
             param_values.append(config["configurable"]["thread_id"])
 
+        # Add predicates for metadata, plain values by (indexed) containment
         if filter:
-            raise NotImplementedError()
+            contains = {}
+            for key, value in filter.items():
+                is_comparison = isinstance(value, dict) and value
+                if is_comparison and set(value) <= FILTER_OPERATORS.keys():
+                    for op, operand in value.items():
+                        wheres.append(f"c.metadata_json -> %s {FILTER_OPERATORS[op]} %s")
+                        param_values.extend([key, Jsonb(operand)])
+                else:
+                    contains[key] = value
+            if contains:
+                wheres.append("c.metadata_json @> %s")
+                param_values.append(Jsonb(contains))
 
-        # Add predicate for limiting results before a certain timestamp
+        # Add predicate for limiting results before a certain checkpoint, keyset
+        # ordered on (thread_id, thread_ts) when listing across threads
         if before is not None:
-            wheres.append("thread_ts < %s")
-            param_values.append(before["configurable"]["thread_ts"])
+            if config is None and before["configurable"].get("thread_id") is not None:
+                wheres.append("(c.thread_id, c.thread_ts) < (%s, %s)")
+                param_values.extend(
+                    [
+                        before["configurable"]["thread_id"],
+                        before["configurable"]["thread_ts"],
+                    ]
+                )
+            else:
+                wheres.append("c.thread_ts < %s")
+                param_values.append(before["configurable"]["thread_ts"])
 
         where_clause = "WHERE " + " AND ".join(wheres) if wheres else ""
-        return where_clause, param_values
\ No newline at end of file
+        return where_clause, param_values
+
+
+SELECT_MISSING_METADATA_QUERY = """
+SELECT thread_id, thread_ts, metadata, blob_refs
+FROM checkpoints
+WHERE metadata_json IS NULL AND (thread_id, thread_ts) > (%s, %s)
+ORDER BY thread_id, thread_ts
+LIMIT %s
+"""
+
+UPDATE_METADATA_JSON_QUERY = """
+UPDATE checkpoints SET metadata_json = %s
+WHERE thread_id = %s AND thread_ts = %s
+"""
+
+
+def backfill_metadata_json(
+    connection: psycopg.Connection,
+    serde: SerializerProtocol,
+    batch_size: int = 500,
+) -> int:
+    """Fill ``metadata_json`` for rows written before it existed.
+
+    Rows are processed in keyset order, one transaction per batch. Metadata
+    values stored out of line are read back from the blob table, as
+    ``get_tuple`` does. Returns the number of rows updated.
+    """
+    rows = 0
+    blob_store = BlobStore()
+    cursor_key: Tuple[str, str] = ("", "")
+    while True:
+        with connection.transaction():
+            batch = connection.execute(
+                SELECT_MISSING_METADATA_QUERY, (*cursor_key, batch_size)
+            ).fetchall()
+            blobs = blob_store.fetch(connection, blob_refs(*(row[3] for row in batch)))
+            with connection.cursor() as cur:
+                cur.executemany(
+                    UPDATE_METADATA_JSON_QUERY,
+                    [
+                        (
+                            _searchable_metadata(load_value(serde, metadata, blobs)),
+                            thread_id,
+                            thread_ts,
+                        )
+                        for thread_id, thread_ts, metadata, _ in batch
+                    ],
+                )
+        rows += len(batch)
+        if len(batch) < batch_size:
+            return rows
+        cursor_key = batch[-1][:2]
+        logger.info(f"Backfilled metadata_json for {rows} checkpoints")
@@ -0,0 +1,180 @@
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableBinding
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+"""Anthropic cache breakpoint: the prompt up to and including the marked block
+is cached and read back by later calls that share that prefix."""
+
+
+def supports_cache_control(model: Any) -> bool:
+    """Whether ``model`` takes Anthropic ``cache_control`` breakpoints.
+
+    Other providers, OpenAI among them, cache stable prompt prefixes without
+    being told and may reject the extra field.
+    """
+    while isinstance(model, RunnableBinding):
+        model = model.bound
+    return getattr(model, "_llm_type", "").startswith("anthropic")
+
+
+def text_blocks(parts: Sequence[str], breakpoint: bool = False) -> List[Dict[str, Any]]:
+    """Content blocks for ``parts``, with a cache breakpoint on the last one."""
+    blocks: List[Dict[str, Any]] = [
+        {"type": "text", "text": part} for part in parts if part
+    ]
+    if breakpoint and blocks:
+        blocks[-1]["cache_control"] = CACHE_CONTROL
+    return blocks
+
+
+def with_cache_breakpoint(message: BaseMessage) -> BaseMessage:
+    """Copy of ``message`` with a cache breakpoint on its last content block.
+
+    Messages without text content are returned unchanged, as providers reject
+    empty text blocks.
+    """
+    content = message.content
+    if isinstance(content, str):
+        blocks = text_blocks([content], breakpoint=True)
+    else:
+        blocks = [
+            {"type": "text", "text": block} if isinstance(block, str) else dict(block)
+            for block in content
+        ]
+        if blocks:
+            blocks[-1]["cache_control"] = CACHE_CONTROL
+    if not blocks:
+        return message
+    return message.copy(update={"content": blocks})
+
+
+def without_cache_control(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """``messages`` with text block content joined back into plain strings."""
+    plain = []
+    for message in messages:
+        content = message.content
+        if (
+            isinstance(content, list)
+            and content
+            and all(isinstance(block, dict) and block.get("type") == "text" for block in content)
+        ):
+            message = message.copy(update={"content": "".join(block["text"] for block in content)})
+        plain.append(message)
+    return plain
+
+
+def prompt_for(model: Any, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """``messages`` as ``model`` takes them: without cache breakpoints unless it
+    supports them."""
+    if supports_cache_control(model):
+        return list(messages)
+    return without_cache_control(messages)
+
+
+class CacheUsage(NamedTuple):
+    input_tokens: int
+    """All input tokens of the call, cached or not."""
+    cache_read_tokens: int
+    cache_write_tokens: int
+
+    @property
+    def uncached_tokens(self) -> int:
+        return self.input_tokens - self.cache_read_tokens
+
+
+def cache_usage(response: BaseMessage) -> Optional[CacheUsage]:
+    """Read the cached and uncached input tokens of a call from its response.
+
+    Understands Anthropic's and OpenAI's usage reports and the standard
+    ``usage_metadata`` with ``input_token_details``.
+    """
+    metadata = getattr(response, "response_metadata", None) or {}
+    usage = metadata.get("usage")
+    if isinstance(usage, dict) and "cache_read_input_tokens" in usage:
+        # Anthropic counts cache reads and writes apart from the other input tokens
+        read = usage.get("cache_read_input_tokens") or 0
+        written = usage.get("cache_creation_input_tokens") or 0
+        return CacheUsage((usage.get("input_tokens") or 0) + read + written, read, written)
+
+    token_usage = metadata.get("token_usage")
+    if isinstance(token_usage, dict) and "prompt_tokens" in token_usage:
+        details = token_usage.get("prompt_tokens_details") or {}
+        return CacheUsage(token_usage["prompt_tokens"], details.get("cached_tokens") or 0, 0)
+
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if usage_metadata:
+        details = usage_metadata.get("input_token_details") or {}
+        return CacheUsage(
+            usage_metadata["input_tokens"],
+            details.get("cache_read") or 0,
+            details.get("cache_creation") or 0,
+        )
+    return None
+
+
+class _CallStats:
+    __slots__ = ("calls", "input_tokens", "cache_read_tokens", "cache_write_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+
+    def add(self, usage: CacheUsage) -> None:
+        self.calls += 1
+        self.input_tokens += usage.input_tokens
+        self.cache_read_tokens += usage.cache_read_tokens
+        self.cache_write_tokens += usage.cache_write_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "uncached_tokens": self.input_tokens - self.cache_read_tokens,
+            "cached_rate": (
+                self.cache_read_tokens / self.input_tokens if self.input_tokens else 0.0
+            ),
+        }
+
+
+class PromptCacheStats:
+    """Cached and uncached input tokens of model calls, per graph node."""
+
+    def __init__(self):
+        self._stats: Dict[str, _CallStats] = defaultdict(_CallStats)
+
+    def record(self, node: str, response: BaseMessage) -> Optional[CacheUsage]:
+        """Log the cache usage of one call and add it to the totals of ``node``."""
+        usage = cache_usage(response)
+        if usage is None:
+            return None
+        self._stats[node].add(usage)
+        logger.info(
+            f"{node} call: {usage.input_tokens} input tokens, "
+            f"{usage.cache_read_tokens} cached, {usage.uncached_tokens} uncached, "
+            f"{usage.cache_write_tokens} written to cache"
+        )
+        return usage
+
+    def stats(self) -> Dict[str, Any]:
+        """Token totals per node and overall."""
+        total = _CallStats()
+        for stats in self._stats.values():
+            total.calls += stats.calls
+            total.input_tokens += stats.input_tokens
+            total.cache_read_tokens += stats.cache_read_tokens
+            total.cache_write_tokens += stats.cache_write_tokens
+        return {
+            **total.as_dict(),
+            "nodes": {node: stats.as_dict() for node, stats in self._stats.items()},
+        }
+
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Deque, Optional, TypeVar
+
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def estimate_size(value: Any) -> int:
+    """Rough serialized size of ``value``, counting its strings, bytes and messages.
+
+    Walking the state is far cheaper than serializing it, and close enough to
+    decide whether serializing it is worth moving off the event loop.
+    """
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, BaseMessage):
+        content = value.content
+        return len(content) if isinstance(content, str) else len(str(content))
+    if isinstance(value, dict):
+        return sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value)
+    return 8
+
+
+class SerdeExecutor:
+    """Runs the (de)serialization of large checkpoints outside the event loop.
+
+    Payloads smaller than ``threshold`` bytes are still handled inline, where
+    the cost of a round trip to the executor would outweigh the work. Every
+    call records how long it kept the event loop busy.
+
+    A ``"thread"`` pool suits codecs that release the GIL, such as zstd
+    compression. JSON serialization of LangChain objects is pure Python and
+    holds the GIL, so large JSON states need a ``"process"`` pool, at the
+    price of pickling the state to and from the worker; the serializer must
+    then be picklable and any counters it keeps stay in the workers.
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        threshold: int = 256 * 1024,
+        max_workers: Optional[int] = None,
+        warn_after: float = 0.05,
+    ):
+        if kind == "thread":
+            executor: Executor = ThreadPoolExecutor(
+                max_workers, thread_name_prefix="checkpoint-serde"
+            )
+        elif kind == "process":
+            executor = ProcessPoolExecutor(max_workers)
+        else:
+            raise ValueError(f"Unknown serde executor kind: {kind}")
+        self.kind = kind
+        self.threshold = threshold
+        self.warn_after = warn_after
+        self.executor = executor
+        self.inline_calls = 0
+        self.offloaded_calls = 0
+        self.blocked_seconds = 0.0
+        self.max_blocked_seconds = 0.0
+        self._recent: Deque[float] = deque(maxlen=1024)
+
+    async def run(self, size: int, fn: Callable[..., T], *args: Any) -> T:
+        """Call ``fn(*args)``, in the executor if ``size`` reaches the threshold."""
+        started = time.perf_counter()
+        if size < self.threshold:
+            try:
+                return fn(*args)
+            finally:
+                self.inline_calls += 1
+                self._record(time.perf_counter() - started, fn, size)
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, partial(fn, *args)
+        )
+        self.offloaded_calls += 1
+        self._record(time.perf_counter() - started, fn, size)
+        return await future
+
+    def _record(self, blocked: float, fn: Callable, size: int) -> None:
+        self.blocked_seconds += blocked
+        self.max_blocked_seconds = max(self.max_blocked_seconds, blocked)
+        self._recent.append(blocked)
+        if blocked > self.warn_after:
+            logger.warning(
+                f"{getattr(fn, '__name__', fn)} blocked the event loop for "
+                f"{1000 * blocked:.1f} ms on about {size} bytes"
+            )
+
+    def stats(self) -> dict[str, Any]:
+        recent = sorted(self._recent)
+        calls = self.inline_calls + self.offloaded_calls
+        return {
+            "kind": self.kind,
+            "threshold": self.threshold,
+            "inline_calls": self.inline_calls,
+            "offloaded_calls": self.offloaded_calls,
+            "blocked_ms_total": 1000 * self.blocked_seconds,
+            "blocked_ms_mean": 1000 * self.blocked_seconds / calls if calls else 0.0,
+            "blocked_ms_p99": 1000 * recent[int(0.99 * (len(recent) - 1))]
+            if recent
+            else 0.0,
+            "blocked_ms_max": 1000 * self.max_blocked_seconds,
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,415 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint import BaseCheckpointSaver
+from langgraph.checkpoint.base import Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.serde.base import SerializerProtocol
+from langgraph.serde.jsonplus import JsonPlusSerializer
+
+from agent.utils.checkpoint_cache import CheckpointCache
+
+SQLITE_OPERATORS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<=", "$ne": "IS NOT"}
+
+
+class TieredSqliteSaver(BaseCheckpointSaver):
+    """An embedded checkpointer for single-node deployments, batch jobs and tests.
+
+    The latest checkpoint of recently active threads is served from a
+    byte-bounded in-memory LRU. Every write also goes to a SQLite file in WAL
+    mode, so threads evicted from memory (and everything after a restart) are
+    read back from disk. Unlike ``MemorySaver`` memory use stays bounded, and
+    unlike ``PostgresSaver`` no database server is needed.
+
+    Async methods run the SQLite calls in the default executor.
+    """
+
+    memory: Optional[CheckpointCache] = None
+    """The in-memory tier holding the latest checkpoint of hot threads."""
+
+    CREATE_TABLES_QUERY = """
+    PRAGMA journal_mode=WAL;
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id TEXT NOT NULL,
+        thread_ts TEXT NOT NULL,
+        parent_ts TEXT,
+        checkpoint BLOB NOT NULL,
+        metadata BLOB NOT NULL,
+        metadata_json TEXT,
+        PRIMARY KEY (thread_id, thread_ts)
+    );
+    CREATE TABLE IF NOT EXISTS writes (
+        thread_id TEXT NOT NULL,
+        thread_ts TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        value BLOB,
+        PRIMARY KEY (thread_id, thread_ts, task_id, idx)
+    );
+    """
+
+    def __init__(
+        self,
+        path: str = "checkpoints.sqlite",
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        memory_max_bytes: int = 64 * 1024 * 1024,
+        synchronous: str = "NORMAL",
+    ):
+        """
+        Args:
+            path: The SQLite database file, or ``":memory:"``.
+            memory_max_bytes: Size of the in-memory tier, 0 to read every
+                checkpoint from SQLite.
+            synchronous: SQLite ``synchronous`` pragma. ``NORMAL`` may lose the
+                last commits on power loss but never corrupts the WAL; use
+                ``FULL`` to fsync every write.
+        """
+        super().__init__(serde=serde or JsonPlusSerializer())
+        self.path = path
+        self.memory = (
+            CheckpointCache(memory_max_bytes) if memory_max_bytes > 0 else None
+        )
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self.conn.executescript(self.CREATE_TABLES_QUERY)
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def stats(self) -> dict[str, Any]:
+        """Hit rate and size of the in-memory tier."""
+        return self.memory.stats() if self.memory is not None else {}
+
+    UPSERT_CHECKPOINT_QUERY = """
+    INSERT OR REPLACE INTO checkpoints
+        (thread_id, thread_ts, parent_ts, checkpoint, metadata, metadata_json)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+    ) -> RunnableConfig:
+        """Save a checkpoint to memory and disk.
+
+        Args:
+            config: The config to associate with the checkpoint.
+            checkpoint: The checkpoint to save.
+            metadata: Additional metadata to save with the checkpoint.
+
+        Returns:
+            Updated configuration after storing the checkpoint.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        parent_ts = config["configurable"].get("thread_ts")
+        blob = self.serde.dumps(checkpoint)
+        metadata_blob = self.serde.dumps(metadata)
+        with self.lock:
+            self.conn.execute(
+                self.UPSERT_CHECKPOINT_QUERY,
+                (
+                    thread_id,
+                    checkpoint["id"],
+                    parent_ts,
+                    blob,
+                    metadata_blob,
+                    # "writes" repeats the checkpoint and is not searchable
+                    json.dumps(
+                        {k: v for k, v in metadata.items() if k != "writes"},
+                        default=str,
+                    ),
+                ),
+            )
+        if self.memory is not None:
+            self.memory.put(
+                thread_id,
+                CheckpointTuple(
+                    config={
+                        "configurable": {
+                            "thread_id": thread_id,
+                            "thread_ts": checkpoint["id"],
+                        }
+                    },
+                    checkpoint=checkpoint,
+                    metadata=metadata,
+                    parent_config={
+                        "configurable": {
+                            "thread_id": thread_id,
+                            "thread_ts": parent_ts,
+                        }
+                    }
+                    if parent_ts
+                    else None,
+                    pending_writes=[],
+                ),
+                len(blob) + len(metadata_blob),
+            )
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "thread_ts": checkpoint["id"],
+            }
+        }
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+    ) -> RunnableConfig:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.put, config, checkpoint, metadata
+        )
+
+    UPSERT_WRITES_QUERY = """
+    INSERT OR REPLACE INTO writes (thread_id, thread_ts, task_id, idx, channel, value)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: List[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        thread_ts = config["configurable"]["thread_ts"]
+        params = [
+            (
+                thread_id,
+                thread_ts,
+                task_id,
+                idx,
+                channel,
+                self.serde.dumps(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self.lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany(self.UPSERT_WRITES_QUERY, params)
+        if self.memory is not None:
+            self.memory.add_writes(
+                thread_id,
+                thread_ts,
+                [(task_id, channel, value) for channel, value in writes],
+                sum(len(param[-1]) for param in params),
+            )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: List[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.put_writes, config, writes, task_id
+        )
+
+    GET_CHECKPOINT_BY_TS_QUERY = """
+    SELECT thread_ts, parent_ts, checkpoint, metadata FROM checkpoints
+    WHERE thread_id = ? AND thread_ts = ?
+    """
+
+    GET_CHECKPOINT_QUERY = """
+    SELECT thread_ts, parent_ts, checkpoint, metadata FROM checkpoints
+    WHERE thread_id = ? ORDER BY thread_ts DESC LIMIT 1
+    """
+
+    GET_WRITES_QUERY = """
+    SELECT task_id, channel, value FROM writes
+    WHERE thread_id = ? AND thread_ts = ? ORDER BY task_id, idx
+    """
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get the checkpoint tuple for the given configuration.
+
+        The latest checkpoint of a thread is answered from memory when it is
+        hot, otherwise it is loaded from SQLite and promoted into memory.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        thread_ts = config["configurable"].get("thread_ts")
+        if self.memory is not None:
+            if cached := self.memory.get(thread_id, thread_ts):
+                return cached
+        with self.lock:
+            if thread_ts:
+                row = self.conn.execute(
+                    self.GET_CHECKPOINT_BY_TS_QUERY, (thread_id, thread_ts)
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    self.GET_CHECKPOINT_QUERY, (thread_id,)
+                ).fetchone()
+            if row is None:
+                return None
+            writes = self.conn.execute(
+                self.GET_WRITES_QUERY, (thread_id, row[0])
+            ).fetchall()
+        checkpoint_tuple = self._row_to_tuple(thread_id, *row)._replace(
+            pending_writes=[
+                (task_id, channel, self.serde.loads(value))
+                for task_id, channel, value in writes
+            ]
+        )
+        if self.memory is not None and not thread_ts:
+            self.memory.put(
+                thread_id,
+                checkpoint_tuple,
+                len(row[2])
+                + len(row[3])
+                + sum(len(value) for _, _, value in writes if value),
+            )
+        return checkpoint_tuple
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.get_tuple, config
+        )
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints newest first, with the same filters as ``PostgresSaver``."""
+        where, args = self._search_where(config, filter, before)
+        query = (
+            "SELECT thread_id, thread_ts, parent_ts, checkpoint, metadata "
+            f"FROM checkpoints {where} ORDER BY thread_id DESC, thread_ts DESC"
+        )
+        if limit:
+            query += " LIMIT ?"
+            args.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, args).fetchall()
+        for thread_id, *row in rows:
+            yield self._row_to_tuple(thread_id, *row)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)),
+        )
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    def _row_to_tuple(
+        self,
+        thread_id: str,
+        thread_ts: str,
+        parent_ts: Optional[str],
+        checkpoint: bytes,
+        metadata: bytes,
+    ) -> CheckpointTuple:
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "thread_ts": thread_ts}},
+            checkpoint=self.serde.loads(checkpoint),
+            metadata=self.serde.loads(metadata),
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "thread_ts": parent_ts,
+                }
+            }
+            if parent_ts
+            else None,
+        )
+
+    def _search_where(
+        self,
+        config: Optional[RunnableConfig],
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+    ) -> Tuple[str, List[Any]]:
+        """Return the WHERE clause and its parameters for ``list``.
+
+        Metadata values match by JSON containment, with the operators
+        supported by ``PostgresSaver``.
+        """
+        wheres = []
+        param_values: List[Any] = []
+
+        if config is not None:
+            wheres.append("thread_id = ?")
+            param_values.append(config["configurable"]["thread_id"])
+
+        for key, value in (filter or {}).items():
+            path = f'$."{key}"'
+            is_comparison = isinstance(value, dict) and value
+            if is_comparison and set(value) <= SQLITE_OPERATORS.keys():
+                for op, operand in value.items():
+                    wheres.append(
+                        f"json_extract(metadata_json, ?) {SQLITE_OPERATORS[op]} "
+                        "json_extract(?, '$')"
+                    )
+                    param_values.extend([path, json.dumps(operand, default=str)])
+            else:
+                _contains(path, value, wheres, param_values)
+
+        if before is not None:
+            if config is None and before["configurable"].get("thread_id") is not None:
+                wheres.append("(thread_id, thread_ts) < (?, ?)")
+                param_values.extend(
+                    [
+                        before["configurable"]["thread_id"],
+                        before["configurable"]["thread_ts"],
+                    ]
+                )
+            else:
+                wheres.append("thread_ts < ?")
+                param_values.append(before["configurable"]["thread_ts"])
+
+        where_clause = "WHERE " + " AND ".join(wheres) if wheres else ""
+        return where_clause, param_values
+
+
+def _contains(path: str, value: Any, wheres: List[str], param_values: List[Any]) -> None:
+    """Add the predicates that the metadata at ``path`` contains ``value``.
+
+    Mirrors Postgres' ``@>``: objects match if they contain each of the given
+    keys, recursively, and arrays if they hold each of the given elements, in
+    any order. Elements that are themselves objects or arrays must be equal.
+    """
+    if isinstance(value, dict):
+        wheres.append("json_type(metadata_json, ?) = 'object'")
+        param_values.append(path)
+        for key, item in value.items():
+            _contains(f'{path}."{key}"', item, wheres, param_values)
+    elif isinstance(value, (list, tuple)):
+        wheres.append("json_type(metadata_json, ?) = 'array'")
+        param_values.append(path)
+        for item in value:
+            wheres.append(
+                "EXISTS (SELECT 1 FROM json_each(metadata_json, ?) "
+                "WHERE CASE WHEN type IN ('true', 'false') THEN type ELSE json_quote(value) END"
+                " = json(?))"
+            )
+            param_values.extend([path, json.dumps(item, default=str, separators=(",", ":"))])
+    elif value is None:
+        wheres.append("json_type(metadata_json, ?) = 'null'")
+        param_values.append(path)
+    else:
+        wheres.append("json_extract(metadata_json, ?) = json_extract(?, '$')")
+        param_values.extend([path, json.dumps(value, default=str)])
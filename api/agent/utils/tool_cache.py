@@ -0,0 +1,434 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from datetime import timedelta
+from inspect import signature
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain_core.pydantic_v1 import BaseModel, Field, create_model
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.tools import BaseTool, Tool
+from langgraph.serde.base import SerializerProtocol
+from langgraph.serde.jsonplus import JsonPlusSerializer
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from agent.utils.checkpoint_cache import ByteLRU
+from agent.utils.serde_executor import estimate_size
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS tool_cache (
+    key TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    value BYTEA NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tool_cache_expires_at_idx ON tool_cache (expires_at);
+"""
+
+SELECT_QUERY = """
+SELECT value, extract(epoch FROM expires_at - now())
+FROM tool_cache WHERE key = %s AND expires_at > now()
+"""
+
+UPSERT_QUERY = """
+INSERT INTO tool_cache (key, tool, value, expires_at)
+VALUES (%s, %s, %s, now() + %s)
+ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value,
+                                created_at = EXCLUDED.created_at,
+                                expires_at = EXCLUDED.expires_at
+"""
+
+PURGE_QUERY = "DELETE FROM tool_cache WHERE expires_at <= now()"
+
+
+def normalize_input(tool_input: Any, casefold: bool = True) -> str:
+    """Canonical form of a tool input, so trivially different inputs share a key.
+
+    Strings have runs of whitespace collapsed and, unless ``casefold`` is
+    False, are case-folded; dicts are normalized value by value and
+    serialized with sorted keys.
+    """
+    if isinstance(tool_input, str):
+        text = " ".join(tool_input.split())
+        return text.casefold() if casefold else text
+    if isinstance(tool_input, dict):
+        return json.dumps(
+            {key: normalize_input(value, casefold) for key, value in tool_input.items()},
+            sort_keys=True,
+        )
+    return json.dumps(tool_input, sort_keys=True, default=str)
+
+
+def cache_key(tool: str, tool_input: Any, casefold: bool = True) -> str:
+    normalized = normalize_input(tool_input, casefold)
+    return hashlib.sha256(f"{tool}\0{normalized}".encode()).hexdigest()
+
+
+ERROR_REPR = re.compile(r"^[A-Za-z_][\w.]*(Error|Exception)\(")
+
+
+def looks_like_error(value: Any) -> bool:
+    """Whether a tool result is the repr of an exception.
+
+    Some tools (Tavily search, for one) catch their errors and return
+    ``repr(e)`` instead of raising.
+    """
+    return isinstance(value, str) and ERROR_REPR.match(value) is not None
+
+
+class _ToolStats:
+    __slots__ = ("memory_hits", "shared_hits", "coalesced", "misses", "errors")
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        calls = self.memory_hits + self.shared_hits + self.coalesced + self.misses
+        saved = calls - self.misses
+        return {
+            "calls": calls,
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": saved / calls if calls else 0.0,
+        }
+
+
+class ToolCache:
+    """Caches tool results in memory and, optionally, in a shared Postgres table.
+
+    Results are keyed by tool name and normalized input and expire after the
+    tool's TTL. The memory tier is an LRU bounded by the approximate size of
+    the results. With a connection pool, results are also written to the
+    ``tool_cache`` table, so every worker and conversation shares them.
+    Concurrent identical calls in this process are coalesced into one, and
+    failed calls are never cached.
+
+    Args:
+        ttls: TTL per tool name; tools not listed use ``default_ttl``, and a
+            TTL of zero disables caching for that tool.
+        max_bytes: Size bound of the memory tier.
+        case_sensitive: Names of the tools whose inputs are not case-folded
+            for their key, such as a calculator telling "Mg" from "mg".
+        is_error: Per tool name, whether a result it returned is an error
+            rather than an answer, and so not cached; tools not listed use
+            ``looks_like_error``.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, timedelta]] = None,
+        default_ttl: timedelta = timedelta(hours=1),
+        max_bytes: int = 32 * 1024 * 1024,
+        sync_connection: Optional[ConnectionPool] = None,
+        async_connection: Optional[AsyncConnectionPool] = None,
+        serde: Optional[SerializerProtocol] = None,
+        case_sensitive: Sequence[str] = (),
+        is_error: Optional[Dict[str, Callable[[Any], bool]]] = None,
+    ):
+        self.ttls = ttls or {}
+        self.case_sensitive = frozenset(case_sensitive)
+        self.is_error = is_error or {}
+        self.default_ttl = default_ttl
+        self.memory: ByteLRU[str, Tuple[float, Any]] = ByteLRU(max_bytes)
+        self.sync_connection = sync_connection
+        self.async_connection = async_connection
+        self.serde = serde or JsonPlusSerializer()
+        self._stats: Dict[str, _ToolStats] = defaultdict(_ToolStats)
+        self._inflight: Dict[str, Future] = {}
+        self._ainflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def ttl(self, tool: str) -> timedelta:
+        return self.ttls.get(tool, self.default_ttl)
+
+    def _key(self, tool: str, tool_input: Any) -> str:
+        return cache_key(tool, tool_input, casefold=tool not in self.case_sensitive)
+
+    def _is_error(self, tool: str, value: Any) -> bool:
+        return self.is_error.get(tool, looks_like_error)(value)
+
+    def wrap(self, tools: Sequence[BaseTool]) -> List[BaseTool]:
+        """Return ``tools`` with their calls going through this cache."""
+        return [
+            tool if self.ttl(tool.name) <= timedelta(0) else CachedTool(tool, self)
+            for tool in tools
+        ]
+
+    def setup(self) -> None:
+        """Create the shared table and drop its expired entries."""
+        with self.sync_connection.connection() as conn:
+            conn.execute(CREATE_TABLE_QUERY)
+            conn.execute(PURGE_QUERY)
+
+    async def asetup(self) -> None:
+        """Create the shared table and drop its expired entries."""
+        async with self.async_connection.connection() as conn:
+            await conn.execute(CREATE_TABLE_QUERY)
+            await conn.execute(PURGE_QUERY)
+
+    def _memory_get(self, key: str) -> Tuple[bool, Any]:
+        entry = self.memory.get(key, lambda entry: entry[0] > time.monotonic())
+        return (True, entry[1]) if entry is not None else (False, None)
+
+    def _remember(self, key: str, value: Any, ttl: float) -> None:
+        self.memory.put(key, (time.monotonic() + ttl, value), estimate_size(value))
+
+    def get_or_call(self, tool: str, tool_input: Any, call: Callable[[], Any]) -> Any:
+        """Return the cached result of ``tool`` for ``tool_input``, or call it."""
+        stats = self._stats[tool]
+        key = self._key(tool, tool_input)
+        found, value = self._memory_get(key)
+        if found:
+            stats.memory_hits += 1
+            return value
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                future: Future = Future()
+                self._inflight[key] = future
+        if inflight is not None:
+            stats.coalesced += 1
+            return inflight.result()
+
+        try:
+            value = self._load(tool, key, call)
+            future.set_result(value)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return value
+
+    # The shared tier is best effort: if Postgres is unavailable, tools are
+    # called and cached in memory only
+
+    def _load(self, tool: str, key: str, call: Callable[[], Any]) -> Any:
+        stats = self._stats[tool]
+        if self.sync_connection is not None:
+            try:
+                with self.sync_connection.connection() as conn:
+                    row = conn.execute(SELECT_QUERY, (key,)).fetchone()
+            except Exception as e:
+                logger.warning(f"Failed to read the shared tool cache: {str(e)}")
+                row = None
+            if row is not None:
+                stats.shared_hits += 1
+                value = self.serde.loads(row[0])
+                self._remember(key, value, float(row[1]))
+                return value
+        stats.misses += 1
+        try:
+            value = call()
+        except Exception:
+            stats.errors += 1
+            raise
+        if self._is_error(tool, value):
+            stats.errors += 1
+            return value
+        self._remember(key, value, self.ttl(tool).total_seconds())
+        if self.sync_connection is not None:
+            try:
+                with self.sync_connection.connection() as conn:
+                    conn.execute(
+                        UPSERT_QUERY,
+                        (key, tool, self.serde.dumps(value), self.ttl(tool)),
+                    )
+            except Exception as e:
+                logger.warning(f"Failed to write the shared tool cache: {str(e)}")
+        return value
+
+    async def aget_or_call(
+        self, tool: str, tool_input: Any, call: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return the cached result of ``tool`` for ``tool_input``, or call it."""
+        stats = self._stats[tool]
+        key = self._key(tool, tool_input)
+        found, value = self._memory_get(key)
+        if found:
+            stats.memory_hits += 1
+            return value
+
+        # the call runs in a task of its own, so cancelling the caller that
+        # started it (a client going away) does not cancel it for the others
+        inflight = self._ainflight.get(key)
+        if inflight is not None:
+            stats.coalesced += 1
+        else:
+            inflight = asyncio.ensure_future(self._aload(tool, key, call))
+            self._ainflight[key] = inflight
+            inflight.add_done_callback(lambda task: self._adone(key, task))
+        return await asyncio.shield(inflight)
+
+    def _adone(self, key: str, task: asyncio.Task) -> None:
+        if self._ainflight.get(key) is task:
+            del self._ainflight[key]
+        # retrieve the exception so it is not reported as lost when every
+        # caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _aload(
+        self, tool: str, key: str, call: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        stats = self._stats[tool]
+        if self.async_connection is not None:
+            try:
+                async with self.async_connection.connection() as conn:
+                    cur = await conn.execute(SELECT_QUERY, (key,))
+                    row = await cur.fetchone()
+            except Exception as e:
+                logger.warning(f"Failed to read the shared tool cache: {str(e)}")
+                row = None
+            if row is not None:
+                stats.shared_hits += 1
+                value = self.serde.loads(row[0])
+                self._remember(key, value, float(row[1]))
+                return value
+        stats.misses += 1
+        try:
+            value = await call()
+        except Exception:
+            stats.errors += 1
+            raise
+        if self._is_error(tool, value):
+            stats.errors += 1
+            return value
+        self._remember(key, value, self.ttl(tool).total_seconds())
+        if self.async_connection is not None:
+            try:
+                async with self.async_connection.connection() as conn:
+                    await conn.execute(
+                        UPSERT_QUERY,
+                        (key, tool, self.serde.dumps(value), self.ttl(tool)),
+                    )
+            except Exception as e:
+                logger.warning(f"Failed to write the shared tool cache: {str(e)}")
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rates per tool and overall, and the state of the memory tier."""
+        tools = {tool: stats.as_dict() for tool, stats in self._stats.items()}
+        calls = sum(stats["calls"] for stats in tools.values())
+        misses = sum(stats["misses"] for stats in tools.values())
+        return {
+            "calls": calls,
+            "hit_rate": (calls - misses) / calls if calls else 0.0,
+            "tools": tools,
+            "memory": self.memory.stats(),
+        }
+
+
+def _cache_input(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+    """The parsed arguments of a tool call, as keyed in the cache."""
+    if len(args) == 1 and not kwargs:
+        return args[0]
+    return {**{f"__arg{i + 1}": arg for i, arg in enumerate(args)}, **kwargs}
+
+
+def _call_kwargs(method: Callable, config: RunnableConfig, run_manager: Any) -> Dict[str, Any]:
+    """The ``config`` and ``run_manager`` arguments ``method`` takes."""
+    parameters = signature(method).parameters
+    kwargs: Dict[str, Any] = {}
+    if "config" in parameters:
+        kwargs["config"] = config
+    if run_manager is not None and "run_manager" in parameters:
+        kwargs["run_manager"] = run_manager
+    return kwargs
+
+
+class CachedTool(BaseTool):
+    """A tool whose results are served from a ``ToolCache`` when possible.
+
+    Input parsing and the input schema are the wrapped tool's, so models see
+    the same tool and calls are validated the same way; ``_run`` and
+    ``_arun`` consult the cache before running the wrapped tool.
+    """
+
+    tool: BaseTool
+    cache: Any
+
+    def __init__(self, tool: BaseTool, cache: ToolCache):
+        super().__init__(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            return_direct=tool.return_direct,
+            response_format=tool.response_format,
+            handle_tool_error=tool.handle_tool_error,
+            handle_validation_error=tool.handle_validation_error,
+            tool=tool,
+            cache=cache,
+        )
+
+    @property
+    def args(self) -> dict:
+        return self.tool.args
+
+    def get_input_schema(self, config: Optional[RunnableConfig] = None) -> Type[BaseModel]:
+        return self.tool.get_input_schema(config)
+
+    @property
+    def tool_call_schema(self) -> Type[BaseModel]:
+        if isinstance(self.tool, Tool) and self.tool.args_schema is None:
+            # the single string argument function calling gives a plain Tool
+            return create_model(self.name, arg1=(str, Field(..., alias="__arg1")))
+        return self.tool.tool_call_schema
+
+    def _to_args_and_kwargs(self, tool_input: Union[str, Dict]) -> Tuple[Tuple, Dict]:
+        return self.tool._to_args_and_kwargs(tool_input)
+
+    def _run(
+        self,
+        *args: Any,
+        config: RunnableConfig,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        **kwargs: Any,
+    ) -> Any:
+        key_input = _cache_input(args, kwargs)
+        kwargs = {**kwargs, **_call_kwargs(self.tool._run, config, run_manager)}
+        return self.cache.get_or_call(
+            self.name, key_input, lambda: self.tool._run(*args, **kwargs)
+        )
+
+    async def _arun(
+        self,
+        *args: Any,
+        config: RunnableConfig,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs: Any,
+    ) -> Any:
+        key_input = _cache_input(args, kwargs)
+        if type(self.tool)._arun is BaseTool._arun:
+            # no async implementation: run the sync one in a thread, as BaseTool does
+            sync_kwargs = {
+                **kwargs,
+                **_call_kwargs(
+                    self.tool._run, config, run_manager.get_sync() if run_manager else None
+                ),
+            }
+            call = lambda: run_in_executor(config, self.tool._run, *args, **sync_kwargs)
+        else:
+            kwargs = {**kwargs, **_call_kwargs(self.tool._arun, config, run_manager)}
+            call = lambda: self.tool._arun(*args, **kwargs)
+        return await self.cache.aget_or_call(self.name, key_input, call)
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+ROLE_LABELS = {
+    "human": "User",
+    "ai": "Assistant",
+    "system": "System",
+}
+
+
+def message_text(message: BaseMessage) -> str:
+    """The text of a message, joining the text parts of multimodal content."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+
+def tool_call_text(message: BaseMessage) -> str:
+    """The native tool calls of a message in the text tool protocol, one
+    ``Tool:``/``Input:`` pair per call."""
+    calls = []
+    for call in getattr(message, "tool_calls", None) or []:
+        args = call["args"]
+        # single-input tools take their one argument as plain text
+        tool_input = (
+            next(iter(args.values()))
+            if len(args) == 1 and isinstance(next(iter(args.values())), str)
+            else json.dumps(args)
+        )
+        calls.append(f"Tool: {call['name']}\nInput: {tool_input}")
+    return "\n".join(calls)
+
+
+def render_message(message: BaseMessage) -> str:
+    """Render one message as ``Role: content``.
+
+    Tool results are labelled with the tool that produced them, and native
+    tool calls are rendered like the text tool protocol. Metadata such as
+    ``additional_kwargs`` and ``response_metadata`` is left out.
+    """
+    if message.type in ("function", "tool"):
+        role = f"Tool result ({message.name})" if message.name else "Tool result"
+    else:
+        role = ROLE_LABELS.get(message.type, message.type.capitalize())
+    text = message_text(message)
+    calls = tool_call_text(message)
+    if calls:
+        text = f"{text}\n{calls}" if text else calls
+    return f"{role}: {text}"
+
+
+def token_counter(encoding: str = "o200k_base") -> Callable[[str], int]:
+    """Return a function counting the tokens of a string with tiktoken.
+
+    Falls back to about four characters per token when tiktoken or the
+    encoding is unavailable.
+    """
+    if tiktoken is not None:
+        try:
+            encoder = tiktoken.get_encoding(encoding)
+            return lambda text: len(encoder.encode(text, disallowed_special=()))
+        except Exception as e:
+            logger.warning(f"Failed to load tiktoken encoding {encoding}: {str(e)}")
+    return lambda text: (len(text) + 3) // 4
+
+
+def _fingerprint(message: BaseMessage) -> str:
+    return hashlib.blake2b(
+        f"{message.type}\0{message.name}\0{render_message(message)}".encode(),
+        digest_size=16,
+    ).hexdigest()
+
+
+class Transcript(NamedTuple):
+    text: str
+    tokens: int
+    """Tokens of ``text``."""
+    new_tokens: int
+    """Tokens of the messages rendered for this call rather than taken from cache."""
+    ends: Sequence[int] = ()
+    """Offset in ``text`` where each rendered message ends."""
+
+    def parts(self) -> List[str]:
+        """The rendered messages, each but the first with its leading separator,
+        so that they join to ``text``."""
+        starts = [0, *self.ends[:-1]]
+        return [self.text[start:end] for start, end in zip(starts, self.ends)]
+
+
+@dataclass
+class _RenderedPrefix:
+    fingerprints: List[str] = field(default_factory=list)
+    ends: List[int] = field(default_factory=list)
+    text: str = ""
+    tokens: int = 0
+
+
+class TranscriptRenderer:
+    """Renders conversations as compact transcripts, incrementally per thread.
+
+    The messages of a thread only grow between turns, so the transcript
+    rendered on the previous turn is kept and only the new messages are
+    rendered, counted and appended. If the earlier messages changed (for
+    example after they were summarized), the transcript is rebuilt.
+
+    One renderer is shared by the parallel expert branches of a graph, which
+    may run on different threads, so the cache is guarded by a lock.
+
+    Args:
+        max_threads: Number of threads whose transcript is kept, least
+            recently used first to go.
+        separator: Text between two rendered messages.
+    """
+
+    def __init__(
+        self,
+        max_threads: int = 1024,
+        separator: str = "\n\n",
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.max_threads = max_threads
+        self.separator = separator
+        self.count_tokens = count_tokens or token_counter()
+        self._separator_tokens = self.count_tokens(separator)
+        self._prefixes: OrderedDict[str, _RenderedPrefix] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(
+        self, thread_id: Optional[str], messages: Sequence[BaseMessage]
+    ) -> _RenderedPrefix:
+        with self._lock:
+            prefix = self._prefixes.get(thread_id) if thread_id is not None else None
+            # messages are only ever appended, and compaction replaces the
+            # earliest ones, so the cached prefix holds if its first and last
+            # messages are still in place
+            if (
+                prefix is not None
+                and len(prefix.fingerprints) <= len(messages)
+                and (
+                    not prefix.fingerprints
+                    or (
+                        prefix.fingerprints[0] == _fingerprint(messages[0])
+                        and prefix.fingerprints[-1]
+                        == _fingerprint(messages[len(prefix.fingerprints) - 1])
+                    )
+                )
+            ):
+                self.hits += 1
+                return prefix
+            self.misses += 1
+            return _RenderedPrefix()
+
+    def render(
+        self, messages: Sequence[BaseMessage], thread_id: Optional[str] = None
+    ) -> Transcript:
+        """Render ``messages``, reusing the transcript cached for ``thread_id``."""
+        prefix = self._cached(thread_id, messages)
+        text, tokens = prefix.text, prefix.tokens
+        fingerprints = list(prefix.fingerprints)
+        ends = list(prefix.ends)
+        new_tokens = 0
+        for message in messages[len(fingerprints) :]:
+            rendered = render_message(message)
+            added = self.count_tokens(rendered)
+            if text:
+                rendered = self.separator + rendered
+                added += self._separator_tokens
+            text += rendered
+            new_tokens += added
+            fingerprints.append(_fingerprint(message))
+            ends.append(len(text))
+        tokens += new_tokens
+
+        if thread_id is not None:
+            with self._lock:
+                self._prefixes[thread_id] = _RenderedPrefix(fingerprints, ends, text, tokens)
+                self._prefixes.move_to_end(thread_id)
+                while len(self._prefixes) > self.max_threads:
+                    self._prefixes.popitem(last=False)
+        return Transcript(text, tokens, new_tokens, ends)
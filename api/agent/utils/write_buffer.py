@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import Any, AsyncContextManager, Callable, List, Optional, Sequence, Tuple
+
+import psycopg
+
+from agent.utils.checkpoint_blobs import UPSERT_BLOB_QUERY
+from agent.utils.checkpoint_tiering import LOCK_THREAD_SHARED_QUERY
+
+logger = logging.getLogger(__name__)
+
+Statement = Tuple[str, Sequence[Any]]
+
+
+async def aexecute_pipelined(
+    conn: psycopg.AsyncConnection, statements: Sequence[Statement]
+) -> None:
+    """Run ``statements`` in one transaction, sent as a single pipeline."""
+    async with conn.pipeline():
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                for query, params in statements:
+                    await cur.execute(query, params)
+
+
+def execute_pipelined(conn: psycopg.Connection, statements: Sequence[Statement]) -> None:
+    """Run ``statements`` in one transaction, sent as a single pipeline."""
+    with conn.pipeline():
+        with conn.transaction():
+            with conn.cursor() as cur:
+                for query, params in statements:
+                    cur.execute(query, params)
+
+
+class WriteBehindBuffer:
+    """Coalesces concurrent checkpoint writes into shared transactions.
+
+    Each ``submit`` queues its statements and waits until they are committed,
+    so callers keep the durability they had when writing directly. Submissions
+    that arrive within ``flush_interval`` of each other (or while a previous
+    flush is still running) are committed together in one pipelined
+    transaction, replacing many small transactions with a few larger ones when
+    lots of threads are stepping at once.
+    """
+
+    def __init__(
+        self,
+        get_connection: Callable[[], AsyncContextManager[psycopg.AsyncConnection]],
+        flush_interval: float = 0.002,
+        max_batch: int = 256,
+    ):
+        self.get_connection = get_connection
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.submissions = 0
+        self.batches = 0
+        self._pending: List[Tuple[Sequence[Statement], asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def submit(self, statements: Sequence[Statement]) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((statements, future))
+        self.submissions += 1
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        await future
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "submissions": self.submissions,
+            "batches": self.batches,
+            "submissions_per_batch": (
+                self.submissions / self.batches if self.batches else 0.0
+            ),
+            "pending": len(self._pending),
+        }
+
+    async def _flush_loop(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            await self._flush(batch)
+
+    async def _flush(
+        self, batch: List[Tuple[Sequence[Statement], asyncio.Future]]
+    ) -> None:
+        self.batches += 1
+        try:
+            async with self.get_connection() as conn:
+                await aexecute_pipelined(conn, batch_statements(batch))
+        except Exception as e:
+            if len(batch) == 1:
+                _resolve(batch[0][1], e)
+                return
+            # retry one by one so a single bad write does not fail the others
+            logger.warning(f"Batched checkpoint write failed, retrying individually: {e}")
+            for entry in batch:
+                await self._flush([entry])
+        else:
+            for _, future in batch:
+                _resolve(future, None)
+
+
+def batch_statements(
+    batch: List[Tuple[Sequence[Statement], asyncio.Future]]
+) -> List[Statement]:
+    """The statements of a batch of submissions, in the order they are run.
+
+    Thread locks go first, then blob upserts, each once per key and in key
+    order, so concurrent batches (and ``tier_idle_threads``) that share
+    threads or blobs lock them in the same order instead of deadlocking. The
+    other statements keep their submission order.
+    """
+    statements = [statement for entry, _ in batch for statement in entry]
+    first = []
+    for ordered_query in (LOCK_THREAD_SHARED_QUERY, UPSERT_BLOB_QUERY):
+        keyed = {
+            params[0]: (query, params)
+            for query, params in statements
+            if query == ordered_query
+        }
+        first.extend(keyed[key] for key in sorted(keyed))
+    return first + [
+        statement
+        for statement in statements
+        if statement[0] not in (LOCK_THREAD_SHARED_QUERY, UPSERT_BLOB_QUERY)
+    ]
+
+
+def _resolve(future: asyncio.Future, error: Optional[BaseException]) -> None:
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
@@ -0,0 +1,321 @@
+"""Benchmark PostgresSaver with synthetic meta-prompting threads.
+
+Run from the ``api`` directory against a local Postgres, e.g.::
+
+    python -m benchmarks.checkpointer --dsn postgresql://localhost/bench \\
+        --messages 10,50,100 --message-size 500,4000 --concurrency 16 \\
+        --output results.json
+
+Each scenario steps ``--threads`` conversations to ``messages`` messages of
+``message-size`` characters, ``--concurrency`` at a time. Every step writes
+the task's writes and the new checkpoint and reads the thread back, like a
+graph run does, and every ``--list-every`` steps lists recent history.
+``--compare`` prints the change against an earlier results file.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import subprocess
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import product
+from typing import Any, Dict, List, Optional
+
+from langgraph.serde.jsonplus import JsonPlusSerializer
+from psycopg_pool import AsyncConnectionPool
+
+from agent.checkpoint_admin import default_dsn
+from agent.utils.checkpoint_serde import CompactSerializer
+from agent.utils.postgres_saver import PostgresSaver
+from agent.utils.serde_executor import SerdeExecutor
+from benchmarks.workload import MeasuredSerializer, SyntheticThread
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TABLE_SIZE_QUERY = """
+SELECT coalesce(sum(pg_total_relation_size(relid)), 0)::bigint
+FROM (
+    SELECT 'checkpoints'::regclass AS relid
+    UNION ALL SELECT 'writes'::regclass
+    UNION ALL SELECT 'checkpoint_blobs'::regclass
+    UNION ALL SELECT inhrelid FROM pg_inherits
+    WHERE inhparent IN ('checkpoints'::regclass, 'writes'::regclass)
+) tables
+"""
+"""Size of the checkpoint tables including TOAST, indexes and any partitions."""
+
+DELETE_RUN_QUERIES = (
+    "DELETE FROM writes WHERE thread_id LIKE %s",
+    "DELETE FROM checkpoints WHERE thread_id LIKE %s",
+)
+
+DELETE_UNREFERENCED_BLOBS_QUERY = "DELETE FROM checkpoint_blobs WHERE refcount <= 0"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of ``values``, ``q`` between 0 and 100."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies: List[float], duration: float) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "ops_per_s": len(latencies) / duration if duration else 0.0,
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p99_ms": 1000 * percentile(latencies, 99),
+    }
+
+
+async def table_bytes(pool: AsyncConnectionPool) -> int:
+    async with pool.connection() as conn:
+        cur = await conn.execute(TABLE_SIZE_QUERY)
+        return (await cur.fetchone())[0]
+
+
+async def run_thread(
+    saver: PostgresSaver,
+    thread: SyntheticThread,
+    steps: int,
+    list_every: int,
+    latencies: Dict[str, List[float]],
+) -> None:
+    config = latest = {"configurable": {"thread_id": thread.thread_id}}
+
+    async def timed(name: str, operation) -> Any:
+        started = time.perf_counter()
+        result = await operation
+        latencies[name].append(time.perf_counter() - started)
+        return result
+
+    for step in range(1, steps + 1):
+        task_id, writes, checkpoint, metadata = thread.step()
+        if "thread_ts" in config["configurable"]:
+            await timed("aput_writes", saver.aput_writes(config, writes, task_id))
+        config = await timed("aput", saver.aput(config, checkpoint, metadata))
+        await timed("aget_tuple", saver.aget_tuple(latest))
+        if list_every and step % list_every == 0:
+            started = time.perf_counter()
+            async for listed in saver.alist(config, limit=10):
+                listed.checkpoint["id"]  # decode like a history view would
+            latencies["alist"].append(time.perf_counter() - started)
+
+
+async def run_scenario(
+    pool: AsyncConnectionPool,
+    args: argparse.Namespace,
+    messages: int,
+    message_size: int,
+) -> Dict[str, Any]:
+    serde = MeasuredSerializer(
+        CompactSerializer() if args.serde == "compact" else JsonPlusSerializer()
+    )
+    saver = PostgresSaver(
+        async_connection=pool,
+        serde=serde,
+        delta_mode=args.delta,
+        cache_max_bytes=args.cache_mb * 1024 * 1024,
+        write_behind=args.write_behind,
+        blob_threshold=args.blob_threshold,
+        serde_executor=SerdeExecutor(args.serde_executor, args.serde_offload_bytes)
+        if args.serde_executor
+        else None,
+    )
+    prefix = f"bench-{uuid.uuid4().hex[:8]}-"
+    threads = [
+        SyntheticThread(f"{prefix}{i}", message_size, seed=i)
+        for i in range(args.threads)
+    ]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(thread: SyntheticThread) -> None:
+        async with semaphore:
+            await run_thread(saver, thread, messages, args.list_every, latencies)
+
+    size_before = await table_bytes(pool)
+    started = time.perf_counter()
+    await asyncio.gather(*(bounded(thread) for thread in threads))
+    duration = time.perf_counter() - started
+    size_after = await table_bytes(pool)
+
+    if not args.keep_data:
+        async with pool.connection() as conn:
+            for query in DELETE_RUN_QUERIES:
+                await conn.execute(query, (prefix + "%",))
+            await conn.execute(DELETE_UNREFERENCED_BLOBS_QUERY)
+
+    steps = messages * args.threads
+    result = {
+        "messages": messages,
+        "message_size": message_size,
+        "threads": args.threads,
+        "concurrency": args.concurrency,
+        "steps": steps,
+        "duration_s": duration,
+        "steps_per_s": steps / duration,
+        "ops": {
+            name: summarize(values, duration) for name, values in latencies.items()
+        },
+        "serialized_bytes_per_step": serde.bytes_dumped / steps,
+        "disk_bytes_per_step": max(size_after - size_before, 0) / steps,
+        "dumps_ms_per_step": 1000 * serde.dumps_seconds / steps,
+        "loads_ms_per_step": 1000 * serde.loads_seconds / steps,
+    }
+    if saver.cache is not None:
+        result["cache"] = saver.cache.stats()
+    if saver.write_buffer is not None:
+        result["write_buffer"] = saver.write_buffer.stats()
+    if saver.serde_executor is not None:
+        # offloaded calls run in the executor, so only inline ones are measured
+        # by the serializer when it is a process pool
+        result["serde_executor"] = saver.serde_executor.stats()
+        saver.serde_executor.shutdown()
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    logger.info(
+        f"messages={result['messages']} size={result['message_size']} "
+        f"concurrency={result['concurrency']}: {result['steps_per_s']:.1f} steps/s, "
+        f"{result['serialized_bytes_per_step']:.0f} B/step serialized, "
+        f"{result['disk_bytes_per_step']:.0f} B/step on disk, "
+        f"dumps {result['dumps_ms_per_step']:.2f} ms/step, "
+        f"loads {result['loads_ms_per_step']:.2f} ms/step"
+    )
+    for name, stats in sorted(result["ops"].items()):
+        line = (
+            f"  {name:<12} p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms"
+        )
+        if baseline and name in baseline["ops"]:
+            old = baseline["ops"][name]
+            line += (
+                f"  (p50 {stats['p50_ms'] / old['p50_ms'] - 1:+.0%}, "
+                f"p99 {stats['p99_ms'] / old['p99_ms'] - 1:+.0%})"
+            )
+        logger.info(line)
+    if "serde_executor" in result:
+        stats = result["serde_executor"]
+        logger.info(
+            f"  serde {stats['offloaded_calls']} offloaded, "
+            f"{stats['inline_calls']} inline, loop blocked "
+            f"p99 {stats['blocked_ms_p99']:.2f} ms max {stats['blocked_ms_max']:.2f} ms"
+        )
+    if baseline:
+        throughput = result["steps_per_s"] / baseline["steps_per_s"] - 1
+        size = (
+            result["serialized_bytes_per_step"] / baseline["serialized_bytes_per_step"]
+            - 1
+        )
+        logger.info(f"  throughput {throughput:+.0%}, serialized bytes {size:+.0%}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    baselines = {}
+    if args.compare:
+        with open(args.compare) as f:
+            for scenario in json.load(f)["scenarios"]:
+                key = (
+                    scenario["messages"],
+                    scenario["message_size"],
+                    scenario["concurrency"],
+                )
+                baselines[key] = scenario
+
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("dsn", "output", "compare")
+        },
+        "scenarios": [],
+    }
+    async with AsyncConnectionPool(
+        args.dsn, max_size=args.pool_size, open=False
+    ) as pool:
+        await PostgresSaver.acreate_tables(pool)
+        for messages, message_size in product(args.messages, args.message_size):
+            result = await run_scenario(pool, args, messages, message_size)
+            report(
+                result, baselines.get((messages, message_size, args.concurrency))
+            )
+            results["scenarios"].append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote results to {args.output}")
+
+
+def int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=default_dsn(), help="Postgres connection string")
+    parser.add_argument(
+        "--messages", type=int_list, default=[10, 50], help="Messages per thread"
+    )
+    parser.add_argument(
+        "--message-size",
+        type=int_list,
+        default=[500, 4000],
+        help="Characters per message",
+    )
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--list-every", type=int, default=10)
+    parser.add_argument("--serde", choices=["compact", "json"], default="compact")
+    parser.add_argument("--delta", action="store_true", help="Use delta checkpoints")
+    parser.add_argument("--cache-mb", type=int, default=0)
+    parser.add_argument("--write-behind", action="store_true")
+    parser.add_argument(
+        "--blob-threshold",
+        type=int,
+        default=0,
+        help="Store values of at least this many bytes out of line",
+    )
+    parser.add_argument(
+        "--serde-executor",
+        choices=["thread", "process"],
+        help="Serialize large checkpoints in this kind of pool",
+    )
+    parser.add_argument(
+        "--serde-offload-bytes",
+        type=int,
+        default=256 * 1024,
+        help="Approximate size from which serialization leaves the event loop",
+    )
+    parser.add_argument(
+        "--keep-data", action="store_true", help="Do not delete the benchmark rows"
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Results file of an earlier run")
+    return parser
+
+
+if __name__ == "__main__":
+    asyncio.run(main(build_parser().parse_args()))
@@ -0,0 +1,222 @@
+"""Compare turns and LLM calls per query of native and text tool calling.
+
+Run from the ``api`` directory with the provider's API key set, e.g.::
+
+    python -m benchmarks.tool_calling --provider openai --model gpt-4o-mini \\
+        --modes text,native --output results.json
+
+Each mode answers the same fixed question set (or the questions of
+``--questions``, one per line) with the tools of ``chat_agent.build_tools``
+and an in-memory checkpointer. For every query it records the meta-prompter
+turns, the LLM and tool calls, the errors logged and whether it ended in a
+final answer. ``--compare`` prints the change against an earlier results file.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint import MemorySaver
+
+from agent.chat_agent import build_tools
+from agent.utils.llm_setup import get_llm
+from agent.utils.meta_prompting_agent import MAX_TURNS, create_meta_prompting_agent
+from benchmarks.checkpointer import git_commit
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+QUESTIONS = [
+    "What is the current population of Tokyo, Japan?",
+    "What is the chemical formula for table salt?",
+    'Who wrote the novel "Pride and Prejudice"?',
+    "What is the tallest building in the world and how tall is it?",
+    "How many moons does Jupiter have?",
+    "What is the boiling point of water at the top of Mount Everest?",
+    "Who won the most recent FIFA World Cup, and who was the top scorer?",
+    "What is the square root of the number of days in a leap year, to three decimals?",
+]
+
+
+class CallCounter(BaseCallbackHandler):
+    """Counts the LLM and tool calls of one query."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.tool_calls = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs: Any) -> None:
+        self.llm_calls += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs: Any) -> None:
+        self.llm_calls += 1
+
+    def on_tool_start(self, serialized, input_str, **kwargs: Any) -> None:
+        self.tool_calls += 1
+
+
+async def run_query(agent, question: str, recursion_limit: int) -> Dict[str, Any]:
+    counter = CallCounter()
+    config = {
+        "configurable": {"thread_id": f"bench-{uuid.uuid4()}"},
+        "callbacks": [counter],
+        "recursion_limit": recursion_limit,
+    }
+    started = time.perf_counter()
+    error = None
+    state: Dict[str, Any] = {}
+    try:
+        state = await agent.ainvoke(
+            {"messages": [HumanMessage(content=question)], "error_log": [], "turn_count": 0},
+            config,
+        )
+    except Exception as e:
+        error = str(e)
+        logger.warning(f"Query failed: {question}: {error}")
+    messages = state.get("messages") or []
+    return {
+        "question": question,
+        "turns": state.get("turn_count", 0),
+        "llm_calls": counter.llm_calls,
+        "tool_calls": counter.tool_calls,
+        "errors": len(state.get("error_log") or []) + (error is not None),
+        "answered": bool(messages) and "FINAL ANSWER:" in str(messages[-1].content),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+async def run_mode(model, tools, mode: str, args: argparse.Namespace, questions: List[str]) -> Dict[str, Any]:
+    agent = await create_meta_prompting_agent(
+        model,
+        tools,
+        checkpointer=MemorySaver(),
+        native_tool_calling=mode == "native",
+    )
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run(question: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await run_query(agent, question, args.recursion_limit)
+
+    queries = []
+    for _ in range(args.repeat):
+        queries.extend(await asyncio.gather(*(run(question) for question in questions)))
+
+    count = len(queries)
+    return {
+        "mode": mode,
+        "queries": count,
+        "turns_per_query": sum(q["turns"] for q in queries) / count,
+        "llm_calls_per_query": sum(q["llm_calls"] for q in queries) / count,
+        "tool_calls_per_query": sum(q["tool_calls"] for q in queries) / count,
+        "errors_per_query": sum(q["errors"] for q in queries) / count,
+        "answered_rate": sum(q["answered"] for q in queries) / count,
+        "seconds_per_query": sum(q["seconds"] for q in queries) / count,
+        "details": queries,
+    }
+
+
+def change(result: Dict[str, Any], baseline: Dict[str, Any], key: str) -> str:
+    if not baseline[key]:
+        return "n/a"
+    return f"{result[key] / baseline[key] - 1:+.0%}"
+
+
+def report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    line = (
+        f"{result['mode']:<6} {result['queries']} queries: "
+        f"{result['turns_per_query']:.2f} turns, "
+        f"{result['llm_calls_per_query']:.2f} LLM calls, "
+        f"{result['tool_calls_per_query']:.2f} tool calls, "
+        f"{result['errors_per_query']:.2f} errors per query, "
+        f"{result['answered_rate']:.0%} answered, "
+        f"{result['seconds_per_query']:.1f} s per query"
+    )
+    if baseline:
+        line += (
+            f" (turns {change(result, baseline, 'turns_per_query')}, "
+            f"LLM calls {change(result, baseline, 'llm_calls_per_query')} "
+            f"vs {baseline['mode']})"
+        )
+    logger.info(line)
+
+
+async def main(args: argparse.Namespace) -> None:
+    questions = QUESTIONS
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    baselines = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baselines = {result["mode"]: result for result in json.load(f)["modes"]}
+
+    model = get_llm(args.provider, args.model, temperature=args.temperature)
+    tools = build_tools()
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+        "modes": [],
+    }
+    for mode in args.modes:
+        result = await run_mode(model, tools, mode, args, questions)
+        # without an earlier run, native is compared against text of this one
+        baseline = baselines.get(mode)
+        if baseline is None and mode != "text":
+            baseline = next((r for r in results["modes"] if r["mode"] == "text"), None)
+        report(result, baseline)
+        results["modes"].append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote results to {args.output}")
+
+
+def mode_list(value: str) -> List[str]:
+    modes = value.split(",")
+    for mode in modes:
+        if mode not in ("native", "text"):
+            raise argparse.ArgumentTypeError(f"Unknown tool calling mode: {mode}")
+    return modes
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--provider", choices=["openai", "claude"], default="openai")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument(
+        "--modes",
+        type=mode_list,
+        default=["text", "native"],
+        help="Tool calling modes to run, in order",
+    )
+    parser.add_argument("--questions", help="File with one question per line")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each question")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--recursion-limit",
+        type=int,
+        default=4 * MAX_TURNS,
+        help="Graph steps allowed per query",
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Results file of an earlier run")
+    return parser
+
+
+if __name__ == "__main__":
+    asyncio.run(main(build_parser().parse_args()))
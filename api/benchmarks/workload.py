@@ -0,0 +1,137 @@
+"""Synthetic meta-prompting threads for checkpointer benchmarks."""
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, List, Tuple
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    FunctionMessage,
+    HumanMessage,
+)
+from langgraph.checkpoint.base import Checkpoint, CheckpointMetadata, copy_checkpoint
+from langgraph.checkpoint.id import uuid6
+from langgraph.serde.base import SerializerProtocol
+
+from agent.utils.meta_prompting_agent import MetaPromptingState
+
+WORDS = (
+    "the search results suggest that expert analysis of recent data shows "
+    "population growth economic policy climate model wikipedia article "
+    "according to sources confidence interval estimate approximately percent"
+).split()
+
+
+def text(rng: random.Random, size: int) -> str:
+    """Return roughly ``size`` characters of word salad."""
+    words: List[str] = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+class SyntheticThread:
+    """Produces the checkpoints and writes a meta-prompting conversation would.
+
+    Each step alternates between the meta-prompter, the expert and a tool
+    result, appending one message of about ``message_size`` characters to
+    ``messages`` like the real graph does.
+    """
+
+    NODES = ("meta_prompter", "expert", "tools")
+
+    def __init__(self, thread_id: str, message_size: int, seed: int = 0):
+        self.thread_id = thread_id
+        self.message_size = message_size
+        self.rng = random.Random(seed)
+        self.step_count = 0
+        self.state: MetaPromptingState = {
+            "messages": [HumanMessage(content=text(self.rng, message_size))],
+            "error_log": [],
+            "turn_count": 0,
+        }
+        self.checkpoint: Checkpoint = Checkpoint(
+            v=1,
+            id=str(uuid6(clock_seq=-1)),
+            ts=datetime.now(timezone.utc).isoformat(),
+            channel_values={},
+            channel_versions={},
+            versions_seen={},
+            pending_sends=[],
+            current_tasks={},
+        )
+
+    def _message(self) -> BaseMessage:
+        node = self.NODES[self.step_count % len(self.NODES)]
+        content = text(self.rng, self.message_size)
+        if node == "meta_prompter":
+            return AIMessage(content=f"EXPERT REQUEST: ```{content}```")
+        if node == "expert":
+            return AIMessage(content=f"Tool: Wikipedia\nInput: {content[:80]}")
+        return FunctionMessage(content=content, name="Wikipedia")
+
+    def step(self) -> Tuple[str, List[Tuple[str, Any]], Checkpoint, CheckpointMetadata]:
+        """Advance one superstep.
+
+        Returns:
+            The task id, the writes of the task, and the resulting checkpoint
+            with its metadata.
+        """
+        node = self.NODES[self.step_count % len(self.NODES)]
+        message = self._message()
+        self.step_count += 1
+        self.state = {
+            "messages": [*self.state["messages"], message],
+            "error_log": self.state["error_log"],
+            "turn_count": self.state["turn_count"] + (node == "meta_prompter"),
+        }
+        writes = [
+            ("messages", [message]),
+            ("turn_count", self.state["turn_count"]),
+            ("error_log", self.state["error_log"]),
+        ]
+
+        checkpoint = copy_checkpoint(self.checkpoint)
+        checkpoint["id"] = str(uuid6(clock_seq=self.step_count))
+        checkpoint["ts"] = datetime.now(timezone.utc).isoformat()
+        checkpoint["channel_values"] = {**self.state, node: node}
+        for channel in (*self.state, node):
+            checkpoint["channel_versions"][channel] = self.step_count
+        checkpoint["versions_seen"][node] = {
+            channel: self.step_count - 1 for channel in self.state
+        }
+        self.checkpoint = checkpoint
+        metadata: CheckpointMetadata = {
+            "source": "loop",
+            "step": self.step_count,
+            "writes": {node: dict(writes)},
+        }
+        return str(uuid6(clock_seq=self.step_count)), writes, checkpoint, metadata
+
+
+class MeasuredSerializer(SerializerProtocol):
+    """Wraps a serializer to count the bytes it produces and the time it takes."""
+
+    def __init__(self, serde: SerializerProtocol):
+        self.serde = serde
+        self.bytes_dumped = 0
+        self.dumps_seconds = 0.0
+        self.loads_seconds = 0.0
+
+    def dumps(self, obj: Any) -> bytes:
+        started = time.perf_counter()
+        data = self.serde.dumps(obj)
+        self.dumps_seconds += time.perf_counter() - started
+        self.bytes_dumped += len(data)
+        return data
+
+    def loads(self, data: bytes) -> Any:
+        started = time.perf_counter()
+        try:
+            return self.serde.loads(data)
+        finally:
+            self.loads_seconds += time.perf_counter() - started
@@ -6,13 +6,19 @@ from sqlalchemy import create_engine, Column, String
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
-# Database setup
-DB_NAME=os.environ['POSTGRES_DB']
-DB_USER=os.environ['POSTGRES_USER']
-DB_PWD=os.environ['POSTGRES_PASSWORD']
+# Database setup: conversations are kept next to the checkpoints, so
+# CHECKPOINT_BACKEND=sqlite stores them in the CHECKPOINT_SQLITE_PATH file
+if os.getenv("CHECKPOINT_BACKEND") == "sqlite":
+    SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.getenv('CHECKPOINT_SQLITE_PATH', 'checkpoints.sqlite')}"
+    # sessions are opened in the threadpool and used in the event loop
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+else:
+    DB_NAME=os.environ['POSTGRES_DB']
+    DB_USER=os.environ['POSTGRES_USER']
+    DB_PWD=os.environ['POSTGRES_PASSWORD']
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PWD}@db/{DB_NAME}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PWD}@db/{DB_NAME}"
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -1,8 +1,10 @@
+import os
 from fastapi import FastAPI
 from langserve import add_routes
 from endpoints import conversations
+from agent import chat_agent
 from agent.chat_agent import build_agent
-from agent.utils.llm_setup import get_llm
+from agent.utils.llm_setup import get_llm_from_spec
 
 app = FastAPI()
 
@@ -14,7 +16,24 @@ agent = None
 @app.on_event("startup")
 async def startup_event():
     global agent
-    agent = await build_agent(get_llm("openai", "gpt-4o-mini"))
+    # LLM is the default model of every node, see build_node_models for per-node models
+    agent = await build_agent(get_llm_from_spec(os.getenv("LLM", "openai:gpt-4o-mini")))
+
+@app.get("/api/checkpoint-cache/stats")
+async def checkpoint_cache_stats():
+    return chat_agent.checkpoint_cache.stats() if chat_agent.checkpoint_cache else {}
+
+@app.get("/api/tool-cache/stats")
+async def tool_cache_stats():
+    return chat_agent.tool_cache.stats() if chat_agent.tool_cache else {}
+
+@app.get("/api/prompt-cache/stats")
+async def prompt_cache_stats():
+    return chat_agent.prompt_cache_stats.stats()
+
+@app.get("/api/escalation/stats")
+async def escalation_stats():
+    return chat_agent.escalation.stats() if chat_agent.escalation else {}
 
 # add langserve routes
 @app.on_event("startup")
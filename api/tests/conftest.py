@@ -0,0 +1,75 @@
+"""Shared fixtures.
+
+Run from the ``api`` directory with ``python -m pytest -q``. Tests that need
+Postgres are skipped unless ``TEST_POSTGRES_URI`` points at a database they
+may freely create and drop the checkpoint tables in.
+"""
+import operator
+import os
+import sys
+from typing import Annotated, List, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage
+from langgraph.graph import END, StateGraph
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TABLES = (
+    "checkpoints",
+    "writes",
+    "checkpoint_blobs",
+    "archived_threads",
+    "checkpoint_schema_version",
+    "tool_cache",
+)
+
+
+class CounterState(TypedDict):
+    messages: Annotated[List[BaseMessage], operator.add]
+    turn_count: int
+
+
+def build_counter_graph(saver, turns: int = 12):
+    """A graph appending one message per step for ``turns`` steps, so every
+    checkpoint differs from its parent by a single message."""
+
+    def step(state: CounterState):
+        turn = state.get("turn_count", 0) + 1
+        return {"messages": [AIMessage(content=f"turn {turn} " + "x" * 200)], "turn_count": turn}
+
+    graph = StateGraph(CounterState)
+    graph.add_node("step", step)
+    graph.set_entry_point("step")
+    graph.add_conditional_edges(
+        "step", lambda state: END if state["turn_count"] >= turns else "step"
+    )
+    return graph.compile(checkpointer=saver)
+
+
+@pytest.fixture
+def counter_graph():
+    return build_counter_graph
+
+
+@pytest.fixture
+def postgres_uri():
+    uri = os.getenv("TEST_POSTGRES_URI")
+    if not uri:
+        pytest.skip("TEST_POSTGRES_URI is not set")
+    psycopg = pytest.importorskip("psycopg")
+    with psycopg.connect(uri, autocommit=True) as conn:
+        for table in TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+    return uri
+
+
+@pytest.fixture
+def postgres_pool(postgres_uri):
+    from psycopg_pool import ConnectionPool
+
+    from agent.utils.postgres_saver import PostgresSaver
+
+    with ConnectionPool(postgres_uri) as pool:
+        PostgresSaver.create_tables(pool)
+        yield pool
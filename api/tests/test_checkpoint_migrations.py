@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+from langchain_core.messages import HumanMessage
+
+from agent.utils.checkpoint_migrations import checkpoint_migrations, migrate
+from agent.utils.postgres_saver import PostgresSaver
+
+INPUT = {"messages": [HumanMessage(content="hi")], "turn_count": 0}
+
+
+def checkpoint_id(at: datetime) -> str:
+    """A uuid6 checkpoint id minted at ``at``, as ``langgraph`` makes them."""
+    timestamp = int(at.timestamp() * 10**7) + 0x01B21DD213814000
+    uuid_int = ((timestamp >> 12) & 0xFFFFFFFFFFFF) << 80
+    uuid_int |= (0x6000 | timestamp & 0x0FFF) << 64
+    uuid_int |= 0x8000 << 48
+    return str(UUID(int=uuid_int))
+
+
+def test_created_at_is_backfilled_from_the_checkpoint_id(postgres_uri):
+    import psycopg
+
+    minted = datetime(2024, 3, 1, 12, 30, tzinfo=timezone.utc)
+    with psycopg.connect(postgres_uri) as conn:
+        migrate(conn, checkpoint_migrations()[:1])
+        conn.execute(
+            "INSERT INTO checkpoints (thread_id, thread_ts, checkpoint, metadata) VALUES "
+            "('uuid', %s, '', ''), ('iso', '2023-05-04T10:00:00+00:00', '', ''), ('other', 'x', '', '')",
+            (checkpoint_id(minted),),
+        )
+        conn.commit()
+        migrate(conn, checkpoint_migrations())
+        created = dict(conn.execute("SELECT thread_id, created_at FROM checkpoints"))
+        (now,) = conn.execute("SELECT now()").fetchone()
+    assert abs((created["uuid"] - minted).total_seconds()) < 0.001
+    assert created["iso"] == datetime(2023, 5, 4, 10, tzinfo=timezone.utc)
+    # ids that carry no time fall back to the time of the migration
+    assert abs((created["other"] - now).total_seconds()) < 60
+
+
+def test_partitioning_a_populated_table(postgres_pool, counter_graph):
+    saver = PostgresSaver(sync_connection=postgres_pool, blob_threshold=64)
+    configs = [{"configurable": {"thread_id": f"t{i}"}} for i in range(6)]
+    for config in configs:
+        counter_graph(saver, turns=3).invoke(INPUT, config)
+    expected = [counter_graph(saver).get_state(config).values for config in configs]
+    count_query = "SELECT (SELECT count(*) FROM checkpoints), (SELECT count(*) FROM writes)"
+    refcount_query = "SELECT hash, refcount FROM checkpoint_blobs ORDER BY hash"
+    with postgres_pool.connection() as conn:
+        counts = conn.execute(count_query).fetchone()
+        refcounts = conn.execute(refcount_query).fetchall()
+
+    PostgresSaver.create_tables(postgres_pool, partitions=4)
+
+    with postgres_pool.connection() as conn:
+        partitions = conn.execute(
+            "SELECT inhparent::regclass::text, count(*) FROM pg_inherits "
+            "JOIN pg_partitioned_table ON partrelid = inhparent GROUP BY 1 ORDER BY 1"
+        ).fetchall()
+        assert partitions == [("checkpoints", 4), ("writes", 4)]
+        assert 4 in {row[0] for row in conn.execute("SELECT version FROM checkpoint_schema_version")}
+        assert conn.execute(count_query).fetchone() == counts
+        # copying the rows over does not count their blob references twice
+        assert conn.execute(refcount_query).fetchall() == refcounts
+        indexes = {
+            row[0] for row in conn.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'checkpoints'")
+        }
+        assert {"checkpoints_thread_latest_idx", "checkpoints_metadata_json_idx"} <= indexes
+
+    reader = PostgresSaver(sync_connection=postgres_pool, blob_threshold=64)
+    assert [counter_graph(reader).get_state(config).values for config in configs] == expected
+    # the triggers are back in place for new rows
+    counter_graph(reader, turns=3).invoke(INPUT, {"configurable": {"thread_id": "new"}})
+    with postgres_pool.connection() as conn:
+        assert conn.execute(
+            "SELECT count(*) FROM checkpoint_blobs WHERE refcount <= 0"
+        ).fetchone() == (0,)
@@ -0,0 +1,53 @@
+import asyncio
+
+import psycopg
+from langchain_core.messages import HumanMessage
+
+from agent.utils.checkpoint_retention import RetentionPolicy, aprune_checkpoints
+from agent.utils.postgres_saver import PostgresSaver
+
+INPUT = {"messages": [HumanMessage(content="hi")], "turn_count": 0}
+
+
+def prune(uri: str, policy: RetentionPolicy):
+    async def run():
+        async with await psycopg.AsyncConnection.connect(uri, autocommit=True) as conn:
+            return await aprune_checkpoints(conn, policy)
+
+    return asyncio.run(run())
+
+
+def test_prune_keeps_the_ancestors_of_kept_deltas(postgres_uri, postgres_pool, counter_graph):
+    config = {"configurable": {"thread_id": "t"}}
+    saver = PostgresSaver(sync_connection=postgres_pool, delta_mode=True, keyframe_interval=4)
+    counter_graph(saver).invoke(INPUT, config)
+    reader = counter_graph(PostgresSaver(sync_connection=postgres_pool))
+    expected = [state.values for state in reader.get_state_history(config)]
+
+    report = prune(postgres_uri, RetentionPolicy(keep_last=3, batch_size=2))
+
+    with postgres_pool.connection() as conn:
+        rows = conn.execute(
+            "SELECT is_delta FROM checkpoints WHERE thread_id = 't' ORDER BY thread_ts"
+        ).fetchall()
+    # the three newest checkpoints, plus the deltas and keyframe they build on
+    assert len(rows) > 3
+    assert not rows[0][0]
+    assert report.checkpoints_deleted == len(expected) - len(rows)
+    history = [state.values for state in reader.get_state_history(config)]
+    assert history == expected[: len(rows)]
+
+    # the thread carries on from what was kept
+    counter_graph(saver, turns=13).invoke(INPUT, config)
+    assert reader.get_state(config).values["turn_count"] == 13
+
+
+def test_prune_keeps_only_the_newest_full_checkpoints(postgres_uri, postgres_pool, counter_graph):
+    config = {"configurable": {"thread_id": "t"}}
+    counter_graph(PostgresSaver(sync_connection=postgres_pool)).invoke(INPUT, config)
+
+    prune(postgres_uri, RetentionPolicy(keep_last=2))
+
+    reader = counter_graph(PostgresSaver(sync_connection=postgres_pool))
+    history = list(reader.get_state_history(config))
+    assert [state.values["turn_count"] for state in history] == [12, 11]
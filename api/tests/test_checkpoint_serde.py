@@ -0,0 +1,81 @@
+import psycopg
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.serde.jsonplus import JsonPlusSerializer
+
+from agent.utils.checkpoint_serde import (
+    JSON_CODEC,
+    CompactSerializer,
+    is_framed,
+    migrate_serialization,
+)
+from agent.utils.postgres_saver import PostgresSaver
+
+STATE = {
+    "messages": [HumanMessage(content="hi"), AIMessage(content="x" * 4000)],
+    "turn_count": 3,
+    "error_log": [],
+    "nested": {"a": [1, 2.5, None, True], "b": {"c": "d"}},
+}
+
+
+@pytest.mark.parametrize("compression", ["zstd", None])
+def test_round_trip(compression):
+    serde = CompactSerializer(compression=compression)
+    data = serde.dumps(STATE)
+    assert is_framed(data)
+    assert serde.loads(data) == STATE
+    assert len(data) < len(JsonPlusSerializer().dumps(STATE))
+
+
+def test_round_trips_bytes():
+    serde = CompactSerializer()
+    assert serde.loads(serde.dumps({"blob": b"\x00\x01"})) == {"blob": b"\x00\x01"}
+
+
+def test_reads_json_rows():
+    data = JsonPlusSerializer().dumps(STATE)
+    assert not is_framed(data)
+    assert CompactSerializer().loads(data) == STATE
+
+
+def test_falls_back_to_json_for_wide_integers():
+    serde = CompactSerializer()
+    data = serde.dumps({"big": 2**70})
+    assert is_framed(data) and data[2] == JSON_CODEC
+    assert serde.loads(data) == {"big": 2**70}
+
+
+def test_unknown_format_version():
+    data = bytearray(CompactSerializer().dumps(STATE))
+    data[1] = 99
+    with pytest.raises(ValueError, match="format version"):
+        CompactSerializer().loads(bytes(data))
+
+
+def test_migrate_serialization_rewrites_each_row_once(postgres_uri, postgres_pool, counter_graph):
+    config = {"configurable": {"thread_id": "t"}}
+    counter_graph(PostgresSaver(sync_connection=postgres_pool), turns=3).invoke(
+        {"messages": [HumanMessage(content="hi")], "turn_count": 0}, config
+    )
+    expected = counter_graph(PostgresSaver(sync_connection=postgres_pool)).get_state(config).values
+
+    serde = CompactSerializer()
+    with postgres_pool.connection() as conn:
+        # a legacy row only the JSON encoding can hold
+        conn.execute(
+            "UPDATE checkpoints SET metadata = %s WHERE thread_ts = (SELECT min(thread_ts) FROM checkpoints)",
+            (JsonPlusSerializer().dumps({"source": "input", "step": -1, "big": 2**70}),),
+        )
+    with psycopg.connect(postgres_uri) as conn:
+        rows, before, after = migrate_serialization(conn, serde, batch_size=2)
+        assert rows > 0 and after < before
+        assert migrate_serialization(conn, serde, batch_size=2) == (0, 0, 0)
+
+        (metadata,) = conn.execute(
+            "SELECT metadata FROM checkpoints ORDER BY thread_ts LIMIT 1"
+        ).fetchone()
+    assert metadata[2] == JSON_CODEC and serde.loads(metadata)["big"] == 2**70
+
+    saver = PostgresSaver(sync_connection=postgres_pool, serde=serde)
+    assert counter_graph(saver).get_state(config).values == expected
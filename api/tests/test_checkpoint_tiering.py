@@ -0,0 +1,123 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import psycopg
+from langchain_core.messages import HumanMessage
+
+from agent.utils.checkpoint_tiering import LOCK_THREAD_SHARED_QUERY, LocalArchiveStore, tier_idle_threads
+from agent.utils.postgres_saver import PostgresSaver
+
+INPUT = {"messages": [HumanMessage(content="hi")], "turn_count": 0}
+
+
+def archive_thread(uri, pool, store, counter_graph, thread_id):
+    config = {"configurable": {"thread_id": thread_id}}
+    counter_graph(PostgresSaver(sync_connection=pool), turns=3).invoke(INPUT, config)
+    expected = PostgresSaver(sync_connection=pool).get_tuple(config)
+    with psycopg.connect(uri) as conn:
+        conn.execute("UPDATE checkpoints SET created_at = now() - interval '40 days'")
+        conn.commit()
+        tier_idle_threads(conn, store, timedelta(days=30))
+        assert conn.execute("SELECT count(*) FROM checkpoints").fetchone()[0] == 0
+    return config, expected
+
+
+def test_rehydrate_on_a_raw_connection_commits(tmp_path, postgres_uri, postgres_pool, counter_graph):
+    store = LocalArchiveStore(str(tmp_path))
+    config, expected = archive_thread(postgres_uri, postgres_pool, store, counter_graph, "t")
+
+    # closed rather than left as a context manager, which would commit on exit
+    conn = psycopg.connect(postgres_uri)
+    try:
+        restored = PostgresSaver(sync_connection=conn, archive_store=store).get_tuple(config)
+    finally:
+        conn.close()
+    assert restored.checkpoint == expected.checkpoint
+
+    with postgres_pool.connection() as conn:
+        assert conn.execute("SELECT count(*) FROM archived_threads").fetchone()[0] == 0
+    assert PostgresSaver(sync_connection=postgres_pool).get_tuple(config).checkpoint == expected.checkpoint
+
+
+def test_arehydrate_on_a_raw_connection_commits(tmp_path, postgres_uri, postgres_pool, counter_graph):
+    store = LocalArchiveStore(str(tmp_path))
+    config, expected = archive_thread(postgres_uri, postgres_pool, store, counter_graph, "t")
+
+    async def restore():
+        conn = await psycopg.AsyncConnection.connect(postgres_uri)
+        try:
+            return await PostgresSaver(async_connection=conn, archive_store=store).aget_tuple(config)
+        finally:
+            await conn.close()
+
+    assert asyncio.run(restore()).checkpoint == expected.checkpoint
+    with postgres_pool.connection() as conn:
+        assert conn.execute("SELECT count(*) FROM archived_threads").fetchone()[0] == 0
+
+
+def test_list_restores_an_archived_thread(tmp_path, postgres_uri, postgres_pool, counter_graph):
+    store = LocalArchiveStore(str(tmp_path))
+    config, expected = archive_thread(postgres_uri, postgres_pool, store, counter_graph, "t")
+    saver = PostgresSaver(sync_connection=postgres_pool, archive_store=store)
+
+    listed = list(saver.list(config))
+    assert len(listed) == 5 and listed[0].checkpoint == expected.checkpoint
+    with postgres_pool.connection() as conn:
+        assert conn.execute("SELECT count(*) FROM archived_threads").fetchone()[0] == 0
+
+    # a thread with rows is listed without looking for an archive
+    def no_restore(thread_id):
+        raise AssertionError(thread_id)
+
+    saver._rehydrate = no_restore
+    assert len(list(saver.list(config))) == 5
+
+
+def test_alist_restores_an_archived_thread(tmp_path, postgres_uri, postgres_pool, counter_graph):
+    from psycopg_pool import AsyncConnectionPool
+
+    store = LocalArchiveStore(str(tmp_path))
+    config, expected = archive_thread(postgres_uri, postgres_pool, store, counter_graph, "t")
+
+    async def run():
+        async with AsyncConnectionPool(postgres_uri) as pool:
+            saver = PostgresSaver(async_connection=pool, archive_store=store)
+            return [checkpoint async for checkpoint in saver.alist(config)]
+
+    listed = asyncio.run(run())
+    assert len(listed) == 5 and listed[0].checkpoint == expected.checkpoint
+
+
+def test_a_write_in_flight_is_archived_with_its_thread(tmp_path, postgres_uri, postgres_pool, counter_graph):
+    store = LocalArchiveStore(str(tmp_path))
+    config = {"configurable": {"thread_id": "t"}}
+    counter_graph(PostgresSaver(sync_connection=postgres_pool), turns=3).invoke(INPUT, config)
+    latest = PostgresSaver(sync_connection=postgres_pool).get_tuple(config).config
+    PostgresSaver(sync_connection=postgres_pool).put_writes(latest, [("note", "old")], "task")
+    with postgres_pool.connection() as conn:
+        conn.execute("UPDATE checkpoints SET created_at = now() - interval '40 days'")
+
+    # a writer that started its transaction before tiering did, and overwrites
+    # a row without changing how many the thread has
+    writer = psycopg.connect(postgres_uri)
+    try:
+        writer.execute(LOCK_THREAD_SHARED_QUERY, ("t",))
+        with ThreadPoolExecutor(1) as pool:
+            tiering = pool.submit(tier_archive, postgres_uri, store)
+            time.sleep(0.3)
+            assert not tiering.done()
+            PostgresSaver(sync_connection=writer).put_writes(latest, [("note", "new")], "task")
+            writer.commit()
+            assert tiering.result().threads == 1
+    finally:
+        writer.close()
+
+    restored = PostgresSaver(sync_connection=postgres_pool, archive_store=store).get_tuple(latest)
+    assert restored.pending_writes == [("task", "note", "new")]
+
+
+def tier_archive(uri, store):
+    with psycopg.connect(uri) as conn:
+        return tier_idle_threads(conn, store, timedelta(days=30))
@@ -0,0 +1,244 @@
+import asyncio
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import Tool
+from langgraph.checkpoint import MemorySaver
+
+from agent.utils.meta_prompting_agent import FINAL_TURN_PROMPT, create_meta_prompting_agent
+
+# what the chat UI sends: no error_log
+UI_PAYLOAD = {"messages": [HumanMessage(content="two questions")], "turn_count": 0}
+
+EXPERT_REQUESTS = "".join(
+    f"```EXPERT REQUEST:\n{{'expert_name': 'Expert {i}', 'summary': 'part {i}'}}\n```\n"
+    for i in range(2)
+)
+
+
+def text(message) -> str:
+    content = message.content
+    return content if isinstance(content, str) else "".join(block["text"] for block in content)
+
+
+def is_expert_prompt(messages) -> bool:
+    return messages[0].type == "system" and "expert assistant" in text(messages[0])
+
+
+class FakeModel(BaseChatModel):
+    """Asks two experts at once, then combines their answers."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _reply(self, messages) -> str:
+        if is_expert_prompt(messages):
+            for i in range(2):
+                if f"'expert_name': 'Expert {i}'" in text(messages[-1]):
+                    return f"FINAL ANSWER: part {i}"
+            raise AssertionError(text(messages[-1]))
+        if any("FINAL ANSWER: part" in text(message) for message in messages):
+            return "FINAL ANSWER: combined"
+        return EXPERT_REQUESTS
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+
+def build_agent(**kwargs):
+    return asyncio.run(create_meta_prompting_agent(FakeModel(), [], checkpointer=MemorySaver(), **kwargs))
+
+
+def test_parallel_experts_on_the_ui_payload():
+    agent = build_agent()
+    out = agent.invoke(UI_PAYLOAD, {"configurable": {"thread_id": "sync"}})
+    assert "FINAL ANSWER: combined" in out["messages"][-1].content
+    assert out["error_log"] == []
+
+
+def test_parallel_experts_on_the_ui_payload_async():
+    agent = build_agent()
+
+    async def run():
+        return [
+            chunk
+            async for chunk in agent.astream(
+                UI_PAYLOAD, {"configurable": {"thread_id": "async"}}, stream_mode="values"
+            )
+        ]
+
+    chunks = asyncio.run(run())
+    assert "FINAL ANSWER: combined" in chunks[-1]["messages"][-1].content
+
+
+def test_turn_limit_on_the_ui_payload():
+    agent = build_agent()
+    out = agent.invoke(UI_PAYLOAD, {"configurable": {"thread_id": "limit", "max_turns": 0}})
+    assert out["error_log"] == ["Reached maximum turns"]
+
+
+class ToolCallingModel(BaseChatModel):
+    """Has the expert call two tools natively, then answers with their results."""
+
+    bound_tools: list = []
+    meta_prompts: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-calling"
+
+    def bind_tools(self, tools, **kwargs):
+        self.bound_tools.extend(tool.name for tool in tools)
+        return self
+
+    def _reply(self, messages) -> AIMessage:
+        if is_expert_prompt(messages):
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "formula", "args": {"__arg1": "salt"}, "id": "call_1"},
+                    {"name": "molar_mass", "args": {"__arg1": "NaCl"}, "id": "call_2"},
+                ],
+            )
+        self.meta_prompts.append(messages)
+        results = [text(message) for message in messages if isinstance(message, FunctionMessage)]
+        if results:
+            return AIMessage(content=f"FINAL ANSWER: {' '.join(results)}")
+        return AIMessage(content="```EXPERT REQUEST:\n{'expert_name': 'Chemist', 'summary': 'salt'}\n```")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+
+def test_native_tool_calls_run_and_their_results_are_rendered():
+    calls = []
+
+    def tool(name, result):
+        def run(query: str) -> str:
+            calls.append((name, query))
+            return result
+
+        return Tool(name=name, func=run, description=f"The {name} of a compound.")
+
+    model = ToolCallingModel()
+    agent = asyncio.run(
+        create_meta_prompting_agent(
+            model,
+            [tool("formula", "NaCl"), tool("molar_mass", "58.44 g/mol")],
+            checkpointer=MemorySaver(),
+            native_tool_calling=True,
+        )
+    )
+    out = agent.invoke(UI_PAYLOAD, {"configurable": {"thread_id": "native"}})
+
+    assert model.bound_tools == ["formula", "molar_mass"]
+    assert sorted(calls) == [("formula", "salt"), ("molar_mass", "NaCl")]
+    call = next(m for m in out["messages"] if isinstance(m, AIMessage) and m.tool_calls)
+    assert [c["id"] for c in call.tool_calls] == ["call_1", "call_2"]
+    results = [m for m in out["messages"] if isinstance(m, ToolMessage)]
+    assert [(m.tool_call_id, m.content) for m in results] == [("call_1", "NaCl"), ("call_2", "58.44 g/mol")]
+    # the meta-prompter has no tools bound, so it sees the calls in the text protocol
+    rendered = "\n".join(text(m) for m in model.meta_prompts[-1])
+    assert "Tool: formula\nInput: salt" in rendered
+    assert out["messages"][-1].content.endswith("FINAL ANSWER: NaCl 58.44 g/mol```")
+    assert out["tool_calls_used"] == 2
+
+
+class Clock:
+    """Stands in for the ``time`` module of ``agent.utils.budget``."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class BudgetModel(BaseChatModel):
+    """Keeps asking an expert, who keeps calling two tools, until a final answer
+    is forced; each call takes ``seconds_per_call`` on ``clock`` and reports
+    ``tokens_per_call`` tokens."""
+
+    clock: Clock
+    seconds_per_call: float = 0.0
+    tokens_per_call: int = 0
+    final_prompts: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-budget"
+
+    def _reply(self, messages) -> str:
+        if is_expert_prompt(messages):
+            return "Tool: search\nInput: a\nTool: search\nInput: b"
+        if "nearly used up" in text(messages[-1]):
+            self.final_prompts.append(text(messages[-1]))
+            return "FINAL ANSWER: forced"
+        return "```EXPERT REQUEST:\n{'expert_name': 'Researcher', 'summary': 'look it up'}\n```"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.clock.now += self.seconds_per_call
+        message = AIMessage(
+            content=self._reply(messages),
+            usage_metadata={
+                "input_tokens": self.tokens_per_call,
+                "output_tokens": 0,
+                "total_tokens": self.tokens_per_call,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def run_budgeted(monkeypatch, configurable, runs=1, **model_kwargs):
+    from agent.utils import budget
+
+    clock = Clock()
+    monkeypatch.setattr(budget, "time", clock)
+    searches = []
+    model = BudgetModel(clock=clock, **model_kwargs)
+    search = Tool(name="search", func=lambda query: searches.append(query) or "found", description="Search.")
+    agent = asyncio.run(create_meta_prompting_agent(model, [search], checkpointer=MemorySaver()))
+    config = {"configurable": {"thread_id": "budget", **configurable}}
+    # API clients send just the new message, without resetting turn_count
+    outputs = [
+        agent.invoke({"messages": [HumanMessage(content=f"question {run}")]}, config)
+        for run in range(runs)
+    ]
+    return outputs, model, searches
+
+
+def test_deadline_forces_a_final_answer(monkeypatch):
+    # each model call takes 30s: after the meta-prompter and an expert, 10s are left
+    (out,), model, _ = run_budgeted(monkeypatch, {"deadline_seconds": 70}, seconds_per_call=30)
+    assert model.final_prompts == [FINAL_TURN_PROMPT.format(reason="time")]
+    assert out["turn_count"] == 2
+    assert "FINAL ANSWER: forced" in out["messages"][-1].content
+
+
+def test_token_budget_forces_a_final_answer(monkeypatch):
+    (out,), model, _ = run_budgeted(monkeypatch, {"max_tokens": 1000}, tokens_per_call=300)
+    assert model.final_prompts == [FINAL_TURN_PROMPT.format(reason="token budget")]
+    # after 900 tokens the meta-prompter gets no expert, but one last turn
+    assert out["tokens_used"] == 1200 and out["turn_count"] == 3
+
+
+def test_tool_call_budget_limits_the_calls_made(monkeypatch):
+    (out,), model, searches = run_budgeted(monkeypatch, {"max_tool_calls": 1})
+    assert searches == ["a"]
+    assert out["tool_calls_used"] == 1
+    skipped = [m for m in out["messages"] if isinstance(m, FunctionMessage) and m.content.startswith("Error")]
+    assert len(skipped) == 1 and "tool call budget" in skipped[0].content
+    assert model.final_prompts == [FINAL_TURN_PROMPT.format(reason="tool call budget")]
+
+
+def test_each_run_starts_a_fresh_budget(monkeypatch):
+    outputs, model, searches = run_budgeted(
+        monkeypatch, {"max_tool_calls": 1, "max_tokens": 10000}, runs=2, tokens_per_call=100
+    )
+    # the second run gets its own tool call and tokens, although turn_count is not reset
+    assert searches == ["a", "a"]
+    assert [out["tool_calls_used"] for out in outputs] == [1, 1]
+    assert [out["tokens_used"] for out in outputs] == [300, 300]
+    assert len(model.final_prompts) == 2
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from agent.utils.postgres_saver import PostgresSaver, backfill_metadata_json
+
+INPUT = {"messages": [HumanMessage(content="hi")], "turn_count": 0}
+
+
+def test_delta_checkpoints_rebuild_across_keyframes(postgres_pool, counter_graph):
+    config = {"configurable": {"thread_id": "delta"}}
+    counter_graph(PostgresSaver(sync_connection=postgres_pool)).invoke(
+        INPUT, {"configurable": {"thread_id": "full"}}
+    )
+    counter_graph(
+        PostgresSaver(sync_connection=postgres_pool, delta_mode=True, keyframe_interval=4)
+    ).invoke(INPUT, config)
+
+    with postgres_pool.connection() as conn:
+        rows = conn.execute(
+            "SELECT is_delta FROM checkpoints WHERE thread_id = 'delta' ORDER BY thread_ts"
+        ).fetchall()
+    flags = [is_delta for (is_delta,) in rows]
+    # a keyframe, then up to keyframe_interval deltas on top of it, repeating
+    assert flags[:6] == [False, True, True, True, True, False]
+    assert flags.count(False) >= 3
+
+    # a fresh saver, without any cached delta heads, rebuilds every checkpoint
+    reader = counter_graph(PostgresSaver(sync_connection=postgres_pool))
+    expected = list(reader.get_state_history({"configurable": {"thread_id": "full"}}))
+    history = list(reader.get_state_history(config))
+    assert len(history) == len(rows) == len(expected)
+    for state, reference in zip(history, expected):
+        assert state.values == reference.values
+    assert history[0].values["turn_count"] == 12
+    assert len(history[0].values["messages"]) == 13
+
+
+def test_negative_replica_max_lag_is_rejected():
+    with pytest.raises(ValueError, match="replica_max_lag"):
+        PostgresSaver(replica_max_lag=-1)
+
+
+def test_zero_replica_lag_expires_recent_writes(postgres_pool, counter_graph):
+    saver = PostgresSaver(
+        sync_connection=postgres_pool, sync_replica_connection=postgres_pool, replica_max_lag=0
+    )
+    # with no lag allowed, each write expires the ones before it
+    counter_graph(saver, turns=2).invoke(INPUT, {"configurable": {"thread_id": "a"}})
+    counter_graph(saver, turns=2).invoke(INPUT, {"configurable": {"thread_id": "b"}})
+    assert list(saver._recent_writes) in (["b"], [])
+    assert saver._use_replica(postgres_pool, "a")
+
+
+def test_recent_writes_are_read_from_the_primary(postgres_uri, postgres_pool, counter_graph):
+    from contextlib import contextmanager
+
+    from psycopg_pool import ConnectionPool
+
+    class Replica(ConnectionPool):
+        """The primary database, counting the reads routed to it as a replica."""
+
+        reads = 0
+
+        @contextmanager
+        def connection(self, *args, **kwargs):
+            self.reads += 1
+            with super().connection(*args, **kwargs) as conn:
+                yield conn
+
+    counter_graph(PostgresSaver(sync_connection=postgres_pool), turns=2).invoke(
+        INPUT, {"configurable": {"thread_id": "other"}}
+    )
+    with Replica(postgres_uri) as replica:
+        saver = PostgresSaver(
+            sync_connection=postgres_pool, sync_replica_connection=replica, replica_max_lag=0.5
+        )
+        config = {"configurable": {"thread_id": "mine"}}
+        counter_graph(saver, turns=2).invoke(INPUT, config)
+        stale = {"configurable": {"thread_id": "mine", "allow_stale": True}}
+
+        # this worker's own writes may not have reached the replica yet
+        replica.reads = 0
+        assert len(list(saver.list(config))) == 4
+        assert saver.get_tuple(stale).metadata["step"] == 2
+        assert replica.reads == 0
+
+        # threads written elsewhere, and listings across threads, may lag
+        assert len(list(saver.list({"configurable": {"thread_id": "other"}}))) == 4
+        assert len(list(saver.list(None))) == 8
+        assert replica.reads == 2
+
+        # once replica_max_lag has passed, the thread is read from the replica too
+        time.sleep(0.6)
+        assert len(list(saver.list(config))) == 4
+        assert saver.get_tuple(stale).metadata["step"] == 2
+        assert replica.reads == 4
+
+
+def test_backfill_metadata_json_reads_blobs(postgres_pool):
+    saver = PostgresSaver(sync_connection=postgres_pool, blob_threshold=64)
+    config = {"configurable": {"thread_id": "t"}}
+    for step, note in enumerate(["short", "long " * 100]):
+        config = saver.put(config, empty_checkpoint(), {"source": "loop", "step": step, "note": note})
+    with postgres_pool.connection() as conn:
+        assert conn.execute("SELECT count(*) FROM checkpoint_blobs").fetchone()[0] == 1
+        conn.execute("UPDATE checkpoints SET metadata_json = NULL")
+        assert backfill_metadata_json(conn, saver.serde, batch_size=1) == 2
+
+    found = list(saver.list({"configurable": {"thread_id": "t"}}, filter={"note": "long " * 100}))
+    assert [checkpoint.metadata["step"] for checkpoint in found] == [1]
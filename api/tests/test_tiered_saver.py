@@ -0,0 +1,84 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from agent.utils.checkpoint_serde import CompactSerializer
+from agent.utils.tiered_saver import TieredSqliteSaver
+
+INPUT = {"messages": [HumanMessage(content="hi")], "turn_count": 0}
+
+
+def steps(tuples):
+    return [checkpoint.metadata["step"] for checkpoint in tuples]
+
+
+def test_list_and_filter(tmp_path, counter_graph):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = TieredSqliteSaver(path, serde=CompactSerializer(), memory_max_bytes=20000)
+    for thread_id in ("a", "b"):
+        counter_graph(saver, turns=5).invoke(INPUT, {"configurable": {"thread_id": thread_id}})
+    config = {"configurable": {"thread_id": "a"}}
+
+    # read back from SQLite alone, by a saver with an empty memory tier
+    reader = TieredSqliteSaver(path, serde=CompactSerializer())
+    assert reader.get_tuple(config).checkpoint == saver.get_tuple(config).checkpoint
+    assert steps(reader.list(config)) == [5, 4, 3, 2, 1, 0, -1]
+    assert steps(reader.list(config, limit=2)) == [5, 4]
+    assert steps(reader.list(config, filter={"source": "input"})) == [-1]
+    assert steps(reader.list(config, filter={"step": {"$gte": 1, "$lt": 3}})) == [2, 1]
+    assert steps(reader.list(config, filter={"step": {"$ne": 0}, "source": "loop"})) == [5, 4, 3, 2, 1]
+    before = reader.get_tuple(config).parent_config
+    assert steps(reader.list(config, before=before)) == [3, 2, 1, 0, -1]
+    assert len(list(reader.list(None, filter={"step": 5}))) == 2
+
+
+def test_alist(tmp_path, counter_graph):
+    saver = TieredSqliteSaver(str(tmp_path / "checkpoints.sqlite"))
+    config = {"configurable": {"thread_id": "a"}}
+
+    async def run():
+        await counter_graph(saver, turns=3).ainvoke(INPUT, config)
+        return [checkpoint async for checkpoint in saver.alist(config, filter={"source": "loop"}, limit=2)]
+
+    assert steps(asyncio.run(run())) == [3, 2]
+
+
+NESTED_METADATA = [
+    {"source": "loop", "step": 0, "user": {"id": 1, "name": "ada"}, "tags": ["a", "b"]},
+    {"source": "loop", "step": 1, "user": {"id": 2, "name": "bob"}, "tags": ["b", True]},
+    {"source": "loop", "step": 2, "user": {"id": 1}, "tags": [], "note": None},
+]
+NESTED_FILTERS = [
+    ({"user": {"id": 1}}, [2, 0]),
+    ({"user": {"id": 1, "name": "ada"}}, [0]),
+    ({"user": {}}, [2, 1, 0]),
+    ({"tags": ["b"]}, [1, 0]),
+    ({"tags": ["b", "a"]}, [0]),
+    ({"tags": [True]}, [1]),
+    ({"tags": []}, [2, 1, 0]),
+    ({"note": None}, [2]),
+]
+
+
+def put_nested(saver):
+    config = {"configurable": {"thread_id": "nested"}}
+    for metadata in NESTED_METADATA:
+        config = saver.put(config, empty_checkpoint(), metadata)
+    return {"configurable": {"thread_id": "nested"}}
+
+
+def test_nested_filters_match_by_containment(tmp_path):
+    saver = TieredSqliteSaver(str(tmp_path / "checkpoints.sqlite"))
+    config = put_nested(saver)
+    for filter, expected in NESTED_FILTERS:
+        assert steps(saver.list(config, filter=filter)) == expected, filter
+
+
+def test_nested_filters_match_postgres(postgres_pool):
+    from agent.utils.postgres_saver import PostgresSaver
+
+    saver = PostgresSaver(sync_connection=postgres_pool)
+    config = put_nested(saver)
+    for filter, expected in NESTED_FILTERS:
+        assert steps(saver.list(config, filter=filter)) == expected, filter
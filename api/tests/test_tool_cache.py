@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+from langchain_core.tools import StructuredTool, Tool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from agent.utils.tool_cache import CachedTool, ToolCache
+
+
+class Search:
+    """A search tool that counts its calls and can be held up mid-call."""
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def run(self, query: str) -> str:
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return f"result {query.strip().lower()}"
+
+    async def arun(self, query: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"result {query.strip().lower()}"
+
+    def tool(self) -> Tool:
+        return Tool(name="search", func=self.run, coroutine=self.arun, description="Search the web.")
+
+
+def test_repeated_calls_are_served_from_memory():
+    search = Search()
+    cache = ToolCache()
+    tool = cache.wrap([search.tool()])[0]
+    assert tool.invoke("Tokyo  population") == "result tokyo  population"
+    assert tool.invoke(" tokyo population ") == "result tokyo  population"
+    assert search.calls == 1
+    assert cache.stats()["tools"]["search"]["memory_hits"] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    search = Search()
+    tool = ToolCache(ttls={"search": timedelta(seconds=0.2)}).wrap([search.tool()])[0]
+    tool.invoke("salt")
+    tool.invoke("salt")
+    time.sleep(0.3)
+    tool.invoke("salt")
+    assert search.calls == 2
+
+
+def test_tools_with_a_zero_ttl_are_not_wrapped():
+    tool = Search().tool()
+    assert ToolCache(ttls={"search": timedelta(0)}).wrap([tool]) == [tool]
+
+
+def test_errors_are_not_cached():
+    calls = []
+
+    def flaky(query: str) -> str:
+        calls.append(query)
+        raise RuntimeError("boom")
+
+    tool = ToolCache().wrap([Tool(name="flaky", func=flaky, description="Fails.")])[0]
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            tool.invoke("a")
+    assert len(calls) == 2
+
+
+def test_returned_errors_are_not_cached():
+    calls = []
+
+    def search(query: str) -> str:
+        # what TavilySearchResults returns when the API call fails
+        calls.append(query)
+        return "HTTPError('432 Client Error')" if len(calls) == 1 else "ok"
+
+    cache = ToolCache()
+    tool = cache.wrap([Tool(name="search", func=search, description="Search.")])[0]
+    assert tool.invoke("a") == "HTTPError('432 Client Error')"
+    assert tool.invoke("a") == "ok"
+    assert tool.invoke("a") == "ok"
+    assert len(calls) == 2
+    assert cache.stats()["tools"]["search"]["errors"] == 1
+
+    # tools can tell their own errors apart
+    def lookup(query: str) -> str:
+        calls.append(query)
+        return "Service unavailable"
+
+    calls.clear()
+    cache = ToolCache(is_error={"lookup": lambda value: value == "Service unavailable"})
+    tool = cache.wrap([Tool(name="lookup", func=lookup, description="Look up.")])[0]
+    for _ in range(3):
+        tool.invoke("a")
+    assert len(calls) == 3
+
+
+def test_case_sensitive_tools_keep_the_case_of_their_input():
+    search = Search()
+    calculator = Search()
+    cache = ToolCache(case_sensitive=["calculator"])
+    tools = cache.wrap(
+        [
+            search.tool(),
+            Tool(name="calculator", func=calculator.run, description="Compute."),
+        ]
+    )
+    for tool in tools:
+        tool.invoke("molar mass of Mg")
+        tool.invoke("molar  mass of mg")
+        tool.invoke(" molar mass of Mg ")
+    assert search.calls == 1
+    assert calculator.calls == 2
+
+
+def test_concurrent_calls_are_coalesced_across_threads():
+    search = Search(delay=0.2)
+    cache = ToolCache()
+    tool = cache.wrap([search.tool()])[0]
+    with ThreadPoolExecutor(10) as pool:
+        results = list(pool.map(lambda _: tool.invoke("salt"), range(10)))
+    assert search.calls == 1
+    assert set(results) == {"result salt"}
+    assert cache.stats()["tools"]["search"]["coalesced"] == 9
+
+
+def test_concurrent_calls_are_coalesced_in_the_event_loop():
+    search = Search(delay=0.1)
+    cache = ToolCache()
+    tool = cache.wrap([search.tool()])[0]
+
+    async def run():
+        return await asyncio.gather(*(tool.ainvoke("salt") for _ in range(20)))
+
+    assert set(asyncio.run(run())) == {"result salt"}
+    assert search.calls == 1
+    assert cache.stats()["tools"]["search"]["coalesced"] == 19
+
+
+def test_cancelling_the_first_caller_leaves_the_others_waiting():
+    search = Search(delay=0.2)
+    tool = ToolCache().wrap([search.tool()])[0]
+
+    async def run():
+        first = asyncio.ensure_future(tool.ainvoke("salt"))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(tool.ainvoke("salt"))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "result salt"
+    assert search.calls == 1
+
+
+def test_wrapped_tools_keep_their_input_schema():
+    def lookup(query: str, limit: int = 3) -> str:
+        """Look something up."""
+        return f"{query}:{limit}"
+
+    single = Search().tool()
+    structured = StructuredTool.from_function(lookup)
+    for tool in (single, structured):
+        cached = ToolCache().wrap([tool])[0]
+        assert isinstance(cached, CachedTool)
+        assert cached.args == tool.args
+        assert cached.is_single_input == tool.is_single_input
+
+    # what native tool calling sends the model, and the calls it makes back
+    cached_single = ToolCache().wrap([single])[0]
+    schema = convert_to_openai_tool(cached_single)["function"]["parameters"]
+    assert list(schema["properties"]) == ["__arg1"]
+    assert cached_single.invoke({"__arg1": "Salt"}) == "result salt"
+    call = {"name": "search", "args": {"__arg1": "salt"}, "id": "1", "type": "tool_call"}
+    assert asyncio.run(cached_single.ainvoke(call)).content == "result salt"
+
+    cached_structured = ToolCache().wrap([structured])[0]
+    assert convert_to_openai_tool(cached_structured) == convert_to_openai_tool(structured)
+    assert cached_structured.invoke({"query": "a", "limit": 2}) == "a:2"
+
+
+def test_shared_tier(postgres_uri):
+    from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+    search = Search()
+    with ConnectionPool(postgres_uri) as pool:
+        ToolCache(sync_connection=pool).setup()
+        ToolCache(sync_connection=pool).wrap([search.tool()])[0].invoke("austen")
+        # another worker, with an empty memory tier
+        other = ToolCache(sync_connection=pool)
+        assert other.wrap([search.tool()])[0].invoke("Austen") == "result austen"
+    assert search.calls == 1
+    assert other.stats()["tools"]["search"]["shared_hits"] == 1
+
+    async def run():
+        async with AsyncConnectionPool(postgres_uri) as pool:
+            return await ToolCache(async_connection=pool).wrap([search.tool()])[0].ainvoke("AUSTEN")
+
+    assert asyncio.run(run()) == "result austen"
+    assert search.calls == 1
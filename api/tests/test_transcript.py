@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.utils.transcript import TranscriptRenderer
+
+
+def conversation(turns: int):
+    messages = []
+    for turn in range(turns):
+        messages.append(HumanMessage(content=f"question {turn}"))
+        messages.append(AIMessage(content=f"answer {turn} " + "y" * 50))
+    return messages
+
+
+def test_render_reuses_the_previous_transcript():
+    renderer = TranscriptRenderer()
+    messages = conversation(3)
+    first = renderer.render(messages[:4], "t")
+    second = renderer.render(messages, "t")
+    assert renderer.hits == 1
+    assert second.text.startswith(first.text)
+    assert second.new_tokens == second.tokens - first.tokens
+    fresh = TranscriptRenderer().render(messages)
+    assert (second.text, second.tokens, second.ends) == (fresh.text, fresh.tokens, fresh.ends)
+
+
+def test_render_rebuilds_a_rewritten_history():
+    renderer = TranscriptRenderer()
+    messages = conversation(3)
+    renderer.render(messages, "t")
+    rewritten = [HumanMessage(content="summary"), *messages[4:]]
+    assert renderer.render(rewritten, "t") == TranscriptRenderer().render(rewritten)
+
+
+def test_render_rebuilds_a_compacted_window_of_the_same_length():
+    renderer = TranscriptRenderer()
+    messages = conversation(3)
+    renderer.render(messages, "t")
+    # the summary stands in for the first message, so the last one keeps its index
+    compacted = [HumanMessage(content="summary"), *messages[1:]]
+    assert renderer.render(compacted, "t") == TranscriptRenderer().render(compacted)
+    assert renderer.hits == 0
+
+
+def test_render_from_parallel_threads():
+    renderer = TranscriptRenderer(max_threads=8)
+    messages = conversation(20)
+    expected = {
+        length: TranscriptRenderer().render(messages[:length]) for length in range(1, 41)
+    }
+
+    def render(i: int):
+        length = 1 + i % 40
+        return length, renderer.render(messages[:length], f"thread-{i % 16}")
+
+    with ThreadPoolExecutor(16) as pool:
+        for length, transcript in pool.map(render, range(2000)):
+            assert transcript.text == expected[length].text
+            assert transcript.tokens == expected[length].tokens
+    assert renderer.hits + renderer.misses == 2000
+    assert len(renderer._prefixes) <= 8
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from agent.utils.checkpoint_blobs import UPSERT_BLOB_QUERY
+from agent.utils.checkpoint_tiering import LOCK_THREAD_SHARED_QUERY
+from agent.utils.write_buffer import WriteBehindBuffer, batch_statements
+
+INSERT = "INSERT INTO buffered (id) VALUES (%s)"
+
+
+def test_batch_statements_order_locks_and_blob_upserts_by_key():
+    batch = [
+        ([(LOCK_THREAD_SHARED_QUERY, ("y",)), (UPSERT_BLOB_QUERY, ("b", b"2")), (INSERT, (1,))], None),
+        ([(UPSERT_BLOB_QUERY, ("c", b"3")), (UPSERT_BLOB_QUERY, ("a", b"1")), (INSERT, (2,))], None),
+        ([(LOCK_THREAD_SHARED_QUERY, ("x",)), (UPSERT_BLOB_QUERY, ("b", b"2")), (INSERT, (3,))], None),
+        ([(LOCK_THREAD_SHARED_QUERY, ("y",))], None),
+    ]
+    assert batch_statements(batch) == [
+        (LOCK_THREAD_SHARED_QUERY, ("x",)),
+        (LOCK_THREAD_SHARED_QUERY, ("y",)),
+        (UPSERT_BLOB_QUERY, ("a", b"1")),
+        (UPSERT_BLOB_QUERY, ("b", b"2")),
+        (UPSERT_BLOB_QUERY, ("c", b"3")),
+        (INSERT, (1,)),
+        (INSERT, (2,)),
+        (INSERT, (3,)),
+    ]
+
+
+@pytest.fixture
+def run_buffered(postgres_uri):
+    """Run ``scenario(buffer)`` against a table with a unique ``id`` column,
+    returning its result and the ids committed."""
+    from psycopg_pool import AsyncConnectionPool
+
+    def run(scenario, **kwargs):
+        async def main():
+            async with AsyncConnectionPool(postgres_uri) as pool:
+                async with pool.connection() as conn:
+                    await conn.execute("DROP TABLE IF EXISTS buffered")
+                    await conn.execute("CREATE TABLE buffered (id INT PRIMARY KEY)")
+                buffer = WriteBehindBuffer(pool.connection, **kwargs)
+                result = await scenario(buffer)
+                async with pool.connection() as conn:
+                    cur = await conn.execute("SELECT id FROM buffered ORDER BY id")
+                    return result, [row[0] for row in await cur.fetchall()], buffer
+
+        return asyncio.run(main())
+
+    return run
+
+
+def test_concurrent_submissions_share_a_transaction(run_buffered):
+    async def scenario(buffer):
+        await asyncio.gather(*(buffer.submit([(INSERT, (i,))]) for i in range(20)))
+
+    _, ids, buffer = run_buffered(scenario, flush_interval=0.01)
+    assert ids == list(range(20))
+    assert buffer.submissions == 20 and buffer.batches < 5
+
+
+def test_a_failed_batch_is_retried_per_submission(run_buffered):
+    async def scenario(buffer):
+        return await asyncio.gather(
+            *(buffer.submit([(INSERT, (i,))]) for i in (1, 2, 2, 3)),
+            return_exceptions=True,
+        )
+
+    results, ids, buffer = run_buffered(scenario, flush_interval=0.01)
+    # the duplicate fails on its own; every other submission commits
+    assert ids == [1, 2, 3]
+    assert [isinstance(result, Exception) for result in results] == [False, False, True, False]
+    assert buffer.batches == 5
+
+
+def test_a_cancelled_submission_does_not_fail_the_batch(run_buffered):
+    async def scenario(buffer):
+        cancelled = asyncio.ensure_future(buffer.submit([(INSERT, (1,))]))
+        other = asyncio.ensure_future(buffer.submit([(INSERT, (2,))]))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await other
+        return cancelled.cancelled()
+
+    was_cancelled, ids, _ = run_buffered(scenario, flush_interval=0.05)
+    assert was_cancelled
+    # queued statements are committed even if their caller stopped waiting
+    assert ids == [1, 2]